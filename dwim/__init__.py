@@ -1,20 +1,20 @@
 # dwim: Location aware application launcher.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: May 29, 2017
+# Last Change: October 16, 2026
 # URL: https://dwim.readthedocs.io
 
 """dwim: Location aware application launcher."""
 
 # Standard library modules.
-import functools
 import os
-import random
 import shlex
+import threading
+import time
 
-# External dependencies.
-from humanfriendly import Spinner, Timer, format_path, pluralize
-from executor import execute, which, quote
+# External dependencies. Most of our dependencies are imported on first use
+# because `dwim' runs at every login and from network hooks, where the time
+# spent importing modules dominates when there's nothing to launch.
 from verboselogs import VerboseLogger
 
 # Python 2.x / 3.x compatibility.
@@ -22,9 +22,57 @@ try:
     from enum import Enum
 except ImportError:
     from flufl.enum import Enum
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
 
 # Modules included in our package.
+from dwim.admission import LaunchPriority, coerce_priority, configure_admission, get_admission_controller
+from dwim.backgrounds import (
+    DEFAULT_PRESCALE,
+    ScaledCache,
+    WallpaperIndex,
+    find_screen_size,
+    select_streaming,
+)
+from dwim.coprocess import close_shell_pool, run_shell_check
 from dwim.exceptions import CommandParseError, MissingProgramError
+from dwim.ledger import get_ledger
+from dwim.location import get_location_resolver
+from dwim.network import (
+    ICMPProbe,
+    NetworkMonitor,
+    Route,
+    TCPProbe,
+    find_default_routes,
+    find_neighbour_mac,
+    run_probes,
+)
+from dwim.paths import get_path_index
+from dwim.prefetch import enable_prefetch, get_prefetcher, stop_prefetch
+from dwim.processes import (
+    CgroupMatcher,
+    CommandLineMatcher,
+    ExecutableMatcher,
+    NameMatcher,
+    ProcessMatcher,
+    UserMatcher,
+    get_process_table,
+    invalidate_process_table,
+)
+from dwim.profiles import load_profile
+from dwim.readiness import (
+    DEFAULT_READY_TIMEOUT,
+    DBusNameReady,
+    FileReady,
+    PortReady,
+    SocketReady,
+    UptimeReady,
+)
+from dwim.resources import ResourceClass, define_resource_class, get_resource_class
+from dwim.spawn import needs_shell, spawn
+from dwim.tracing import count_subprocess, span, traced
 
 # Semi-standard module versioning.
 __version__ = '0.3.1'
@@ -32,31 +80,134 @@ __version__ = '0.3.1'
 # Initialize a logger for this module.
 logger = VerboseLogger(__name__)
 
-# Bind the execute() function to our logger.
-execute = functools.partial(execute, logger=logger)
 
 DEFAULT_PROFILE = '~/.dwimrc'
 """The default location of the user's profile script (a string)."""
 
+DEFAULT_CONCURRENCY = 8
+"""The default number of programs that :func:`launch_programs()` handles concurrently (an integer)."""
+
+ASYNC_HELPERS = (
+    'determine_network_location_async',
+    'have_internet_connection_async',
+    'launch_program_async',
+    'set_random_background_async',
+    'wait_for_internet_connection_async',
+)
+"""The names of the functions in :mod:`dwim.aio` that are available to profiles (a tuple of strings)."""
+
 
 def dwim(profile=DEFAULT_PROFILE):
-    """Evaluate the user's profile script."""
+    """
+    Evaluate the user's profile script.
+
+    :param profile: The pathname of the profile script (a string, defaults
+                    to :data:`DEFAULT_PROFILE`).
+
+    The profile is compiled once and the compiled code is cached (see
+    :func:`dwim.profiles.load_profile()`). The time spent compiling and
+    executing the profile is logged separately at verbose level.
+
+    When the profile defines an ``async def main()`` coroutine function it's
+    run on an event loop after the profile has been executed, so that the
+    profile can use the helpers in :mod:`dwim.aio` (which are available to
+    the profile without importing them) to do independent work concurrently.
+    """
+    from humanfriendly import Timer, format_path, format_timespan
     logger.info("Initializing dwim %s ..", __version__)
     filename = os.path.expanduser(profile)
     environment = dict(
         __file__=filename,
         __name__='dwimrc',
+        CgroupMatcher=CgroupMatcher,
+        CommandLineMatcher=CommandLineMatcher,
+        DBusNameReady=DBusNameReady,
+        ExecutableMatcher=ExecutableMatcher,
+        FileReady=FileReady,
+        ICMPProbe=ICMPProbe,
+        NameMatcher=NameMatcher,
+        PortReady=PortReady,
+        ResourceClass=ResourceClass,
+        SocketReady=SocketReady,
+        TCPProbe=TCPProbe,
+        UptimeReady=UptimeReady,
+        UserMatcher=UserMatcher,
+        configure_admission=configure_admission,
+        define_resource_class=define_resource_class,
         determine_network_location=determine_network_location,
+        enable_prefetch=enable_prefetch,
         launch_program=launch_program,
+        launch_programs=launch_programs,
+        LaunchPriority=LaunchPriority,
         LaunchStatus=LaunchStatus,
         set_random_background=set_random_background,
         wait_for_internet_connection=wait_for_internet_connection,
     )
+    for name in ASYNC_HELPERS:
+        environment[name] = lazy_async_helper(name)
     logger.info("Loading %s ..", format_path(filename))
-    execfile(filename, environment, environment)
+    timer = Timer()
+    with span('compile profile', 'profile', filename=filename):
+        code = load_profile(filename)
+    logger.verbose("Compiled profile (or loaded it from the cache) in %s.",
+                   format_timespan(timer.elapsed_time, detailed=True))
+    timer = Timer()
+    try:
+        with span('execute profile', 'profile', filename=filename):
+            exec(code, environment, environment)
+            main = environment.get('main')
+            if main is not None and is_coroutine_function(main):
+                from dwim.aio import run_main
+                logger.verbose("Running main() coroutine defined by profile ..")
+                run_main(main)
+    finally:
+        stop_prefetch()
+        close_shell_pool()
+    logger.verbose("Executed profile in %s.", format_timespan(timer.elapsed_time, detailed=True))
+
+
+def lazy_async_helper(name):
+    """
+    Create a proxy for a function in :mod:`dwim.aio` that imports the module on first use.
+
+    :param name: The name of the function (a string).
+    :returns: A function that passes its arguments to the named function.
+    """
+    def proxy(*args, **kw):
+        from dwim import aio
+        return getattr(aio, name)(*args, **kw)
+    proxy.__name__ = name
+    return proxy
 
 
-def launch_program(command, is_running=None):
+def is_coroutine_function(value):
+    """
+    Check whether a value is a coroutine function (defined using ``async def``).
+
+    :param value: The value to check.
+    :returns: :data:`True` if `value` is a coroutine function, :data:`False`
+              otherwise (always on Python versions without ``async def``).
+    """
+    import inspect
+    return getattr(inspect, 'iscoroutinefunction', lambda f: False)(value)
+
+
+def execute(*args, **options):
+    """
+    Execute an external command using :func:`executor.execute()`.
+
+    This wrapper imports :mod:`executor` on first use and binds it to our
+    logger. Refer to :func:`executor.execute()` for the supported arguments.
+    """
+    from executor import execute
+    options.setdefault('logger', logger)
+    with span('execute', 'subprocess', command=' '.join(args)):
+        count_subprocess()
+        return execute(*args, **options)
+
+
+def launch_program(command, is_running=None, ready=None, ready_timeout=DEFAULT_READY_TIMEOUT,
+                   priority=LaunchPriority.normal, resource_class=None):
     """
     Start a program if it's not already running.
 
@@ -64,11 +215,31 @@ def launch_program(command, is_running=None):
     program. If the default "Is the program already running?" check fails to
     work you can redefine the way this check is done.
 
+    The default check is answered from an in-process snapshot of the process
+    table (see :mod:`dwim.processes`) which matches processes the same way
+    ``pidof`` does, without forking a ``pidof`` process for every program.
+
     :param command: The shell command used to launch the application (a string).
     :param is_running: The shell command used to check whether the application
-                       is already running (a string, optional).
+                       is already running (a string, optional) or a
+                       :class:`~dwim.processes.ProcessMatcher` object (or a
+                       list of them that all have to match the same process).
+    :param ready: A readiness condition (a
+                  :class:`~dwim.readiness.ReadinessCondition` object,
+                  optional). When given this function doesn't return until
+                  the program is ready (or `ready_timeout` expires).
+    :param ready_timeout: The maximum number of seconds to wait for the
+                          readiness condition (a number).
+    :param priority: A :class:`~dwim.admission.LaunchPriority` value or the
+                     name of one (a string, defaults to ``normal``).
+    :param resource_class: A :class:`~dwim.resources.ResourceClass` object or
+                           the name of one (a string, optional).
     :returns: One of the values from the :class:`LaunchStatus` enumeration.
 
+    Matcher objects are evaluated in Python against the process table
+    snapshot, so unlike shell commands they don't fork any processes. Shell
+    commands are run in a long lived shell (see :mod:`dwim.coprocess`)
+    instead of starting a new shell for every command.
     Examples of custom "is running" checks:
 
     .. code-block:: python
@@ -81,25 +252,330 @@ def launch_program(command, is_running=None):
        # the executable contains a version number that I don't want to hard
        # code in my ~/.dwimrc profile :-)
        launch_program('dropbox start', is_running='pgrep -f "$HOME/.dropbox-dist/*/dropbox"')
+
+       # The same check without forking a shell and pgrep.
+       launch_program('dropbox start', is_running=ExecutableMatcher('$HOME/.dropbox-dist/*/dropbox'))
+
+    Commands that don't use any shell features are started directly (see
+    :mod:`dwim.spawn`), other commands are started using ``sh -c``. Programs
+    that are started directly are recorded in a ledger (see :mod:`dwim.ledger`)
+    and as long as the recorded process is alive the "is running" check is
+    skipped.
+
+    Before a program is started the launch may be held back while the system
+    is under pressure, depending on its `priority` (see :mod:`dwim.admission`).
+    When a `resource_class` is given the nice level, I/O priority, CPU
+    affinity and cgroup of the program are set before it's executed (see
+    :mod:`dwim.resources`), in which case commands that use shell features
+    are started using ``sh -c`` in the same way.
     """
-    try:
-        pathname = resolve_program(extract_program(command))
-        if not is_running:
-            is_running = 'pidof %s' % quote(pathname)
-        logger.verbose("Checking if program is running (%s) ..", pathname)
-        if execute(is_running, silent=True, check=False):
-            logger.info("Command already running: %s", command)
-            return LaunchStatus.already_running
+    steps = launch_steps(command, is_running, ready, ready_timeout, priority, resource_class)
+    step = next(steps)
+    while not isinstance(step, LaunchStatus):
+        function, args = step[0], step[1:]
+        try:
+            result = function(*args)
+        except Exception as e:
+            step = steps.throw(e)
         else:
-            logger.info("Starting command: %s", command)
-            execute('sh', '-c', '(%s >/dev/null 2>&1) &' % command)
-            return LaunchStatus.started
-    except MissingProgramError:
-        logger.warning("Program not installed! (%s)", command)
-        return LaunchStatus.not_installed
-    except Exception as e:
-        logger.warning("Failed to start program! (%s)", e)
-        return LaunchStatus.unspecified_error
+            step = steps.send(result)
+    return step
+
+
+def launch_steps(command, is_running=None, ready=None, ready_timeout=DEFAULT_READY_TIMEOUT,
+                 priority=LaunchPriority.normal, resource_class=None):
+    """
+    Implement :func:`launch_program()` as a generator of blocking steps.
+
+    :param command: Refer to :func:`launch_program()`.
+    :param is_running: Refer to :func:`launch_program()`.
+    :param ready: Refer to :func:`launch_program()`.
+    :param ready_timeout: Refer to :func:`launch_program()`.
+    :param priority: Refer to :func:`launch_program()`.
+    :param resource_class: Refer to :func:`launch_program()`.
+    :returns: A generator that yields a tuple with a function and its
+              positional arguments for each step that can block (resolving
+              the program on the ``$PATH``, checking whether the program is
+              running, admission control, preparing a resource class,
+              starting the command and waiting until the program is
+              ready). The caller runs the function and sends its result
+              back into the generator (or throws the exception it raised).
+              The last value yielded is a :class:`LaunchStatus` value.
+
+    This keeps the logic of :func:`launch_program()` in one place, while
+    :func:`dwim.aio.launch_program_async()` can run the blocking steps
+    without blocking its event loop.
+    """
+    with span('launch_program', 'launch', command=command) as launch_span:
+        status = LaunchStatus.unspecified_error
+        try:
+            priority = coerce_priority(priority)
+            if resource_class:
+                resource_class = get_resource_class(resource_class)
+            tokens = tokenize_command(command)
+            pathname = yield (resolve_program, tokens[0])
+            logger.verbose("Checking if program is running (%s) ..", pathname)
+            with span('is_running', 'launch', command=command, program=pathname) as check_span:
+                running = yield (check_ledger, command)
+                if running:
+                    check_span.set(ledger=True)
+                elif isinstance(is_running, (ProcessMatcher, list, tuple)):
+                    running = yield (check_process_table, is_running)
+                elif is_running:
+                    running = yield (run_shell_check, is_running)
+                else:
+                    running = yield (check_process_table, pathname)
+            if running:
+                logger.info("Command already running: %s", command)
+                status = LaunchStatus.already_running
+            else:
+                with span('admission', 'launch', command=command, priority=priority.name) as admission_span:
+                    delay = yield (get_admission_controller().admit, priority)
+                    admission_span.set(delay=delay)
+                logger.info("Starting command: %s", command)
+                with span('start', 'launch', command=command) as start_span:
+                    prepare = (yield (resource_class.prepare,)) if resource_class else None
+                    if needs_shell(command, tokens) and not prepare:
+                        started = yield (start_in_shell, command)
+                    else:
+                        start_span.set(pid=(yield (spawn_command, command, tokens, pathname, prepare)))
+                        started = True
+                invalidate_process_table()
+                if started:
+                    status = LaunchStatus.started
+                else:
+                    logger.warning("Failed to start program! (%s)", command)
+            if ready and status in (LaunchStatus.started, LaunchStatus.already_running):
+                if not (yield (wait_until_ready, command, ready, ready_timeout, status)):
+                    status = LaunchStatus.not_ready
+        except MissingProgramError:
+            logger.warning("Program not installed! (%s)", command)
+            status = LaunchStatus.not_installed
+        except Exception as e:
+            logger.warning("Failed to start program! (%s)", e)
+        launch_span.set(status=status.name)
+    yield status
+
+
+def check_ledger(command):
+    """
+    Check whether the ledger knows a running process for a command.
+
+    :param command: The command line that was used to start the program (a string).
+    :returns: :data:`True` if the process recorded for the command is still
+              running, :data:`False` otherwise.
+    """
+    return get_ledger().is_running(command)
+
+
+def check_process_table(condition):
+    """
+    Check whether the process table contains a matching process.
+
+    :param condition: Refer to :func:`dwim.processes.ProcessTable.is_running()`.
+    :returns: :data:`True` if a matching process is running, :data:`False` otherwise.
+    """
+    return get_process_table().is_running(condition)
+
+
+def spawn_command(command, tokens, pathname, prepare=None):
+    """
+    Start a command in the background without waiting for it.
+
+    :param command: The command line (a string).
+    :param tokens: The tokenized command line (a list of strings).
+    :param pathname: The absolute pathname of the program (a string).
+    :param prepare: A callable to run in the child before the program is
+                    executed (see :func:`dwim.spawn.spawn()`) or :data:`None`.
+    :returns: The process id of the new process (an integer).
+
+    Commands that use shell features are started using ``sh -c``, other
+    commands are executed directly and recorded in the ledger.
+    """
+    if needs_shell(command, tokens):
+        return spawn(resolve_program('sh'), ['sh', '-c', command], prepare)
+    pid = spawn(pathname, tokens, prepare)
+    logger.verbose("Started %s as process %i.", pathname, pid)
+    get_ledger().record(command, pid)
+    return pid
+
+
+def start_in_shell(command):
+    """
+    Start a command that uses shell features in the background.
+
+    :param command: A shell command (a string).
+    :returns: :data:`True` if the shell exited with status zero,
+              :data:`False` otherwise.
+    """
+    return execute(*shell_arguments(command), check=False)
+
+
+def shell_arguments(command):
+    """
+    Get the command line that starts a shell command in the background.
+
+    :param command: A shell command (a string).
+    :returns: A list of strings.
+    """
+    return ['sh', '-c', '(%s >/dev/null 2>&1) &' % command]
+
+
+def wait_until_ready(command, ready, timeout, status):
+    """
+    Wait for a program to become ready.
+
+    :param command: The command that started the program (a string).
+    :param ready: A :class:`~dwim.readiness.ReadinessCondition` object.
+    :param timeout: The maximum number of seconds to wait (a number).
+    :param status: :data:`LaunchStatus.started` or :data:`LaunchStatus.already_running`.
+    :returns: :data:`True` when the program is ready, :data:`False` otherwise.
+    """
+    from humanfriendly import Timer
+    timer = Timer()
+    entry = get_ledger().entries.get(command)
+    pid = entry['pid'] if entry else None
+    launched_at = time.time() if status == LaunchStatus.started else None
+    logger.verbose("Waiting until %s ..", ready)
+    with span('ready', 'launch', command=command, condition=str(ready)) as ready_span:
+        is_ready = ready.wait(timeout, pid=pid, launched_at=launched_at)
+        ready_span.set(ready=is_ready)
+    if is_ready:
+        logger.verbose("Program is ready after %s (%s).", timer, command)
+    else:
+        logger.warning("Program didn't become ready within %s! (%s)", timer, command)
+    return is_ready
+
+
+def launch_programs(programs, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Start several programs concurrently, respecting their dependencies.
+
+    :param programs: A list of programs to start. Each program is either a
+                     shell command (a string) or a dictionary with the key
+                     ``command`` and optionally the key ``after`` (a command or
+                     a list of commands that have to be handled before this
+                     program is started). Any other keys are passed on to
+                     :func:`launch_program()` as keyword arguments.
+    :param concurrency: The maximum number of programs that are checked and
+                        started at the same time (an integer, defaults to
+                        :data:`DEFAULT_CONCURRENCY`).
+    :returns: A dictionary with commands (strings) as keys and values from
+              the :class:`LaunchStatus` enumeration as values.
+    :raises: :exc:`~exceptions.ValueError` when a command is given more than
+             once, a dependency refers to an unknown command or the
+             dependencies contain a cycle. When :func:`launch_program()`
+             raises an exception the other programs are still handled,
+             after which the exception of the first failed command is
+             reraised.
+
+    Programs without (pending) dependencies are handled in parallel by a pool
+    of worker threads, so only real dependency chains are serialized. A
+    program is started after its dependencies have been handled, regardless
+    of the :class:`LaunchStatus` they resulted in. Here's an example:
+
+    .. code-block:: python
+
+       launch_programs([
+           'nm-applet',
+           'pidgin',
+           dict(command='vpn-client --tray'),
+           dict(command='thunderbird', after='vpn-client --tray'),
+       ])
+    """
+    from humanfriendly import pluralize
+    order = []
+    options = {}
+    waiting = {}
+    for program in programs:
+        if not isinstance(program, dict):
+            program = dict(command=program)
+        program = dict(program)
+        command = program.pop('command')
+        after = program.pop('after', None) or []
+        if not isinstance(after, (list, tuple)):
+            after = [after]
+        if command in options:
+            raise ValueError("Duplicate command %r!" % command)
+        order.append(command)
+        options[command] = program
+        waiting[command] = set(after)
+    dependents = dict((command, []) for command in order)
+    for command in order:
+        for dependency in waiting[command]:
+            if dependency not in dependents:
+                raise ValueError("Unknown dependency %r of command %r!" % (dependency, command))
+            dependents[dependency].append(command)
+    check_dependencies(order, waiting, dependents)
+    if not order:
+        return {}
+    results = {}
+    lock = threading.Lock()
+    ready = Queue()
+    num_workers = max(1, min(concurrency, len(order)))
+    logger.verbose("Launching %s using %s ..",
+                   pluralize(len(order), "program"),
+                   pluralize(num_workers, "worker thread"))
+
+    def worker():
+        while True:
+            command = ready.get()
+            if command is None:
+                return
+            try:
+                status = launch_program(command, **options[command])
+            except Exception as e:
+                # Record the exception so that the dependents of the command
+                # are still handled and the caller isn't left waiting.
+                logger.warning("Failed to launch %s! (%s)", command, e)
+                status = e
+            with lock:
+                results[command] = status
+                for dependent in dependents[command]:
+                    waiting[dependent].discard(command)
+                    if not waiting[dependent]:
+                        ready.put(dependent)
+                if len(results) == len(order):
+                    for i in range(num_workers):
+                        ready.put(None)
+
+    for command in order:
+        if not waiting[command]:
+            ready.put(command)
+    threads = [threading.Thread(target=worker) for i in range(num_workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for command in order:
+        if isinstance(results[command], Exception):
+            raise results[command]
+    return dict((command, results[command]) for command in order)
+
+
+def check_dependencies(order, waiting, dependents):
+    """
+    Make sure the dependencies given to :func:`launch_programs()` don't contain cycles.
+
+    :param order: The commands (a list of strings).
+    :param waiting: A dictionary with the dependencies of each command.
+    :param dependents: A dictionary with the dependents of each command.
+    :raises: :exc:`~exceptions.ValueError` when a cycle is detected.
+    """
+    counts = dict((command, len(waiting[command])) for command in order)
+    pending = [command for command in order if not counts[command]]
+    visited = 0
+    while pending:
+        command = pending.pop()
+        visited += 1
+        for dependent in dependents[command]:
+            counts[dependent] -= 1
+            if not counts[dependent]:
+                pending.append(dependent)
+    if visited != len(order):
+        cyclic = [command for command in order if counts[command]]
+        raise ValueError("Dependency cycle between commands! (%s)" % ', '.join(cyclic))
 
 
 class LaunchStatus(Enum):
@@ -123,6 +599,9 @@ class LaunchStatus(Enum):
     unspecified_error = 4
     """Any other type of error, e.g. the command line can't be parsed."""
 
+    not_ready = 5
+    """The program was started (or already running) but its readiness condition wasn't met in time."""
+
 
 def extract_program(command_line):
     """
@@ -139,14 +618,30 @@ def extract_program(command_line):
     >>> extract_program(' "/usr/bin/dropbox" start ')
     '/usr/bin/dropbox'
     """
+    tokens = tokenize_command(command_line)
+    logger.debug("Extracting program name from parsed command line: %s", tokens)
+    return tokens[0]
+
+
+def tokenize_command(command_line):
+    """
+    Split a simple shell command into tokens.
+
+    :param command_line: A shell command (a string).
+    :returns: A non-empty list of strings.
+    :raises: :exc:`.CommandParseError` when the command line cannot be parsed.
+    """
     logger.debug("Parsing command line: %s", command_line)
-    tokens = shlex.split(command_line)
+    try:
+        tokens = shlex.split(command_line)
+    except ValueError as e:
+        raise CommandParseError("Failed to parse command line! (%s)" % e)
     if not tokens:
         raise CommandParseError("Failed to parse command line! (%r)" % command_line)
-    logger.debug("Extracting program name from parsed command line: %s", tokens)
-    return tokens[0]
+    return tokens
 
 
+@traced('path')
 def resolve_program(executable):
     """
     Expand the name of a program into an absolute pathname.
@@ -161,24 +656,33 @@ def resolve_program(executable):
     'dropbox'
     >>> resolve_program(extract_program('dropbox start'))
     '/usr/bin/dropbox'
+
+    Program names are looked up in an index of the directories on the
+    ``$PATH`` which is cached on disk (see :mod:`dwim.paths`). When
+    prefetching is enabled the program is queued to be prefetched (see
+    :mod:`dwim.prefetch`).
     """
     # Check if the executable name contains no directory components.
     if os.path.basename(executable) == executable:
         # Transform the executable name into an absolute pathname.
-        matching_programs = which(executable)
-        logger.debug("Programs matching executable name: %s", matching_programs)
-        if not matching_programs:
+        matching_program = get_path_index().find(executable)
+        logger.debug("Program matching executable name: %s", matching_program)
+        if not matching_program:
             raise MissingProgramError("Program not found on $PATH! (%s)" % executable)
-        executable = matching_programs[0]
+        executable = matching_program
     else:
         # Make sure the executable exists and is in fact executable.
         logger.debug("Validating executable name: %s", executable)
         if not os.access(executable, os.X_OK):
             raise MissingProgramError("Program not found! (%s)" % executable)
+    prefetcher = get_prefetcher()
+    if prefetcher:
+        prefetcher.add(executable)
     return executable
 
 
-def set_random_background(command, directory):
+@traced('backgrounds')
+def set_random_background(command, directory, index=True, scale=False, screen_size=None):
     """
     Set a random desktop wallpaper / background.
 
@@ -186,24 +690,77 @@ def set_random_background(command, directory):
                     ``{image}`` marker).
     :param directory: The pathname of a directory containing wallpapers (a
                       string).
+    :param index: :data:`True` to use a persistent index of the directory
+                  (see :class:`~dwim.backgrounds.WallpaperIndex`),
+                  :data:`False` to walk the directory and use reservoir
+                  sampling (see :func:`~dwim.backgrounds.select_streaming()`).
+    :param scale: :data:`True` to pass a copy of the wallpaper that has been
+                  scaled to the screen size to `command` (see
+                  :class:`~dwim.backgrounds.ScaledCache`), :data:`False`
+                  to pass the original. This requires Pillow.
+    :param screen_size: The screen size used when `scale` is :data:`True` (a
+                        tuple with the width and height in pixels, defaults
+                        to :func:`~dwim.backgrounds.find_screen_size()`).
     :raises: :exc:`~exceptions.ValueError` when the `command` string doesn't
              contain an ``{image}`` placeholder.
+
+    When `scale` is :data:`True` and there's no scaled copy of the selected
+    wallpaper yet, the original is used and a scaled copy is generated in the
+    background (together with a few other wallpapers, so that future runs are
+    likely to find a scaled copy).
     """
+    from executor import quote
     if '{image}' not in command:
         raise ValueError("The 1st argument should contain an {image} marker!")
-    backgrounds = []
+    selected_background = select_random_background(directory, index, scale, screen_size)
+    if selected_background:
+        execute(command.format(image=quote(selected_background)))
+
+
+def select_random_background(directory, index=True, scale=False, screen_size=None):
+    """
+    Select a random desktop wallpaper / background.
+
+    :param directory: The pathname of a directory containing wallpapers (a
+                      string).
+    :param index: Refer to :func:`set_random_background()`.
+    :param scale: Refer to :func:`set_random_background()`.
+    :param screen_size: Refer to :func:`set_random_background()`.
+    :returns: The pathname of the selected background (a string) or
+              :data:`None` when no backgrounds were found.
+    """
+    from humanfriendly import format_path, pluralize
     logger.verbose("Searching for desktop backgrounds in %s ..", directory)
-    for root, dirs, files in os.walk(directory):
-        for filename in files:
-            if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                backgrounds.append(os.path.join(root, filename))
-    logger.verbose("Found %s.", pluralize(len(backgrounds), "desktop background"))
-    selected_background = random.choice(backgrounds)
+    if index:
+        wallpapers = WallpaperIndex(directory)
+        logger.verbose("Found %s.", pluralize(wallpapers.count, "desktop background"))
+        selected_background = wallpapers.select()
+    else:
+        selected_background = select_streaming(directory)
+    if not selected_background:
+        logger.warning("No desktop backgrounds found in %s!", format_path(directory))
+        return None
     logger.info("Selected random background: %s", format_path(selected_background))
-    execute(command.format(image=quote(selected_background)))
+    if scale:
+        screen_size = screen_size or find_screen_size()
+        if screen_size:
+            cache = ScaledCache(screen_size)
+            scaled_background = cache.lookup(selected_background)
+            if scaled_background:
+                logger.verbose("Using scaled copy of background: %s", format_path(scaled_background))
+                selected_background = scaled_background
+            else:
+                candidates = [selected_background]
+                if index:
+                    candidates.extend(wallpapers.select() for i in range(DEFAULT_PRESCALE))
+                cache.generate(candidates)
+        else:
+            logger.verbose("Not scaling background because the screen size is unknown.")
+    return selected_background
 
 
-def determine_network_location(**gateways):
+@traced('network')
+def determine_network_location(**locations):
     """
     Determine the physical location of this computer.
 
@@ -212,10 +769,11 @@ def determine_network_location(**gateways):
     the current network. Because networks usually have a physical location,
     identifying the current network tells us our physical location.
 
-    :param gateways: One or more keyword arguments with lists of strings
-                     containing MAC addresses of known networks.
-    :returns: The name of the matched MAC address (a string) or ``None`` when
-              the MAC address of the current gateway is unknown.
+    :param locations: One or more keyword arguments with lists of strings
+                      containing MAC addresses of known networks, or
+                      dictionaries with additional signals (see below).
+    :returns: The name of the matched location (a string) or ``None`` when
+              the current network is unknown.
 
     Here's an example from my ``~/.dwimrc`` involving multiple networks and a
     physical location with multiple gateways:
@@ -226,21 +784,41 @@ def determine_network_location(**gateways):
                                              office=['00:15:C5:5F:92:79',
                                                      'B6:25:B2:19:28:61',
                                                      '00:18:8B:F8:AF:33'])
+
+    Instead of a list of MAC addresses a location can be defined by a
+    dictionary with the keys ``gateway`` (MAC addresses), ``domain`` (DNS
+    search domains), ``subnet`` (directly connected networks in CIDR notation)
+    and ``interface`` (the interface of the default route). The signals are
+    tried in this order, from the most to the least reliable:
+
+    .. code-block:: python
+
+       location = determine_network_location(home=['84:9C:A6:76:23:8E'],
+                                             office=dict(domain=['corp.example.com'],
+                                                         subnet=['10.20.0.0/16']),
+                                             tethered=dict(interface=['usb0']))
+
+    Repeated calls are cheap: The locations are indexed once and locations
+    recognized by their gateway are cached per default route (see
+    :mod:`dwim.location`).
     """
-    current_gateway_mac = find_gateway_mac()
-    if current_gateway_mac:
-        for network_name, known_gateways in gateways.items():
-            if any(current_gateway_mac.upper() == gateway.upper() for gateway in known_gateways):
-                logger.info("We're connected to the %s network.", network_name)
-                return network_name
-        logger.info("We're not connected to a known network (unknown gateway MAC address %s).", current_gateway_mac)
+    route = find_gateway_route()
+    location = get_location_resolver(locations).resolve(route, find_route_mac)
+    if location.name:
+        logger.info("We're connected to the %s network.", location.name)
+        logger.verbose("Matched %s network by %s (%s).", location.name, location.signal, location.value)
+        return location.name
+    elif location.gateway_mac:
+        logger.info("We're not connected to a known network (unknown gateway MAC address %s).", location.gateway_mac)
+    elif route:
+        logger.info("We're not connected to a known network (failed to determine gateway MAC address).")
     else:
         logger.info("Failed to determine gateway, assuming network connection is down.")
 
 
 def find_gateway_address():
     """
-    Find the IP address of the current gateway using the ``ip route`` command.
+    Find the IP address of the current gateway.
 
     :returns: The IP address of the gateway (a string) or :data:`None`.
 
@@ -249,72 +827,157 @@ def find_gateway_address():
     >>> find_gateway_address()
     '192.168.1.1'
     """
-    logger.verbose("Looking for IP address of current gateway ..")
-    for line in execute('ip', 'route', capture=True).splitlines():
-        tokens = line.split()
-        logger.debug("Parsing 'ip route' output: %s", tokens)
-        if len(tokens) >= 3 and tokens[:2] == ['default', 'via']:
-            ip_address = tokens[2]
-            logger.verbose("Found gateway IP address: %s", ip_address)
-            return ip_address
+    route = find_gateway_route()
+    return route.gateway if route else None
+
+
+@traced('network')
+def find_gateway_route():
+    """
+    Find the preferred default route.
 
+    :returns: A :class:`~dwim.network.Route` object or :data:`None`.
 
+    The routing table is read from ``/proc/net/route`` (see
+    :func:`dwim.network.find_default_routes()`). When that fails the
+    ``ip route`` command is used instead. When there are multiple default
+    routes the one with the lowest metric is selected (ties are broken by
+    interface name, so the result is deterministic).
+    """
+    logger.verbose("Looking for IP address of current gateway ..")
+    try:
+        routes = find_default_routes()
+    except EnvironmentError as e:
+        logger.verbose("Failed to read routing table, falling back to 'ip route' (%s).", e)
+        routes = []
+        for line in execute('ip', 'route', capture=True).splitlines():
+            tokens = line.split()
+            logger.debug("Parsing 'ip route' output: %s", tokens)
+            if len(tokens) >= 3 and tokens[:2] == ['default', 'via']:
+                options = dict(zip(tokens[3::2], tokens[4::2]))
+                routes.append(Route(interface=options.get('dev'),
+                                    gateway=tokens[2],
+                                    metric=int(options.get('metric', 0))))
+        routes.sort(key=lambda r: (r.metric, r.interface or ''))
+    if routes:
+        route = routes[0]
+        logger.verbose("Found gateway IP address: %s", route.gateway)
+        return route
+
+
+@traced('network')
 def find_gateway_mac():
     """
-    Find the MAC address of the current gateway using the ``arp -n`` command.
+    Find the MAC address of the current gateway.
 
     :returns: The MAC address of the gateway (a string) or ``None``.
 
+    The MAC address is read from ``/proc/net/arp`` (see
+    :func:`dwim.network.find_neighbour_mac()`). When that fails the
+    ``arp -n`` command is used instead.
+
     An example:
 
     >>> find_gateway_address()
     '192.168.1.1'
-    >>> find_gateway_mac(find_gateway_address())
+    >>> find_gateway_mac()
     '84:9c:a6:76:23:8e'
     """
-    ip_address = find_gateway_address()
-    if ip_address:
-        logger.verbose("Looking for MAC address of current gateway (%s) ..", ip_address)
+    route = find_gateway_route()
+    return find_route_mac(route) if route else None
+
+
+def find_route_mac(route):
+    """
+    Find the MAC address of the gateway of a route.
+
+    :param route: A :class:`~dwim.network.Route` object.
+    :returns: The MAC address of the gateway (a string) or ``None``.
+    """
+    logger.verbose("Looking for MAC address of current gateway (%s) ..", route.gateway)
+    try:
+        mac_address = find_neighbour_mac(route.gateway, route.interface)
+    except EnvironmentError as e:
+        logger.verbose("Failed to read ARP cache, falling back to 'arp -n' (%s).", e)
+        mac_address = None
         for line in execute('arp', '-n', capture=True).splitlines():
             tokens = line.split()
             logger.debug("Parsing 'arp -n' output: %s", tokens)
-            if len(tokens) >= 3 and tokens[0] == ip_address:
+            if len(tokens) >= 3 and tokens[0] == route.gateway:
                 mac_address = tokens[2]
-                logger.verbose("Found gateway MAC address: %s", mac_address)
-                return mac_address
+                break
+    if mac_address:
+        logger.verbose("Found gateway MAC address: %s", mac_address)
+        return mac_address
 
 
-def wait_for_internet_connection():
+@traced('network')
+def wait_for_internet_connection(timeout=None, probes=None, initial_delay=1, max_delay=30):
     """
     Wait for an active internet connection.
 
-    This works by sending ``ping`` requests to ``8.8.8.8`` (one of the Google
-    public DNS IPv4 addresses) and returning as soon as a ping request gets a
-    successful response. The ping interval and timeout is one second.
+    :param timeout: The maximum number of seconds to wait (a number or
+                    :data:`None` to wait indefinitely).
+    :param probes: A list of connectivity probes (see
+                   :func:`have_internet_connection()`).
+    :param initial_delay: The number of seconds between the first probes (a number).
+    :param max_delay: The maximum number of seconds between probes (a number).
+    :returns: :data:`True` when the internet connection is available,
+              :data:`False` when the timeout expired.
+
+    Instead of probing in a tight loop this function subscribes to rtnetlink
+    link, address and route events (see :class:`~dwim.network.NetworkMonitor`)
+    and probes immediately when the network configuration changes. In between
+    changes the delay between probes backs off exponentially from
+    `initial_delay` to `max_delay` seconds.
     """
+    from humanfriendly import Spinner, Timer
     timer = Timer()
     logger.info("Checking internet connection ..")
-    if have_internet_connection():
+    if have_internet_connection(probes):
         logger.info("We're already connected!")
-    else:
-        logger.info("We're not connected yet, waiting ..")
+        return True
+    logger.info("We're not connected yet, waiting ..")
+    deadline = time.time() + timeout if timeout is not None else None
+    delay = initial_delay
+    next_probe = time.time() + delay
+    with NetworkMonitor() as monitor:
         with Spinner(label="Waiting for internet connection", timer=timer) as spinner:
-            while not have_internet_connection():
+            while True:
                 spinner.step()
-                spinner.sleep()
-        logger.info("Internet connection is now ready (waited %s).", timer)
-
-
-def have_internet_connection():
+                now = time.time()
+                if deadline is not None and now >= deadline:
+                    logger.warning("Gave up waiting for internet connection (waited %s).", timer)
+                    return False
+                # Wake up at least once a second to animate the spinner.
+                wait_until = min(next_probe, deadline) if deadline is not None else next_probe
+                changed = monitor.wait(min(1, wait_until - now))
+                if changed or time.time() >= next_probe:
+                    if have_internet_connection(probes):
+                        logger.info("Internet connection is now ready (waited %s).", timer)
+                        return True
+                    delay = initial_delay if changed else min(delay * 2, max_delay)
+                    next_probe = time.time() + delay
+
+
+@traced('network')
+def have_internet_connection(probes=None):
     """
     Check if an internet connection is available.
 
+    :param probes: A list of connectivity probes (objects with a ``check()``
+                   method, like :class:`~dwim.network.TCPProbe` and
+                   :class:`~dwim.network.ICMPProbe`). The probes are run
+                   concurrently and the first successful probe wins.
     :returns: :data:`True` if an internet connection is available,
               :data:`False` otherwise.
 
-    This works by pinging 8.8.8.8 which is one of `Google's public DNS servers
-    <https://developers.google.com/speed/public-dns/>`_. This IP address was
-    chosen because it is documented that Google uses anycast to keep this IP
-    address available at all times.
+    By default this connects to the DNS port of 8.8.8.8 and pings 8.8.8.8
+    (using an unprivileged ICMP socket), which is one of `Google's public DNS
+    servers <https://developers.google.com/speed/public-dns/>`_. This IP
+    address was chosen because it is documented that Google uses anycast to
+    keep this IP address available at all times.
     """
-    return execute('ping', '-c1', '-w1', '8.8.8.8', check=False, silent=True)
+    if not probes:
+        probes = [TCPProbe('8.8.8.8', 53), ICMPProbe('8.8.8.8')]
+    return run_probes(probes)
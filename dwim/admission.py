@@ -0,0 +1,302 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Pressure aware admission control for launching programs.
+
+Starting dozens of programs at login saturates the CPU, disks and memory of
+small machines, which makes every program start slower than it would when
+the programs were staggered. Before :func:`.launch_program()` starts a
+program it asks the :class:`AdmissionController` for permission, which holds
+back the launch while the system is under pressure:
+
+- The pressure is read from the `pressure stall information`_ in
+  ``/proc/pressure/{cpu,io,memory}``. When the previous sample is at least
+  :data:`MIN_SAMPLE_AGE` seconds old the pressure is computed from the change
+  in the total stall time, so the controller notices quickly when pressure
+  drops (the ``avg10`` value of the kernel lags behind by several seconds).
+  Otherwise ``avg10`` is used, because the change over a few milliseconds is
+  mostly noise.
+
+- On kernels without pressure stall information the one minute load average
+  from ``/proc/loadavg`` (divided by the number of CPUs) is used instead.
+
+- Launches with :data:`LaunchPriority.critical` are never held back,
+  launches with :data:`LaunchPriority.low` are held back at half the
+  thresholds, and no launch is held back for more than the maximum delay.
+
+- Held back launches are admitted at least :data:`DEFAULT_INTERVAL` seconds
+  apart, so they don't all start at the same moment when the pressure drops.
+
+The thresholds can be changed from the profile using :func:`configure_admission()`.
+
+.. _pressure stall information: https://docs.kernel.org/accounting/psi.html
+"""
+
+# Standard library modules.
+import logging
+import os
+import threading
+import time
+
+# Python 2.x / 3.x compatibility.
+try:
+    from enum import Enum
+except ImportError:
+    from flufl.enum import Enum
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOT = '/proc'
+"""The default location of the ``proc`` file system (a string)."""
+
+DEFAULT_THRESHOLDS = dict(cpu=80, io=40, memory=20)
+"""
+The default pressure thresholds (a dictionary).
+
+The keys are the resources in ``/proc/pressure`` and the values are the
+percentages of time in which some tasks were stalled on the resource.
+"""
+
+DEFAULT_LOAD_THRESHOLD = 2.0
+"""The default threshold for the one minute load average per CPU (a number)."""
+
+DEFAULT_MAX_DELAY = 10
+"""The default maximum number of seconds that a launch is held back (a number)."""
+
+DEFAULT_INTERVAL = 0.25
+"""The number of seconds between pressure checks while a launch is held back (a number)."""
+
+MIN_SAMPLE_AGE = 1
+"""The minimum age in seconds of a sample used to compute the current pressure (a number)."""
+
+MAX_SAMPLE_AGE = 10
+"""The maximum age in seconds of a sample used to compute the current pressure (a number)."""
+
+# The controller shared by get_admission_controller().
+cached_controller = None
+
+# Serializes access to cached_controller.
+lock = threading.Lock()
+
+
+class LaunchPriority(Enum):
+
+    """
+    :class:`LaunchPriority` enumerates the priorities of :func:`.launch_program()`.
+
+    The priority determines whether and how a launch is held back while the
+    system is under pressure (see :class:`AdmissionController`).
+    """
+
+    critical = 1
+    """The program is started right away, regardless of the pressure."""
+
+    normal = 2
+    """The program is held back while the pressure exceeds the thresholds."""
+
+    low = 3
+    """The program is held back while the pressure exceeds half of the thresholds."""
+
+
+class AdmissionController(object):
+
+    """Hold back launches while the system is under pressure."""
+
+    def __init__(self, thresholds=None, load_threshold=DEFAULT_LOAD_THRESHOLD,
+                 max_delay=DEFAULT_MAX_DELAY, interval=DEFAULT_INTERVAL, root=DEFAULT_ROOT):
+        """
+        Initialize an :class:`AdmissionController` object.
+
+        :param thresholds: A dictionary with pressure thresholds (defaults to
+                           :data:`DEFAULT_THRESHOLDS`, the given thresholds
+                           are merged with the defaults).
+        :param load_threshold: The threshold for the one minute load average
+                               per CPU (a number).
+        :param max_delay: The maximum number of seconds that a launch is held
+                          back (a number).
+        :param interval: The number of seconds between pressure checks (a number).
+        :param root: The location of the ``proc`` file system (a string).
+        """
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.load_threshold = load_threshold
+        self.max_delay = max_delay
+        self.interval = interval
+        self.root = root
+        self.samples = {}
+        self.last_admission = 0
+        self.lock = threading.Lock()
+
+    def measure(self):
+        """
+        Measure the current pressure.
+
+        :returns: A dictionary with resource names as keys and pressure
+                  percentages as values, or a dictionary with the key
+                  ``load`` and the load average per CPU as value when
+                  pressure stall information isn't available.
+        """
+        pressure = {}
+        now = time.time()
+        for resource in self.thresholds:
+            sample = read_pressure(resource, self.root)
+            if sample is not None:
+                avg10, total = sample
+                with self.lock:
+                    previous = self.samples.get(resource)
+                    age = now - previous[0] if previous else None
+                    if age is not None and MIN_SAMPLE_AGE <= age <= MAX_SAMPLE_AGE:
+                        # The total stall time is measured in microseconds.
+                        pressure[resource] = (total - previous[1]) / (age * 10000.0)
+                        self.samples[resource] = (now, total)
+                    else:
+                        pressure[resource] = avg10
+                        # Keep a recent sample until it's old enough to use.
+                        if age is None or not 0 <= age <= MAX_SAMPLE_AGE:
+                            self.samples[resource] = (now, total)
+        if not pressure:
+            load = read_load(self.root)
+            if load is not None:
+                pressure['load'] = load
+        return pressure
+
+    def check(self, priority=LaunchPriority.normal):
+        """
+        Check whether the system is under pressure.
+
+        :param priority: A :class:`LaunchPriority` value.
+        :returns: A description of the pressure (a string) when the system is
+                  under pressure, :data:`None` otherwise.
+        """
+        scale = 0.5 if priority == LaunchPriority.low else 1.0
+        for resource, value in sorted(self.measure().items()):
+            if resource == 'load':
+                threshold = self.load_threshold * scale
+                if value > threshold:
+                    return "load average per CPU is %.2f (threshold is %.2f)" % (value, threshold)
+            else:
+                threshold = self.thresholds[resource] * scale
+                if value > threshold:
+                    return "%s pressure is %.1f%% (threshold is %.1f%%)" % (resource, value, threshold)
+        return None
+
+    def admit(self, priority=LaunchPriority.normal):
+        """
+        Wait until a program can be started.
+
+        :param priority: A :class:`LaunchPriority` value.
+        :returns: The number of seconds that the launch was held back (a number).
+        """
+        if priority == LaunchPriority.critical:
+            return 0
+        start_time = time.time()
+        deadline = start_time + self.max_delay
+        reason = self.check(priority)
+        if not reason:
+            return 0
+        logger.info("Holding back launch because %s ..", reason)
+        while reason:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                logger.info("Admitting launch after maximum delay (%s).", reason)
+                break
+            time.sleep(min(self.interval, remaining))
+            reason = self.check(priority)
+        # Stagger the launches that were held back.
+        with self.lock:
+            now = time.time()
+            admission_time = max(now, self.last_admission + self.interval)
+            self.last_admission = admission_time
+        if admission_time > now:
+            time.sleep(admission_time - now)
+        return time.time() - start_time
+
+
+def configure_admission(**options):
+    """
+    Configure the admission control used by :func:`.launch_program()`.
+
+    :param options: Any keyword arguments are passed on to :class:`AdmissionController`.
+
+    Here's an example of a profile that tolerates more I/O pressure and
+    holds back launches for at most five seconds:
+
+    .. code-block:: python
+
+       configure_admission(thresholds=dict(io=60), max_delay=5)
+    """
+    global cached_controller
+    with lock:
+        cached_controller = AdmissionController(**options)
+
+
+def get_admission_controller():
+    """
+    Get the admission controller used by :func:`.launch_program()`.
+
+    :returns: An :class:`AdmissionController` object (created on first use).
+    """
+    global cached_controller
+    with lock:
+        if cached_controller is None:
+            cached_controller = AdmissionController()
+        return cached_controller
+
+
+def coerce_priority(value):
+    """
+    Coerce a value to a :class:`LaunchPriority`.
+
+    :param value: A :class:`LaunchPriority` value or the name of one (a string).
+    :returns: A :class:`LaunchPriority` value.
+    :raises: :exc:`~exceptions.ValueError` when the value isn't a known priority.
+    """
+    if isinstance(value, LaunchPriority):
+        return value
+    try:
+        return LaunchPriority[value]
+    except KeyError:
+        raise ValueError("Unknown launch priority %r!" % value)
+
+
+def read_pressure(resource, root=DEFAULT_ROOT):
+    """
+    Read the pressure stall information of a resource.
+
+    :param resource: The name of a resource (``cpu``, ``io`` or ``memory``).
+    :param root: The location of the ``proc`` file system (a string).
+    :returns: A tuple with the ``avg10`` percentage (a number) and the
+              ``total`` stall time in microseconds (an integer) of the
+              ``some`` line, or :data:`None` when pressure stall information
+              isn't available.
+    """
+    try:
+        with open(os.path.join(root, 'pressure', resource)) as handle:
+            for line in handle:
+                tokens = line.split()
+                if tokens and tokens[0] == 'some':
+                    fields = dict(token.split('=', 1) for token in tokens[1:])
+                    return float(fields['avg10']), int(fields['total'])
+    except (EnvironmentError, KeyError, ValueError):
+        pass
+    return None
+
+
+def read_load(root=DEFAULT_ROOT):
+    """
+    Read the one minute load average per CPU.
+
+    :param root: The location of the ``proc`` file system (a string).
+    :returns: The load average divided by the number of online CPUs (a
+              number) or :data:`None` when it can't be read.
+    """
+    try:
+        with open(os.path.join(root, 'loadavg')) as handle:
+            load = float(handle.read().split()[0])
+        return load / max(1, os.sysconf('SC_NPROCESSORS_ONLN'))
+    except (EnvironmentError, IndexError, ValueError):
+        return None
@@ -0,0 +1,271 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Asynchronous counterparts of the profile helpers (requires Python 3.5+).
+
+The helpers in :mod:`dwim` block until they're done, so a profile that waits
+for the internet connection can't start local programs or set the wallpaper
+in the meantime. The coroutines in this module are built on :mod:`asyncio`
+subprocesses and sockets instead. A profile that defines ``async def main()``
+gets it run on an event loop by :func:`.dwim()`:
+
+.. code-block:: python
+
+   async def main():
+       await asyncio.gather(
+           launch_program_async('pidgin'),
+           set_random_background_async('feh --bg-scale {image}', os.path.expanduser('~/Pictures/Backgrounds')),
+           wait_for_internet_connection_async(timeout=60),
+       )
+
+Work that only reads local files (like scanning a wallpaper directory or
+reading ``/proc/net/route``) is done in the default executor of the event
+loop, so it doesn't block the other coroutines either.
+"""
+
+# Standard library modules.
+import asyncio
+import functools
+import time
+
+# External dependencies.
+from verboselogs import VerboseLogger
+
+# Modules included in our package.
+from dwim import (
+    LaunchStatus,
+    determine_network_location,
+    launch_steps,
+    select_random_background,
+    shell_arguments,
+    start_in_shell,
+)
+from dwim.admission import LaunchPriority
+from dwim.network import ICMPProbe, NetworkMonitor, TCPProbe
+from dwim.readiness import DEFAULT_READY_TIMEOUT
+from dwim.tracing import count_subprocess, in_current_context, span
+
+# Initialize a logger for this module.
+logger = VerboseLogger(__name__)
+
+
+def run_main(main):
+    """
+    Run the ``main()`` coroutine function defined by a profile.
+
+    :param main: A coroutine function that takes no arguments.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(main())
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+async def run_command(*args):
+    """
+    Run an external command without blocking the event loop.
+
+    :param args: The program and its arguments (strings).
+    :returns: :data:`True` if the command exited with status zero,
+              :data:`False` otherwise.
+    """
+    logger.debug("Executing external command: %s", ' '.join(args))
+    with span('execute', 'subprocess', command=' '.join(args)):
+        count_subprocess()
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        return await process.wait() == 0
+
+
+async def launch_program_async(command, is_running=None, ready=None, ready_timeout=DEFAULT_READY_TIMEOUT,
+                               priority=LaunchPriority.normal, resource_class=None):
+    """
+    Start a program if it's not already running (without blocking).
+
+    :param command: The shell command used to launch the application (a string).
+    :param is_running: The shell command used to check whether the application
+                       is already running (a string, optional) or a
+                       :class:`~dwim.processes.ProcessMatcher` object (or a
+                       list of them that all have to match the same process).
+    :param ready: A readiness condition (a
+                  :class:`~dwim.readiness.ReadinessCondition` object,
+                  optional).
+    :param ready_timeout: The maximum number of seconds to wait for the
+                          readiness condition (a number).
+    :param priority: A :class:`~dwim.admission.LaunchPriority` value or the
+                     name of one (a string, defaults to ``normal``).
+    :param resource_class: A :class:`~dwim.resources.ResourceClass` object or
+                           the name of one (a string, optional).
+    :returns: One of the values from the :class:`~dwim.LaunchStatus` enumeration.
+
+    Refer to :func:`.launch_program()` for details. Every step yielded by
+    :func:`.launch_steps()` (resolving the program, the ledger and process
+    table checks, admission control, forking the new process and waiting
+    for readiness) runs in the default executor of the event loop, except
+    for starting a command using a shell, which uses an asyncio subprocess.
+    The event loop thread itself only parses the command line and updates
+    the trace.
+    """
+    loop = asyncio.get_event_loop()
+    steps = launch_steps(command, is_running, ready, ready_timeout, priority, resource_class)
+    step = next(steps)
+    while not isinstance(step, LaunchStatus):
+        function, args = step[0], step[1:]
+        try:
+            if function is start_in_shell:
+                result = await run_command(*shell_arguments(*args))
+            else:
+                result = await loop.run_in_executor(None, in_current_context(function), *args)
+        except Exception as e:
+            step = steps.throw(e)
+        else:
+            step = steps.send(result)
+    return step
+
+
+async def determine_network_location_async(**locations):
+    """
+    Determine the physical location of this computer (without blocking).
+
+    :param locations: Refer to :func:`.determine_network_location()`.
+    :returns: The name of the matched location (a string) or ``None`` when
+              the current network is unknown.
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, functools.partial(determine_network_location, **locations))
+
+
+async def set_random_background_async(command, directory, index=True, scale=False, screen_size=None):
+    """
+    Set a random desktop wallpaper / background (without blocking).
+
+    :param command: The command to set the wallpaper (a string containing an
+                    ``{image}`` marker).
+    :param directory: The pathname of a directory containing wallpapers (a
+                      string).
+    :param index: Refer to :func:`.set_random_background()`.
+    :param scale: Refer to :func:`.set_random_background()`.
+    :param screen_size: Refer to :func:`.set_random_background()`.
+    :raises: :exc:`~exceptions.ValueError` when the `command` string doesn't
+             contain an ``{image}`` placeholder.
+    """
+    from executor import quote
+    if '{image}' not in command:
+        raise ValueError("The 1st argument should contain an {image} marker!")
+    with span('set_random_background', 'backgrounds'):
+        loop = asyncio.get_event_loop()
+        selected_background = await loop.run_in_executor(
+            None, in_current_context(select_random_background), directory, index, scale, screen_size,
+        )
+        if selected_background:
+            await run_command('sh', '-c', command.format(image=quote(selected_background)))
+
+
+async def have_internet_connection_async(probes=None):
+    """
+    Check if an internet connection is available (without blocking).
+
+    :param probes: Refer to :func:`.have_internet_connection()`.
+    :returns: :data:`True` if an internet connection is available,
+              :data:`False` otherwise.
+
+    :class:`~dwim.network.TCPProbe` objects are run using asyncio sockets,
+    other probes are run in the default executor of the event loop.
+    """
+    if not probes:
+        probes = [TCPProbe('8.8.8.8', 53), ICMPProbe('8.8.8.8')]
+    with span('have_internet_connection', 'network'):
+        pending = [asyncio.ensure_future(run_probe(probe)) for probe in probes]
+        try:
+            for future in asyncio.as_completed(pending):
+                if await future:
+                    return True
+            return False
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+async def run_probe(probe):
+    """
+    Run a connectivity probe without blocking.
+
+    :param probe: A probe object (e.g. :class:`~dwim.network.TCPProbe`).
+    :returns: :data:`True` if the probe succeeded, :data:`False` otherwise.
+    """
+    if isinstance(probe, TCPProbe):
+        try:
+            connection = asyncio.open_connection(probe.host, probe.port)
+            _, writer = await asyncio.wait_for(connection, probe.timeout)
+            writer.close()
+            return True
+        except (asyncio.TimeoutError, EnvironmentError) as e:
+            logger.debug("%s failed! (%s)", probe, e)
+            return False
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, probe.check)
+
+
+async def wait_for_internet_connection_async(timeout=None, probes=None, initial_delay=1, max_delay=30):
+    """
+    Wait for an active internet connection (without blocking).
+
+    :param timeout: The maximum number of seconds to wait (a number or
+                    :data:`None` to wait indefinitely).
+    :param probes: Refer to :func:`.have_internet_connection()`.
+    :param initial_delay: The number of seconds between the first probes (a number).
+    :param max_delay: The maximum number of seconds between probes (a number).
+    :returns: :data:`True` when the internet connection is available,
+              :data:`False` when the timeout expired.
+
+    Refer to :func:`.wait_for_internet_connection()` for details. Unlike
+    the blocking version this doesn't show a spinner, because other
+    coroutines are expected to log messages in the meantime.
+    """
+    with span('wait_for_internet_connection', 'network'):
+        start_time = time.time()
+        logger.info("Checking internet connection ..")
+        if await have_internet_connection_async(probes):
+            logger.info("We're already connected!")
+            return True
+        logger.info("We're not connected yet, waiting ..")
+        deadline = start_time + timeout if timeout is not None else None
+        delay = initial_delay
+        loop = asyncio.get_event_loop()
+        changed = asyncio.Event()
+        with NetworkMonitor() as monitor:
+            if monitor.socket:
+                # Drain the rtnetlink socket and wake up the loop below.
+                loop.add_reader(monitor.fileno, lambda: monitor.wait(0) and changed.set())
+            try:
+                while True:
+                    wait_time = delay if deadline is None else min(delay, deadline - time.time())
+                    if wait_time <= 0:
+                        logger.warning("Gave up waiting for internet connection (waited %.1f seconds).",
+                                       time.time() - start_time)
+                        return False
+                    try:
+                        await asyncio.wait_for(changed.wait(), wait_time)
+                    except asyncio.TimeoutError:
+                        pass
+                    was_changed = changed.is_set()
+                    changed.clear()
+                    if await have_internet_connection_async(probes):
+                        logger.info("Internet connection is now ready (waited %.1f seconds).",
+                                    time.time() - start_time)
+                        return True
+                    delay = initial_delay if was_changed else min(delay * 2, max_delay)
+            finally:
+                if monitor.socket:
+                    loop.remove_reader(monitor.fileno)
@@ -0,0 +1,440 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Efficient random selection of desktop backgrounds.
+
+:func:`.set_random_background()` used to walk the whole wallpaper directory
+on every run to build a list of images, just to pick one. For large
+collections (especially on network file systems) that's a lot of work, so
+this module provides two alternatives:
+
+- :class:`WallpaperIndex` keeps a persistent index on disk that is keyed by
+  the modification time of each directory, so only directories whose
+  contents changed are listed again.
+
+- :func:`select_streaming()` walks the directory tree and uses reservoir
+  sampling to pick an image in constant memory, without any index.
+
+Both select uniformly from all of the images in the directory tree.
+
+Desktop backgrounds are often much larger than the screen, which means the
+desktop has to decode and scale a huge image at login. :class:`ScaledCache`
+maintains screen sized copies of desktop backgrounds, generated by a
+detached background process. This requires Pillow_ to be installed.
+
+.. _Pillow: https://pypi.python.org/pypi/Pillow
+"""
+
+# Standard library modules.
+import glob
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+# Modules included in our package.
+from dwim.xdg import cache_directory
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT = 1
+"""The version of the on-disk index format (an integer)."""
+
+EXTENSIONS = ('.jpg', '.jpeg', '.png')
+"""The filename extensions of desktop backgrounds (a tuple of strings)."""
+
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 512
+"""The default maximum size of a :class:`ScaledCache` in bytes (an integer)."""
+
+DEFAULT_PRESCALE = 4
+"""The default number of extra desktop backgrounds that :func:`.set_random_background()` scales ahead of time."""
+
+
+class WallpaperIndex(object):
+
+    """A persistent index of the desktop backgrounds in a directory tree."""
+
+    def __init__(self, directory, cache_file=None):
+        """
+        Initialize a :class:`WallpaperIndex` object.
+
+        :param directory: The pathname of the directory with desktop
+                          backgrounds (a string).
+        :param cache_file: The pathname of the on-disk index (a string,
+                           defaults to a file in ``$XDG_CACHE_HOME/dwim``
+                           that is unique to `directory`). Pass an empty
+                           string to disable the on-disk index.
+        """
+        self.directory = os.path.abspath(directory)
+        if cache_file is None:
+            digest = hashlib.sha1(self.directory.encode('UTF-8')).hexdigest()
+            cache_file = cache_directory('backgrounds-%s.json' % digest[:16])
+        self.cache_file = cache_file
+        self.directories = {}
+        self.update()
+
+    @property
+    def count(self):
+        """The number of desktop backgrounds in the index (an integer)."""
+        return sum(len(entry['files']) for entry in self.directories.values())
+
+    def update(self):
+        """
+        Bring the index up to date with the file system.
+
+        Every directory in the tree is checked with a single ``stat()`` call.
+        Only the directories whose modification time changed are listed.
+        """
+        cached_directories = self.read_cache()
+        directories = {}
+        num_listed = 0
+        pending = ['']
+        while pending:
+            relative_path = pending.pop()
+            pathname = os.path.join(self.directory, relative_path)
+            try:
+                mtime = os.stat(pathname).st_mtime
+            except EnvironmentError:
+                continue
+            entry = cached_directories.get(relative_path)
+            if not (entry and entry['mtime'] == mtime):
+                entry = scan_directory(pathname)
+                entry['mtime'] = mtime
+                num_listed += 1
+            directories[relative_path] = entry
+            pending.extend(os.path.join(relative_path, name) for name in entry['subdirectories'])
+        self.directories = directories
+        logger.debug("Indexed %i desktop backgrounds in %i directories (%i listed).",
+                     self.count, len(directories), num_listed)
+        if num_listed or len(directories) != len(cached_directories):
+            self.write_cache()
+
+    def select(self):
+        """
+        Select a random desktop background.
+
+        :returns: The pathname of a desktop background (a string) or
+                  :data:`None` when the index is empty.
+        """
+        total = self.count
+        if total:
+            position = random.randrange(total)
+            for relative_path in sorted(self.directories):
+                files = self.directories[relative_path]['files']
+                if position < len(files):
+                    return os.path.join(self.directory, relative_path, files[position])
+                position -= len(files)
+        return None
+
+    def read_cache(self):
+        """
+        Read the on-disk index.
+
+        :returns: A dictionary with relative directory pathnames as keys and
+                  dictionaries with the keys ``mtime``, ``files`` and
+                  ``subdirectories`` as values (an empty dictionary when the
+                  index is unavailable).
+        """
+        if self.cache_file:
+            try:
+                with open(self.cache_file) as handle:
+                    contents = json.load(handle)
+                if contents.get('format') == CACHE_FORMAT and contents.get('directory') == self.directory:
+                    return contents['directories']
+            except Exception as e:
+                logger.debug("Ignoring desktop background index %s! (%s)", self.cache_file, e)
+        return {}
+
+    def write_cache(self):
+        """Save the index to disk."""
+        if self.cache_file:
+            temporary_file = '%s.%i' % (self.cache_file, os.getpid())
+            try:
+                directory = os.path.dirname(self.cache_file)
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                with open(temporary_file, 'w') as handle:
+                    json.dump(dict(format=CACHE_FORMAT, directory=self.directory, directories=self.directories), handle)
+                os.rename(temporary_file, self.cache_file)
+            except Exception as e:
+                logger.debug("Failed to save desktop background index %s! (%s)", self.cache_file, e)
+
+
+def select_streaming(directory):
+    """
+    Select a random desktop background without building an index.
+
+    :param directory: The pathname of a directory with desktop backgrounds (a string).
+    :returns: The pathname of a desktop background (a string) or
+              :data:`None` when the directory doesn't contain any.
+
+    This uses reservoir sampling: The n-th desktop background that is
+    encountered replaces the current selection with probability 1/n, which
+    makes the selection uniform while using constant memory.
+    """
+    selected = None
+    count = 0
+    for root, dirs, files in os.walk(directory):
+        for filename in files:
+            if is_background(filename):
+                count += 1
+                if random.randrange(count) == 0:
+                    selected = os.path.join(root, filename)
+    logger.debug("Sampled 1 of %i desktop backgrounds.", count)
+    return selected
+
+
+def scan_directory(pathname):
+    """
+    List the desktop backgrounds and subdirectories in a directory.
+
+    :param pathname: The pathname of a directory (a string).
+    :returns: A dictionary with the keys ``files`` and ``subdirectories``
+              (each a sorted list of filenames).
+    """
+    files = []
+    subdirectories = []
+    try:
+        entries = os.listdir(pathname)
+    except EnvironmentError:
+        entries = []
+    for name in entries:
+        entry = os.path.join(pathname, name)
+        # Like os.walk() we don't follow symbolic links to directories.
+        if os.path.isdir(entry) and not os.path.islink(entry):
+            subdirectories.append(name)
+        elif is_background(name):
+            files.append(name)
+    return dict(files=sorted(files), subdirectories=sorted(subdirectories))
+
+
+def is_background(filename):
+    """
+    Check whether a filename refers to a desktop background.
+
+    :param filename: The filename to check (a string).
+    :returns: :data:`True` if the filename has one of the :data:`EXTENSIONS`,
+              :data:`False` otherwise.
+    """
+    return filename.lower().endswith(EXTENSIONS)
+
+
+class ScaledCache(object):
+
+    """
+    A size bounded cache of desktop backgrounds scaled to the screen size.
+
+    Cached copies are invalidated when the modification time of the original
+    changes and the least recently used copies are evicted when the cache
+    grows beyond its maximum size. The access time of cached copies is
+    maintained explicitly, so this works on file systems mounted with
+    ``noatime`` as well.
+    """
+
+    def __init__(self, size, directory=None, max_size=DEFAULT_CACHE_SIZE):
+        """
+        Initialize a :class:`ScaledCache` object.
+
+        :param size: The screen size (a tuple with two integers: the width
+                     and height in pixels).
+        :param directory: The pathname of the cache directory (a string,
+                          defaults to ``$XDG_CACHE_HOME/dwim/backgrounds/WxH``).
+        :param max_size: The maximum size of the cache in bytes (an integer,
+                         defaults to :data:`DEFAULT_CACHE_SIZE`).
+        """
+        self.size = tuple(size)
+        self.directory = directory or cache_directory('backgrounds', '%ix%i' % self.size)
+        self.max_size = max_size
+
+    def get_filename(self, pathname):
+        """
+        Get the pathname of the scaled copy of a desktop background.
+
+        :param pathname: The pathname of the original image (a string).
+        :returns: The pathname of the (possibly nonexisting) scaled copy (a string).
+        """
+        pathname = os.path.abspath(pathname)
+        digest = hashlib.sha1(pathname.encode('UTF-8')).hexdigest()
+        extension = '.png' if pathname.lower().endswith('.png') else '.jpg'
+        return os.path.join(self.directory, digest + extension)
+
+    def lookup(self, pathname):
+        """
+        Find an up to date scaled copy of a desktop background.
+
+        :param pathname: The pathname of the original image (a string).
+        :returns: The pathname of the scaled copy (a string) or :data:`None`
+                  when there's no up to date copy.
+        """
+        filename = self.get_filename(pathname)
+        try:
+            source_mtime = os.stat(pathname).st_mtime
+            if os.stat(filename).st_mtime == source_mtime:
+                # Record the access for the least recently used eviction policy.
+                os.utime(filename, (time.time(), source_mtime))
+                return filename
+        except EnvironmentError:
+            pass
+        return None
+
+    def generate(self, pathnames):
+        """
+        Create scaled copies of desktop backgrounds in a detached background process.
+
+        :param pathnames: The pathnames of the original images (a list of strings).
+
+        This returns immediately. The images are scaled by a new Python
+        process (see :func:`main()`) that is started using
+        :func:`~dwim.spawn.spawn_double_fork()` and prunes the cache when
+        it's done, so nothing is left behind in long running processes like
+        ``dwim --daemon`` (the new process isn't our child) and no worker
+        processes are forked from a process that may be running threads.
+        The module search path is passed on using ``$PYTHONPATH`` so that
+        the new process imports the same :mod:`dwim` package.
+        """
+        from dwim.spawn import spawn_double_fork
+        todo = []
+        for pathname in pathnames:
+            filename = self.get_filename(pathname)
+            if not any(t[1] == filename for t in todo) and not self.lookup(pathname):
+                todo.append((pathname, filename, self.size))
+        if todo:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            logger.debug("Scaling %i desktop backgrounds to %ix%i in the background ..",
+                         len(todo), self.size[0], self.size[1])
+            request = dict(directory=self.directory, size=self.size, max_size=self.max_size, todo=todo)
+            arguments = [sys.executable, '-c', 'from dwim.backgrounds import main; main()', json.dumps(request)]
+            environment = dict(os.environ, PYTHONPATH=os.pathsep.join(os.path.abspath(p) for p in sys.path))
+            try:
+                spawn_double_fork(sys.executable, arguments, environment=environment)
+            except EnvironmentError as e:
+                logger.warning("Failed to start process to scale desktop backgrounds! (%s)", e)
+
+    def prune(self):
+        """Evict the least recently used scaled copies until the cache fits within its maximum size."""
+        entries = []
+        total = 0
+        for filename in glob.glob(os.path.join(self.directory, '*')):
+            try:
+                info = os.stat(filename)
+            except EnvironmentError:
+                continue
+            entries.append((info.st_atime, info.st_size, filename))
+            total += info.st_size
+        entries.sort()
+        while entries and total > self.max_size:
+            atime, size, filename = entries.pop(0)
+            logger.debug("Evicting scaled desktop background %s ..", filename)
+            try:
+                os.unlink(filename)
+            except EnvironmentError:
+                pass
+            total -= size
+
+
+def scale_image(arguments):
+    """
+    Create a scaled copy of an image (runs in the process started by :func:`ScaledCache.generate()`).
+
+    :param arguments: A tuple with the pathname of the original image (a
+                      string), the pathname of the scaled copy (a string)
+                      and the screen size (a tuple of two integers).
+    :returns: :data:`True` if the scaled copy was created, :data:`False` otherwise.
+
+    The image is scaled (preserving its aspect ratio) so that it just covers
+    the screen. Images are never enlarged. The modification time of the
+    scaled copy is set to that of the original, this is how stale copies
+    are detected.
+    """
+    source, target, size = arguments
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning("Can't scale desktop backgrounds because Pillow isn't installed!")
+        return False
+    temporary_file = '%s.%i%s' % (target, os.getpid(), os.path.splitext(target)[1])
+    try:
+        source_mtime = os.stat(source).st_mtime
+        image = Image.open(source)
+        factor = max(float(size[0]) / image.size[0], float(size[1]) / image.size[1])
+        if factor < 1:
+            scaled_size = (int(round(image.size[0] * factor)), int(round(image.size[1] * factor)))
+            # Let the JPEG decoder skip detail we're going to throw away anyway.
+            image.draft(image.mode, scaled_size)
+            image = image.resize(scaled_size, Image.LANCZOS)
+        if target.endswith('.jpg'):
+            image.convert('RGB').save(temporary_file, quality=90)
+        else:
+            image.save(temporary_file)
+        os.utime(temporary_file, (time.time(), source_mtime))
+        os.rename(temporary_file, target)
+        return True
+    except Exception as e:
+        logger.warning("Failed to scale desktop background %s! (%s)", source, e)
+        if os.path.exists(temporary_file):
+            os.unlink(temporary_file)
+        return False
+
+
+def find_screen_size(root='/sys/class/drm'):
+    """
+    Find the size of the largest connected screen.
+
+    :param root: The location of the DRM devices in ``sysfs`` (a string).
+    :returns: A tuple with two integers (the width and height in pixels) or
+              :data:`None` when the screen size can't be determined.
+
+    The preferred mode of each connected output is read from ``sysfs``,
+    which avoids running ``xrandr``.
+    """
+    sizes = []
+    for directory in glob.glob(os.path.join(root, 'card*-*')):
+        try:
+            with open(os.path.join(directory, 'status')) as handle:
+                if handle.read().strip() != 'connected':
+                    continue
+            with open(os.path.join(directory, 'modes')) as handle:
+                mode = handle.readline().strip()
+            width, height = mode.split('x', 1)
+            # Interlaced modes have an `i' suffix.
+            sizes.append((int(width), int(height.rstrip('i'))))
+        except (EnvironmentError, ValueError):
+            continue
+    return max(sizes, key=lambda s: s[0] * s[1]) if sizes else None
+
+
+def main():
+    """
+    Create scaled copies of desktop backgrounds and prune the cache.
+
+    This is the entry point of the process started by
+    :func:`ScaledCache.generate()`, which passes the cache directory, screen
+    size, maximum cache size and the images to scale as a JSON encoded
+    command line argument. Multiple images are scaled by a process pool
+    (this process doesn't run any threads, so forking is safe here).
+    """
+    import multiprocessing
+    request = json.loads(sys.argv[1])
+    cache = ScaledCache(request['size'], request['directory'], request['max_size'])
+    todo = [(source, target, cache.size) for source, target, size in request['todo']]
+    num_processes = min(len(todo), multiprocessing.cpu_count())
+    if num_processes > 1:
+        pool = multiprocessing.Pool(num_processes)
+        try:
+            pool.map(scale_image, todo)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for arguments in todo:
+            scale_image(arguments)
+    cache.prune()
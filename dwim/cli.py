@@ -1,7 +1,7 @@
 # dwim: Location aware application launcher.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: May 29, 2017
+# Last Change: October 16, 2026
 # URL: https://dwim.readthedocs.io
 
 """
@@ -22,12 +22,52 @@ your applications are started automatically. If you run dwim again it will
 not start duplicate instances of your applications, but when you quit an
 application and then rerun dwim the application will be started again.
 
+Every run is recorded in ~/.local/state/dwim/history.jsonl (or below
+$XDG_STATE_HOME when it's set) so that you can use --stats to find out
+whether dwim or any of your programs became slower over time.
+
 Supported options:
 
   -c, --config=FILE
 
     Override the default location of the profile script.
 
+  -t, --trace=FILE
+
+    Record a timeline of where the time went while running the profile
+    (waiting for the network, checking and starting programs, etc.) and
+    save it to FILE in the Chrome trace event format. The resulting file
+    can be loaded into chrome://tracing or https://ui.perfetto.dev.
+
+  -d, --daemon
+
+    Stay resident and evaluate the profile again whenever the network
+    configuration changes, a program checked by the profile exits or five
+    minutes have passed. While the daemon is running the dwim program
+    forwards its work to the daemon (unless --trace is given).
+
+  -S, --system
+
+    Evaluate the profiles of all logged in users (this requires root
+    privileges and is intended to be run by a system service). The network
+    location, process table and $PATH index are prepared once and shared,
+    after which each profile is evaluated by a worker process running as
+    the user that owns the profile. The number of concurrent workers is
+    bounded and a worker that takes too long is killed.
+
+  -f, --force
+
+    Evaluate the profile even when nothing changed since the last run. By
+    default the profile isn't evaluated when the profile, the gateway and
+    the programs started by dwim are the same as after the last run (and
+    those programs are all still running).
+
+  -s, --stats
+
+    Show latency percentiles of the recorded runs (the total wall time, each
+    phase and checking and starting each program) and flag the metrics
+    whose latency regressed over the last few runs, then exit.
+
   -v, --verbose
 
     Increase logging verbosity (can be repeated).
@@ -44,10 +84,9 @@ Supported options:
 # Standard library modules.
 import getopt
 import sys
+import time
 
 # External dependencies.
-import coloredlogs
-from humanfriendly.terminal import usage, warning
 from verboselogs import VerboseLogger
 
 # Initialize a logger for this module.
@@ -57,31 +96,112 @@ logger = VerboseLogger(__name__)
 def main():
     """Command line interface for the ``dwim`` program."""
     from dwim import DEFAULT_PROFILE, dwim
-    # Initialize logging to the terminal.
-    coloredlogs.install()
     # Define the command line option defaults.
     profile_script = DEFAULT_PROFILE
-    # Parse the command line arguments.
+    trace_file = None
+    run_daemon = False
+    run_system = False
+    force = False
+    verbosity = 0
+    # Parse the command line arguments. Logging isn't initialized (and
+    # coloredlogs isn't imported) until we know the profile needs to be
+    # evaluated, to keep the no-op fast path cheap.
     try:
-        options, _ = getopt.getopt(sys.argv[1:], 'c:vqh', [
-            'config=', 'verbose', 'quiet', 'help',
+        options, _ = getopt.getopt(sys.argv[1:], 'c:t:dSfsvqh', [
+            'config=', 'trace=', 'daemon', 'system', 'force', 'stats', 'verbose', 'quiet', 'help',
         ])
         for option, value in options:
             if option in ('-c', '--config'):
                 profile_script = value
+            elif option in ('-t', '--trace'):
+                trace_file = value
+            elif option in ('-d', '--daemon'):
+                run_daemon = True
+            elif option in ('-S', '--system'):
+                run_system = True
+            elif option in ('-f', '--force'):
+                force = True
+            elif option in ('-s', '--stats'):
+                from dwim.history import format_report, read_records
+                print(format_report(read_records()))
+                sys.exit(0)
             elif option in ('-v', '--verbose'):
-                coloredlogs.increase_verbosity()
+                verbosity += 1
             elif option in ('-q', '--quiet'):
-                coloredlogs.decrease_verbosity()
+                verbosity -= 1
             elif option in ('-h', '--help'):
+                from humanfriendly.terminal import usage
                 usage(__doc__)
                 sys.exit(0)
     except Exception as e:
+        from humanfriendly.terminal import warning
         warning("Error: Failed to parse command line arguments! (%s)", e)
         sys.exit(1)
+    if not (run_daemon or run_system or trace_file or force):
+        from dwim.fingerprint import is_unchanged
+        if is_unchanged(profile_script):
+            sys.exit(0)
+    # Initialize logging to the terminal.
+    import coloredlogs
+    coloredlogs.install()
+    for _ in range(abs(verbosity)):
+        if verbosity > 0:
+            coloredlogs.increase_verbosity()
+        else:
+            coloredlogs.decrease_verbosity()
     # Execute the requested action(s).
+    if run_daemon:
+        from dwim.daemon import Daemon
+        try:
+            Daemon(profile_script).run()
+        except Exception:
+            logger.exception("Daemon terminated by fatal exception!")
+            sys.exit(1)
+        return
+    if run_system:
+        from dwim.system import SystemService
+        try:
+            reports = SystemService(profile_script).run()
+        except Exception:
+            logger.exception("Failed to evaluate profiles of logged in users!")
+            sys.exit(1)
+        sys.exit(0 if all(r['status'] in ('ok', 'skipped') for r in reports) else 1)
+    if not trace_file:
+        from dwim.daemon import forward
+        response = forward(profile_script)
+        if response is not None:
+            report_forwarded(response)
+            sys.exit(0 if response['status'] == 'ok' else 1)
+    # The time per activity is always collected because the run history is
+    # derived from it, the individual spans are only recorded for --trace.
+    from dwim.fingerprint import save_fingerprint
+    from dwim.history import append_record, create_record
+    from dwim.tracing import start_tracing
+    tracer = start_tracing(timeline=bool(trace_file))
+    start_time = time.time()
     try:
         dwim(profile_script)
+        save_fingerprint(profile_script, tracer)
     except Exception:
         logger.exception("Caught a fatal exception! Terminating ..")
         sys.exit(1)
+    finally:
+        append_record(create_record(tracer, time.time() - start_time))
+        if trace_file:
+            tracer.save(trace_file)
+            logger.info("Saved timeline of %i events to %s.", len(tracer.events), trace_file)
+
+
+def report_forwarded(response):
+    """
+    Report the result of a profile evaluation that was forwarded to the daemon.
+
+    :param response: The response of the daemon (a dictionary).
+    """
+    from humanfriendly import format_timespan
+    logger.info("Daemon (pid %i) evaluated profile in %s.",
+                response['pid'], format_timespan(response['elapsed_time'], detailed=True))
+    for command, status in sorted(response['programs'].items()):
+        logger.verbose("%s: %s", command, status)
+    if response['status'] != 'ok':
+        logger.error("Daemon failed to evaluate profile! (%s)", response.get('message'))
@@ -0,0 +1,243 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Running "is running" shell commands in long lived shell coprocesses.
+
+Some "is running" checks really need a shell (because they use ``$HOME``,
+globs or pipes) and running each of them using :mod:`executor` means
+starting a new shell every time. Instead :func:`run_shell_check()` sends the
+commands to a :class:`ShellCoprocess` over a pipe:
+
+- Each command runs in a subshell (using ``eval``, so a syntax error or an
+  ``exit`` in one command doesn't affect the coprocess) with its standard
+  input, output and error streams connected to ``/dev/null``.
+
+- The exit status is reported on the standard output of the coprocess in a
+  line that starts with a token that's unique per command, so output can
+  never be confused with an exit status.
+
+- When a command doesn't finish within its timeout the coprocess (and every
+  process it started, because it runs in its own session) is killed and
+  :exc:`.CheckTimeoutError` is raised.
+
+- The coprocesses are kept in a :class:`ShellPool`, so a profile that runs
+  its checks one by one only starts a single shell, while
+  :func:`.launch_programs()` starts one shell per concurrent check. The
+  pool is closed when the profile has been evaluated.
+
+When a coprocess can't be started or exits unexpectedly the command is run
+using :mod:`executor` instead.
+"""
+
+# Standard library modules.
+import binascii
+import errno
+import itertools
+import logging
+import os
+import select
+import signal
+import sys
+import threading
+import time
+
+# Modules included in our package.
+from dwim.exceptions import CheckTimeoutError
+from dwim.tracing import count_subprocess, span
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+SHELL = 'bash'
+"""The shell run by :class:`ShellCoprocess` (a string, the same shell that :mod:`executor` uses)."""
+
+DEFAULT_CHECK_TIMEOUT = 30
+"""The default number of seconds that an "is running" command may take (a number)."""
+
+# The pool shared by get_shell_pool().
+cached_pool = None
+
+# Serializes access to cached_pool.
+lock = threading.Lock()
+
+
+class ShellCoprocess(object):
+
+    """A long lived shell that runs commands sent to it over a pipe."""
+
+    def __init__(self):
+        """
+        Start the shell.
+
+        :raises: :exc:`~exceptions.EnvironmentError` when the shell can't be started.
+        """
+        import subprocess
+        if sys.version_info[0] >= 3:
+            options = dict(start_new_session=True)
+        else:
+            options = dict(preexec_fn=os.setsid)
+        with open(os.devnull, 'wb') as null:
+            self.process = subprocess.Popen([SHELL], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            stderr=null, close_fds=True, **options)
+        count_subprocess()
+        self.token = binascii.hexlify(os.urandom(8)).decode('ascii')
+        self.counter = itertools.count(1)
+        self.buffer = b''
+        logger.debug("Started shell coprocess (pid %i).", self.process.pid)
+
+    def run(self, command, timeout=DEFAULT_CHECK_TIMEOUT):
+        """
+        Run a command in the shell.
+
+        :param command: A shell command (a string).
+        :param timeout: The maximum number of seconds to wait (a number).
+        :returns: :data:`True` if the command exited with status zero,
+                  :data:`False` otherwise.
+        :raises: :exc:`.CheckTimeoutError` when the command doesn't finish
+                 in time, :exc:`~exceptions.EnvironmentError` when the shell
+                 exited unexpectedly.
+        """
+        marker = ('%s-%i ' % (self.token, next(self.counter))).encode('ascii')
+        script = "(eval %s) </dev/null >/dev/null 2>&1; echo '%s' $?\n" % (quote(command), marker.decode('ascii'))
+        try:
+            os.write(self.process.stdin.fileno(), script.encode('UTF-8'))
+        except EnvironmentError:
+            self.kill()
+            raise
+        deadline = time.time() + timeout
+        while True:
+            line, newline, rest = self.buffer.partition(b'\n')
+            if newline:
+                self.buffer = rest
+                if line.startswith(marker):
+                    return int(line[len(marker):]) == 0
+                continue
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self.kill()
+                raise CheckTimeoutError("Command didn't finish within %s seconds! (%s)" % (timeout, command))
+            readable, _, _ = select.select([self.process.stdout], [], [], remaining)
+            if readable:
+                data = os.read(self.process.stdout.fileno(), 4096)
+                if not data:
+                    self.kill()
+                    raise EnvironmentError(errno.EPIPE, "Shell coprocess exited unexpectedly")
+                self.buffer += data
+
+    def close(self):
+        """Stop the shell (by closing its standard input)."""
+        if self.process.returncode is None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process.stdout.close()
+            logger.debug("Stopped shell coprocess (pid %i).", self.process.pid)
+
+    def kill(self):
+        """Kill the shell and any commands that it's running."""
+        if self.process.returncode is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except EnvironmentError:
+                pass
+            self.process.wait()
+            self.process.stdin.close()
+            self.process.stdout.close()
+            logger.debug("Killed shell coprocess (pid %i).", self.process.pid)
+
+
+class ShellPool(object):
+
+    """A pool of :class:`ShellCoprocess` objects that can be used from multiple threads."""
+
+    def __init__(self):
+        """Initialize a :class:`ShellPool` object."""
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def run(self, command, timeout=DEFAULT_CHECK_TIMEOUT):
+        """
+        Run a command in an idle shell (starting a new shell when all shells are busy).
+
+        :param command: A shell command (a string).
+        :param timeout: The maximum number of seconds to wait (a number).
+        :returns: Refer to :func:`ShellCoprocess.run()`.
+        :raises: Refer to :func:`ShellCoprocess.run()`.
+        """
+        with self.lock:
+            shell = self.idle.pop() if self.idle else None
+        if shell is None:
+            shell = ShellCoprocess()
+        try:
+            result = shell.run(command, timeout)
+        except Exception:
+            # Don't return a shell in an unknown state to the pool.
+            shell.kill()
+            raise
+        with self.lock:
+            self.idle.append(shell)
+        return result
+
+    def close(self):
+        """Stop the idle shells."""
+        with self.lock:
+            shells = self.idle
+            self.idle = []
+        for shell in shells:
+            shell.close()
+
+
+def run_shell_check(command, timeout=DEFAULT_CHECK_TIMEOUT):
+    """
+    Run an "is running" shell command.
+
+    :param command: A shell command (a string).
+    :param timeout: The maximum number of seconds to wait (a number).
+    :returns: :data:`True` if the command exited with status zero,
+              :data:`False` otherwise.
+    :raises: :exc:`.CheckTimeoutError` when the command doesn't finish in time.
+    """
+    with span('shell', 'subprocess', command=command):
+        try:
+            logger.debug("Running command in shell coprocess: %s", command)
+            return get_shell_pool().run(command, timeout)
+        except EnvironmentError as e:
+            logger.debug("Shell coprocess failed, falling back to executor! (%s)", e)
+    from dwim import execute
+    return execute(command, silent=True, check=False)
+
+
+def get_shell_pool():
+    """
+    Get the pool of shell coprocesses.
+
+    :returns: A :class:`ShellPool` object (created on first use).
+    """
+    global cached_pool
+    with lock:
+        if cached_pool is None:
+            cached_pool = ShellPool()
+        return cached_pool
+
+
+def close_shell_pool():
+    """Stop the shell coprocesses (they're started again when needed)."""
+    global cached_pool
+    with lock:
+        pool = cached_pool
+        cached_pool = None
+    if pool is not None:
+        pool.close()
+
+
+def quote(value):
+    """
+    Quote a string for the shell.
+
+    :param value: The string to quote.
+    :returns: The quoted string (single quotes, so nothing is expanded).
+    """
+    return "'%s'" % value.replace("'", "'\\''")
@@ -0,0 +1,306 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+A long running ``dwim`` process that reacts to changes.
+
+Running ``dwim`` from a login script and network hooks means every trigger
+pays for interpreter startup, imports and loading the profile. ``dwim
+--daemon`` starts a :class:`Daemon` that stays resident instead:
+
+- Imports, the compiled profile and the ``$PATH`` index stay in memory (the
+  index is refreshed using :func:`~dwim.paths.PathIndex.refresh()`).
+
+- The profile is evaluated again when the network configuration changes
+  (using :class:`~dwim.network.NetworkMonitor`), when a process that was
+  checked by the profile exits (using process file descriptors, where the
+  platform supports them) and every :data:`DEFAULT_INTERVAL` seconds to
+  catch changes that can't be observed directly.
+
+- A UNIX socket in ``$XDG_RUNTIME_DIR/dwim`` accepts requests to evaluate
+  the profile, so that the ``dwim`` program can use :func:`forward()` to
+  hand its work to the daemon instead of doing it all over again.
+
+The profile is always evaluated as a whole because it's an arbitrary Python
+script, but with everything warm that takes milliseconds instead of seconds.
+"""
+
+# Standard library modules.
+import errno
+import json
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import time
+
+# Modules included in our package.
+from dwim.history import append_record, create_record
+from dwim.network import NetworkMonitor
+from dwim.xdg import check_private_directory, ensure_private_directory, runtime_directory
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 300
+"""The number of seconds after which the daemon evaluates the profile even when nothing happened (a number)."""
+
+SETTLE_TIME = 0.5
+"""The number of seconds without network events before the daemon reacts to a network change (a number)."""
+
+CONNECT_TIMEOUT = 1
+"""The number of seconds that :func:`forward()` waits for the daemon to accept a connection (a number)."""
+
+
+class Daemon(object):
+
+    """Evaluate the user's profile whenever something relevant changes."""
+
+    def __init__(self, profile, socket_file=None, interval=DEFAULT_INTERVAL):
+        """
+        Initialize a :class:`Daemon` object.
+
+        :param profile: The pathname of the profile script (a string).
+        :param socket_file: The pathname of the control socket (a string,
+                            defaults to :func:`default_socket_file()`).
+        :param interval: The number of seconds after which the profile is
+                         evaluated even when nothing happened (a number).
+        """
+        self.profile = os.path.abspath(os.path.expanduser(profile))
+        self.socket_file = socket_file or default_socket_file()
+        self.interval = interval
+        self.server = None
+        self.pidfds = {}
+        self.last_run = 0
+
+    def run(self):
+        """Evaluate the profile and keep reacting to changes until terminated."""
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        self.listen()
+        try:
+            with NetworkMonitor() as monitor:
+                self.evaluate(self.profile, "startup")
+                while True:
+                    self.wait(monitor)
+        finally:
+            self.close()
+
+    def listen(self):
+        """
+        Create the control socket.
+
+        :raises: :exc:`~exceptions.EnvironmentError` when the directory of
+                 the control socket isn't private (see
+                 :func:`~dwim.xdg.ensure_private_directory()`) or another
+                 daemon is already listening on the control socket.
+        """
+        ensure_private_directory(os.path.dirname(self.socket_file))
+        if os.path.exists(self.socket_file):
+            if forward_request(dict(command='ping'), self.socket_file) is not None:
+                raise EnvironmentError(errno.EADDRINUSE, "Another daemon is already running", self.socket_file)
+            logger.debug("Removing stale control socket %s ..", self.socket_file)
+            os.unlink(self.socket_file)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_file)
+        os.chmod(self.socket_file, 0o600)
+        self.server.listen(16)
+        logger.info("Listening on %s ..", self.socket_file)
+
+    def wait(self, monitor):
+        """
+        Wait for something to happen and react to it.
+
+        :param monitor: A :class:`~dwim.network.NetworkMonitor` object.
+        """
+        timeout = max(0, self.last_run + self.interval - time.time())
+        inputs = [self.server] + list(self.pidfds)
+        if monitor.socket:
+            inputs.append(monitor.socket)
+        readable, _, _ = select.select(inputs, [], [], timeout)
+        if self.server in readable:
+            self.handle_client()
+        elif monitor.socket in readable:
+            # Wait for a burst of network events to settle down.
+            while monitor.wait(SETTLE_TIME):
+                pass
+            self.evaluate(self.profile, "network change")
+        elif readable:
+            for fd in readable:
+                logger.info("Process %i exited.", self.pidfds.pop(fd))
+                os.close(fd)
+            self.evaluate(self.profile, "process exit")
+        else:
+            self.evaluate(self.profile, "interval")
+
+    def handle_client(self):
+        """Handle a request on the control socket."""
+        connection, _ = self.server.accept()
+        try:
+            request = json.loads(receive_line(connection))
+            command = request.get('command')
+            if command == 'ping':
+                response = dict(status='ok', pid=os.getpid())
+            elif command == 'run':
+                response = self.evaluate(request.get('profile') or self.profile, "request")
+            else:
+                response = dict(status='error', message="Unknown command %r!" % command)
+            connection.sendall(json.dumps(response).encode('UTF-8') + b'\n')
+        except Exception as e:
+            logger.warning("Failed to handle request on control socket! (%s)", e)
+        finally:
+            connection.close()
+
+    def evaluate(self, profile, reason):
+        """
+        Evaluate a profile script with fresh process, location and ``$PATH`` information.
+
+        :param profile: The pathname of the profile script (a string).
+        :param reason: Why the profile is evaluated (a string).
+        :returns: A dictionary with the keys ``status``, ``pid``,
+                  ``elapsed_time`` and ``programs`` (a dictionary with
+                  commands as keys and launch statuses as values) and
+                  ``message`` when the evaluation failed.
+        """
+        from dwim import dwim
+        from dwim.location import invalidate_location_cache
+        from dwim.paths import get_path_index
+        from dwim.processes import invalidate_process_table
+        from dwim.spawn import reap_children
+        from dwim.tracing import start_tracing, stop_tracing
+        logger.info("Evaluating profile (%s) ..", reason)
+        reap_children()
+        invalidate_process_table()
+        invalidate_location_cache()
+        get_path_index().refresh()
+        response = dict(status='ok', pid=os.getpid())
+        tracer = start_tracing(timeline=False)
+        start_time = time.time()
+        try:
+            dwim(profile)
+        except Exception as e:
+            logger.exception("Failed to evaluate profile!")
+            response.update(status='error', message=str(e))
+        finally:
+            stop_tracing()
+            self.last_run = time.time()
+            response['elapsed_time'] = self.last_run - start_time
+        record = create_record(tracer, response['elapsed_time'])
+        append_record(record)
+        response['programs'] = dict((command, details.get('status')) for command, details in record['programs'].items())
+        self.watch(tracer)
+        return response
+
+    def watch(self, tracer):
+        """
+        Watch for the exit of the processes that the profile checked or started.
+
+        :param tracer: The :class:`~dwim.tracing.Tracer` that recorded the
+                       evaluation of the profile.
+
+        This uses :func:`os.pidfd_open()` which requires Python 3.9 and Linux
+        5.3. On other platforms the daemon falls back to evaluating the
+        profile every :data:`DEFAULT_INTERVAL` seconds.
+        """
+        from dwim.ledger import get_ledger
+        from dwim.processes import get_process_table
+        for fd in self.pidfds:
+            os.close(fd)
+        self.pidfds = {}
+        if not hasattr(os, 'pidfd_open'):
+            return
+        programs = set(args['program'] for category, name, args, duration in tracer.totals() if name == 'is_running')
+        table = get_process_table()
+        pids = set(entry['pid'] for entry in get_ledger().entries.values())
+        for program in programs:
+            pids.update(process.pid for process in table.find(program))
+        for pid in pids:
+            try:
+                self.pidfds[os.pidfd_open(pid)] = pid
+            except EnvironmentError as e:
+                logger.debug("Failed to watch process %i! (%s)", pid, e)
+        logger.debug("Watching %i processes for exits.", len(self.pidfds))
+
+    def close(self):
+        """Remove the control socket and stop watching processes."""
+        for fd in self.pidfds:
+            os.close(fd)
+        self.pidfds = {}
+        if self.server:
+            self.server.close()
+            self.server = None
+            os.unlink(self.socket_file)
+
+
+def default_socket_file():
+    """
+    Get the default location of the control socket.
+
+    :returns: The pathname ``$XDG_RUNTIME_DIR/dwim/control.sock`` (a string).
+    """
+    return runtime_directory('control.sock')
+
+
+def forward(profile, socket_file=None):
+    """
+    Ask a running daemon to evaluate a profile.
+
+    :param profile: The pathname of the profile script (a string).
+    :param socket_file: The pathname of the control socket (a string,
+                        defaults to :func:`default_socket_file()`).
+    :returns: The response of the daemon (see :func:`Daemon.evaluate()`)
+              or :data:`None` when no daemon is running.
+    """
+    profile = os.path.abspath(os.path.expanduser(profile))
+    return forward_request(dict(command='run', profile=profile), socket_file)
+
+
+def forward_request(request, socket_file=None):
+    """
+    Send a request to the daemon.
+
+    :param request: A dictionary with at least the key ``command``.
+    :param socket_file: The pathname of the control socket (a string,
+                        defaults to :func:`default_socket_file()`).
+    :returns: The response of the daemon (a dictionary) or :data:`None`
+              when no daemon is running.
+    """
+    socket_file = socket_file or default_socket_file()
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.settimeout(CONNECT_TIMEOUT)
+        try:
+            check_private_directory(os.path.dirname(socket_file))
+            connection.connect(socket_file)
+        except EnvironmentError as e:
+            logger.debug("No daemon listening on %s! (%s)", socket_file, e)
+            return None
+        # Evaluating the profile can take a while (for example when it waits
+        # for an internet connection) so we don't time out after connecting.
+        connection.settimeout(None)
+        connection.sendall(json.dumps(request).encode('UTF-8') + b'\n')
+        return json.loads(receive_line(connection))
+    finally:
+        connection.close()
+
+
+def receive_line(connection):
+    """
+    Receive a line of text from a socket.
+
+    :param connection: A connected :class:`socket.socket` object.
+    :returns: The received line without its line terminator (a string).
+    :raises: :exc:`~exceptions.EnvironmentError` when the connection is
+             closed before a complete line was received.
+    """
+    buffer = b''
+    while not buffer.endswith(b'\n'):
+        data = connection.recv(4096)
+        if not data:
+            raise EnvironmentError(errno.ECONNRESET, "Connection closed before the end of the line")
+        buffer += data
+    return buffer.decode('UTF-8').rstrip('\n')
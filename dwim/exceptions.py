@@ -1,7 +1,7 @@
 # dwim: Location aware application launcher.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: May 29, 2017
+# Last Change: October 16, 2026
 # URL: https://dwim.readthedocs.io
 
 """Custom exceptions raised by :mod:`dwim`."""
@@ -20,3 +20,8 @@ class CommandParseError(ProgramError):
 class MissingProgramError(ProgramError):
 
     """Raised by :func:`.resolve_program()` when a program doesn't exist."""
+
+
+class CheckTimeoutError(ProgramError):
+
+    """Raised by :func:`.run_shell_check()` when an "is running" command doesn't finish in time."""
@@ -0,0 +1,138 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Skipping the evaluation of the profile when nothing has changed.
+
+Most runs of ``dwim`` are triggered by network hooks and timers and end up
+doing nothing, because the location didn't change and all programs are
+already running. After a run in which every program that the profile
+launched ended up in the ledger (see :mod:`dwim.ledger`) a fingerprint of
+the situation is saved in ``$XDG_RUNTIME_DIR/dwim/fingerprint.json``. The
+fingerprint covers:
+
+- the pathname, modification time and size of the profile,
+- the default routes in ``/proc/net/route`` (interface and gateway) and the
+  MAC addresses of the gateways in ``/proc/net/arp``,
+- the entries in the ledger.
+
+When the next run computes the same fingerprint and the processes in the
+ledger are all still alive, :func:`is_unchanged()` returns :data:`True` and
+the profile isn't evaluated at all. This only reads a handful of small files
+in ``/proc``, so it doesn't fork any processes or import any heavy
+dependencies. Use ``dwim --force`` to evaluate the profile regardless.
+"""
+
+# Standard library modules.
+import hashlib
+import json
+import logging
+import os
+
+# Modules included in our package.
+from dwim.ledger import get_ledger
+from dwim.network import find_default_routes, find_neighbour_mac
+from dwim.xdg import check_private_directory, runtime_directory, write_private_file
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_FORMAT = 1
+"""The version of the on-disk fingerprint format (an integer)."""
+
+
+def compute_fingerprint(profile, ledger=None):
+    """
+    Compute a fingerprint of the profile, the network and the ledger.
+
+    :param profile: The pathname of the profile script (a string).
+    :param ledger: A :class:`~dwim.ledger.Ledger` object (defaults to
+                   :func:`~dwim.ledger.get_ledger()`).
+    :returns: A hexadecimal digest (a string).
+    """
+    ledger = ledger or get_ledger()
+    try:
+        metadata = os.stat(os.path.expanduser(profile))
+        profile_state = [metadata.st_mtime, metadata.st_size]
+    except EnvironmentError:
+        profile_state = []
+    try:
+        gateways = [[route.interface, route.gateway, find_neighbour_mac(route.gateway, route.interface)]
+                    for route in find_default_routes()]
+    except EnvironmentError:
+        gateways = None
+    with ledger.lock:
+        entries = dict(ledger.entries)
+    data = json.dumps(dict(profile=[profile] + profile_state, gateways=gateways, ledger=entries),
+                      sort_keys=True)
+    return hashlib.sha1(data.encode('UTF-8')).hexdigest()
+
+
+def is_unchanged(profile, filename=None):
+    """
+    Check whether evaluating the profile would be a no-op.
+
+    :param profile: The pathname of the profile script (a string).
+    :param filename: The pathname of the saved fingerprint (a string,
+                     defaults to :func:`default_fingerprint_file()`).
+    :returns: :data:`True` if the fingerprint matches the last run and all
+              programs in the ledger are alive, :data:`False` otherwise.
+    """
+    filename = filename or default_fingerprint_file()
+    try:
+        check_private_directory(os.path.dirname(filename))
+        with open(filename) as handle:
+            contents = json.load(handle)
+        if contents.get('format') != FINGERPRINT_FORMAT:
+            return False
+    except Exception as e:
+        logger.debug("Ignoring fingerprint %s! (%s)", filename, e)
+        return False
+    ledger = get_ledger()
+    if compute_fingerprint(profile, ledger) != contents['fingerprint']:
+        logger.debug("Fingerprint changed since the last run.")
+        return False
+    with ledger.lock:
+        entries = list(ledger.entries.values())
+    return all(ledger.is_alive(entry) for entry in entries)
+
+
+def save_fingerprint(profile, tracer, filename=None):
+    """
+    Save the fingerprint after the profile was evaluated.
+
+    :param profile: The pathname of the profile script (a string).
+    :param tracer: The :class:`~dwim.tracing.Tracer` that recorded the run.
+    :param filename: The pathname of the saved fingerprint (a string,
+                     defaults to :func:`default_fingerprint_file()`).
+
+    The fingerprint is only saved when the profile launched at least one
+    program and all of them are in the ledger, because the running state of
+    other programs can't be verified without evaluating the profile. In all
+    other cases the saved fingerprint is removed.
+    """
+    filename = filename or default_fingerprint_file()
+    ledger = get_ledger()
+    commands = set(args['command'] for category, name, args, duration in tracer.totals() if name == 'launch_program')
+    with ledger.lock:
+        complete = bool(commands) and all(command in ledger.entries for command in commands)
+    try:
+        if complete:
+            fingerprint = compute_fingerprint(profile, ledger)
+            write_private_file(filename, json.dumps(dict(format=FINGERPRINT_FORMAT, fingerprint=fingerprint)))
+        elif os.path.exists(filename):
+            os.unlink(filename)
+    except Exception as e:
+        logger.debug("Failed to update fingerprint %s! (%s)", filename, e)
+
+
+def default_fingerprint_file():
+    """
+    Get the default location of the saved fingerprint.
+
+    :returns: The pathname ``$XDG_RUNTIME_DIR/dwim/fingerprint.json`` (a string).
+    """
+    return runtime_directory('fingerprint.json')
@@ -0,0 +1,252 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Persistent run history and latency regression reports.
+
+Every run of the ``dwim`` program appends a compact record to an append-only
+file of JSON lines at ``$XDG_STATE_HOME/dwim/history.jsonl``. The record is
+derived from the time per activity collected by a
+:class:`~dwim.tracing.PhaseTimer` (or a :class:`~dwim.tracing.Tracer`) and holds
+the total wall time, the time spent in each phase (compiling and executing
+the profile, detecting the network location, etc.) and for each program the
+time spent checking whether it's running, the time spent starting it and the
+resulting :class:`~dwim.LaunchStatus`.
+
+When the history file grows beyond :data:`MAX_SIZE` it's rotated to
+``history.jsonl.1`` (replacing the previous rotated file) so that the storage
+stays bounded. ``dwim --stats`` uses :func:`summarize()` and
+:func:`format_report()` to show latency percentiles and flag the phases and
+programs whose latency regressed.
+"""
+
+# Standard library modules.
+import collections
+import json
+import logging
+import os
+import time
+
+# Modules included in our package.
+from dwim.xdg import state_directory
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+HISTORY_FORMAT = 1
+"""The version of the run records (an integer)."""
+
+MAX_SIZE = 1024 * 256
+"""The size in bytes after which the history file is rotated (an integer)."""
+
+DEFAULT_RUNS = 100
+"""The number of recent runs that :func:`summarize()` considers by default (an integer)."""
+
+DEFAULT_WINDOW = 5
+"""The number of most recent runs that are compared against the older runs (an integer)."""
+
+DEFAULT_THRESHOLD = 1.5
+"""The factor by which the recent median must exceed the older median to count as a regression (a number)."""
+
+MIN_REGRESSION = 0.01
+"""The minimum increase in seconds that counts as a regression (a number)."""
+
+# Spans in these categories are recorded per program instead of as phases.
+PROGRAM_CATEGORIES = ('launch', 'subprocess')
+
+Metric = collections.namedtuple('Metric', 'name, runs, median, p90, maximum, recent, regressed')
+"""Latency statistics about a phase or program (a named tuple)."""
+
+
+def default_history_file():
+    """
+    Get the default location of the run history.
+
+    :returns: The pathname ``$XDG_STATE_HOME/dwim/history.jsonl`` (a string).
+    """
+    return state_directory('history.jsonl')
+
+
+def create_record(tracer, total_time):
+    """
+    Create a run record from the spans collected during a run.
+
+    :param tracer: A :class:`~dwim.tracing.Tracer` object (usually a
+                   :class:`~dwim.tracing.PhaseTimer`).
+    :param total_time: The total wall time of the run in seconds (a number).
+    :returns: A dictionary that can be serialized to JSON.
+    """
+    phases = collections.defaultdict(float)
+    programs = collections.defaultdict(lambda: collections.defaultdict(float))
+    for category, name, args, duration in tracer.totals():
+        if category not in PROGRAM_CATEGORIES:
+            phases[name] += duration
+        elif name == 'is_running':
+            programs[args['command']]['check'] += duration
+        elif name == 'start':
+            programs[args['command']]['launch'] += duration
+        elif name == 'launch_program':
+            programs[args['command']]['status'] = args.get('status')
+    return dict(
+        format=HISTORY_FORMAT,
+        time=int(time.time()),
+        total=round(total_time, 4),
+        phases=dict((name, round(value, 4)) for name, value in phases.items()),
+        programs=dict((command, dict((key, round(value, 4) if key != 'status' else value)
+                                     for key, value in details.items()))
+                      for command, details in programs.items()),
+    )
+
+
+def append_record(record, filename=None, max_size=MAX_SIZE):
+    """
+    Append a run record to the history file.
+
+    :param record: A dictionary created by :func:`create_record()`.
+    :param filename: The pathname of the history file (a string, defaults
+                     to :func:`default_history_file()`).
+    :param max_size: The size in bytes after which the history file is
+                     rotated (an integer, defaults to :data:`MAX_SIZE`).
+
+    Failures are logged and otherwise ignored because the history must never
+    prevent the user's programs from being started.
+    """
+    filename = filename or default_history_file()
+    try:
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        if os.path.isfile(filename) and os.path.getsize(filename) >= max_size:
+            logger.debug("Rotating run history %s ..", filename)
+            os.rename(filename, filename + '.1')
+        with open(filename, 'a') as handle:
+            handle.write(json.dumps(record, sort_keys=True, separators=(',', ':')) + '\n')
+    except Exception as e:
+        logger.debug("Failed to update run history %s! (%s)", filename, e)
+
+
+def read_records(filename=None):
+    """
+    Read the run history.
+
+    :param filename: The pathname of the history file (a string, defaults
+                     to :func:`default_history_file()`).
+    :returns: A list of dictionaries (the oldest record comes first).
+
+    The rotated history file is included and lines that can't be parsed
+    (for example because a run was interrupted) are skipped.
+    """
+    filename = filename or default_history_file()
+    records = []
+    for pathname in (filename + '.1', filename):
+        try:
+            with open(pathname) as handle:
+                for line in handle:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(record, dict) and record.get('format') == HISTORY_FORMAT:
+                        records.append(record)
+        except EnvironmentError:
+            pass
+    return records
+
+
+def summarize(records, runs=DEFAULT_RUNS, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD):
+    """
+    Compute latency statistics from the run history.
+
+    :param records: A list of dictionaries created by :func:`create_record()`.
+    :param runs: The number of recent runs to consider (an integer).
+    :param window: The number of most recent runs whose median latency is
+                   compared against the median latency of the older runs
+                   (an integer).
+    :param threshold: The factor by which the recent median must exceed the
+                      older median to count as a regression (a number).
+    :returns: A list of :class:`Metric` objects (the total wall time comes
+              first, followed by the phases and the programs).
+    """
+    series = collections.OrderedDict()
+    for record in records[-runs:]:
+        series.setdefault('total', []).append(record['total'])
+        for name, value in sorted(record['phases'].items()):
+            series.setdefault('phase: %s' % name, []).append(value)
+        for command, details in sorted(record['programs'].items()):
+            for key in ('check', 'launch'):
+                if key in details:
+                    series.setdefault('%s: %s' % (key, command), []).append(details[key])
+    metrics = []
+    for name, values in series.items():
+        recent, older = values[-window:], values[:-window]
+        regressed = False
+        if older:
+            baseline = percentile(older, 50)
+            regressed = percentile(recent, 50) > max(baseline * threshold, baseline + MIN_REGRESSION)
+        metrics.append(Metric(
+            name=name,
+            runs=len(values),
+            median=percentile(values, 50),
+            p90=percentile(values, 90),
+            maximum=max(values),
+            recent=percentile(recent, 50),
+            regressed=regressed,
+        ))
+    return metrics
+
+
+def format_report(records, **options):
+    """
+    Render a latency report of the run history.
+
+    :param records: A list of dictionaries created by :func:`create_record()`.
+    :param options: Any keyword arguments are passed on to :func:`summarize()`.
+    :returns: The rendered report (a string).
+    """
+    from humanfriendly import pluralize
+    from humanfriendly.tables import format_pretty_table
+    if not records:
+        return "No runs have been recorded yet."
+    metrics = summarize(records, **options)
+    rows = [[m.name, m.runs,
+             format_latency(m.median),
+             format_latency(m.p90),
+             format_latency(m.maximum),
+             format_latency(m.recent),
+             'regressed' if m.regressed else 'ok'] for m in metrics]
+    table = format_pretty_table(rows, ['Metric', 'Runs', 'Median', '90th percentile', 'Maximum', 'Recent', 'Status'])
+    statuses = collections.Counter()
+    for record in records[-options.get('runs', DEFAULT_RUNS):]:
+        for details in record['programs'].values():
+            statuses[details.get('status') or 'unknown'] += 1
+    regressions = sum(1 for m in metrics if m.regressed)
+    lines = [table, '',
+             "Launch results: %s" % ', '.join('%s (%i)' % item for item in sorted(statuses.items())),
+             "Found %s." % pluralize(regressions, "regression")]
+    return '\n'.join(lines)
+
+
+def format_latency(seconds):
+    """
+    Format a latency for :func:`format_report()`.
+
+    :param seconds: The latency in seconds (a number).
+    :returns: The latency in milliseconds (a string).
+    """
+    return '%.1f ms' % (seconds * 1000)
+
+
+def percentile(values, p):
+    """
+    Compute a percentile using the nearest-rank method.
+
+    :param values: A non-empty list of numbers.
+    :param p: The percentile to compute (a number between 0 and 100).
+    :returns: The percentile (a number).
+    """
+    ordered = sorted(values)
+    rank = int(round(p / 100.0 * (len(ordered) - 1)))
+    return ordered[rank]
@@ -0,0 +1,201 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+A ledger of the programs started by :mod:`dwim`.
+
+When :func:`.launch_program()` starts a program directly (see
+:mod:`dwim.spawn`) it knows the process ID of the program, so it records
+the process ID, start time and executable in a :class:`Ledger` that's stored
+in ``$XDG_RUNTIME_DIR/dwim/ledger.json``. The next time the same command is
+launched the ledger answers the question "Is the program already running?"
+using :func:`os.kill()` with signal zero and a single read of
+``/proc/PID/stat``, without scanning the process table or running a custom
+"is running" command.
+
+Process IDs are reused, so an entry is only trusted when the start time of
+the process (field 22 of ``/proc/PID/stat``, which is measured in clock
+ticks since boot) and the executable still match. The runtime directory is
+cleared on logout and at boot, which means stale entries don't accumulate.
+"""
+
+# Standard library modules.
+import errno
+import json
+import logging
+import os
+import threading
+
+# Modules included in our package.
+from dwim.processes import DEFAULT_ROOT, get_start_time
+from dwim.xdg import check_private_directory, runtime_directory, write_private_file
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+LEDGER_FORMAT = 1
+"""The version of the on-disk ledger format (an integer)."""
+
+# The ledger shared by get_ledger().
+cached_ledger = None
+
+# Serializes access to cached_ledger.
+lock = threading.Lock()
+
+
+class Ledger(object):
+
+    """The programs started by :mod:`dwim` that may still be running."""
+
+    def __init__(self, filename=None, root=DEFAULT_ROOT):
+        """
+        Initialize a :class:`Ledger` object.
+
+        :param filename: The pathname of the ledger (a string, defaults to
+                         :func:`default_ledger_file()`).
+        :param root: The location of the ``proc`` file system (a string).
+        """
+        self.filename = filename or default_ledger_file()
+        self.root = root
+        self.lock = threading.RLock()
+        self.entries = self.load()
+
+    def load(self):
+        """
+        Load the ledger from disk.
+
+        :returns: A dictionary with commands as keys and dictionaries with
+                  the keys ``pid``, ``start_time`` and ``exe`` as values
+                  (an empty dictionary when the ledger is unavailable).
+        """
+        try:
+            check_private_directory(os.path.dirname(self.filename))
+            with open(self.filename) as handle:
+                contents = json.load(handle)
+            if contents.get('format') == LEDGER_FORMAT:
+                return contents['entries']
+        except Exception as e:
+            logger.debug("Ignoring ledger %s! (%s)", self.filename, e)
+        return {}
+
+    def save(self):
+        """Save the ledger to disk (failures are logged and otherwise ignored)."""
+        try:
+            write_private_file(self.filename, json.dumps(dict(format=LEDGER_FORMAT, entries=self.entries)))
+        except Exception as e:
+            logger.debug("Failed to update ledger %s! (%s)", self.filename, e)
+
+    def record(self, command, pid):
+        """
+        Record that a program was started.
+
+        :param command: The command that started the program (a string).
+        :param pid: The process ID of the program (an integer).
+        """
+        start_time = self.get_start_time(pid)
+        if start_time is None:
+            logger.debug("Not recording process %i in ledger because it already exited.", pid)
+            return
+        with self.lock:
+            self.entries[command] = dict(pid=pid, start_time=start_time, exe=self.get_exe(pid))
+            self.save()
+
+    def forget(self, command):
+        """
+        Forget about a program.
+
+        :param command: The command that started the program (a string).
+        """
+        with self.lock:
+            if self.entries.pop(command, None) is not None:
+                self.save()
+
+    def is_running(self, command):
+        """
+        Check whether the program started by a command is still running.
+
+        :param command: The command that started the program (a string).
+        :returns: :data:`True` when the recorded process is still running,
+                  :data:`None` when the ledger doesn't know (because the
+                  command wasn't recorded or the process exited).
+
+        Stale entries are removed from the ledger.
+        """
+        with self.lock:
+            entry = self.entries.get(command)
+        if entry is None:
+            return None
+        if self.is_alive(entry):
+            logger.debug("Ledger says process %i of %r is running.", entry['pid'], command)
+            return True
+        logger.debug("Ledger entry for %r is stale (process %i exited).", command, entry['pid'])
+        self.forget(command)
+        return None
+
+    def is_alive(self, entry):
+        """
+        Check whether the process of a ledger entry is still running.
+
+        :param entry: A dictionary with the keys ``pid``, ``start_time`` and ``exe``.
+        :returns: :data:`True` if the process exists and its start time and
+                  executable match the entry, :data:`False` otherwise.
+        """
+        try:
+            os.kill(entry['pid'], 0)
+        except EnvironmentError as e:
+            # EPERM means the process exists but belongs to another user,
+            # in which case the process ID has been reused.
+            if e.errno in (errno.ESRCH, errno.EPERM):
+                return False
+            raise
+        if self.get_start_time(entry['pid']) != entry['start_time']:
+            return False
+        exe = self.get_exe(entry['pid'])
+        return exe is None or entry['exe'] is None or exe == entry['exe']
+
+    def get_start_time(self, pid):
+        """
+        Get the start time of a process.
+
+        :param pid: A process ID (an integer).
+        :returns: Refer to :func:`dwim.processes.get_start_time()`.
+        """
+        return get_start_time(pid, self.root)
+
+    def get_exe(self, pid):
+        """
+        Get the executable of a process.
+
+        :param pid: A process ID (an integer).
+        :returns: The pathname of the executable (a string) or :data:`None`
+                  when it can't be determined.
+        """
+        try:
+            return os.readlink(os.path.join(self.root, str(pid), 'exe'))
+        except EnvironmentError:
+            return None
+
+
+def get_ledger():
+    """
+    Get the ledger of programs started by :mod:`dwim`.
+
+    :returns: A :class:`Ledger` object (created on first use).
+    """
+    global cached_ledger
+    with lock:
+        if cached_ledger is None:
+            cached_ledger = Ledger()
+        return cached_ledger
+
+
+def default_ledger_file():
+    """
+    Get the default location of the ledger.
+
+    :returns: The pathname ``$XDG_RUNTIME_DIR/dwim/ledger.json`` (a string).
+    """
+    return runtime_directory('ledger.json')
@@ -0,0 +1,241 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Resolution of network fingerprints to physical locations.
+
+:func:`.determine_network_location()` is usually called several times by the
+same profile, so the work it does is split in two parts:
+
+- A :class:`LocationResolver` turns the locations defined by the profile into
+  indexes (normalized MAC addresses, domain names and interface names map to
+  location names). :func:`get_location_resolver()` builds each distinct set of
+  locations only once.
+
+- A location that was recognized by the MAC address of the gateway is
+  cached per default route (the gateway IP address and interface name, which
+  are cheap to read from ``/proc/net/route``) until
+  :func:`invalidate_location_cache()` is called. The other signals can
+  change while the default route stays the same (for example when DHCP
+  hands out a different search domain) so they're evaluated on every call,
+  which still reuses the cached MAC address of the gateway.
+
+Besides the MAC address of the gateway a location can be recognized by the
+DNS search domain, a directly connected subnet or the interface name of the
+default route. The signals are evaluated in the order of :data:`SIGNALS` and
+weaker signals are only evaluated when the stronger signals didn't match.
+"""
+
+# Standard library modules.
+import collections
+import logging
+import threading
+
+# Modules included in our package.
+from dwim.network import (
+    find_connected_networks,
+    find_search_domains,
+    network_contains,
+    normalize_domain,
+    normalize_mac,
+    parse_network,
+)
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+SIGNALS = ('gateway', 'domain', 'subnet', 'interface')
+"""The supported signals from the most to the least reliable (a tuple of strings)."""
+
+Location = collections.namedtuple('Location', 'name, signal, value, gateway_mac')
+"""
+The result of :func:`LocationResolver.resolve()` (a named tuple).
+
+The field ``name`` is the name of the matched location (:data:`None` when no
+location matched), ``signal`` and ``value`` tell which signal matched and
+``gateway_mac`` is the MAC address of the gateway (:data:`None` when unknown).
+"""
+
+# The resolvers created by get_location_resolver().
+cached_resolvers = {}
+
+# The MAC addresses of gateways found by find_cached_mac().
+cached_macs = {}
+
+# Serializes access to cached_resolvers and cached_macs.
+lock = threading.Lock()
+
+
+class LocationResolver(object):
+
+    """Match the current network against a set of known locations."""
+
+    def __init__(self, locations):
+        """
+        Initialize a :class:`LocationResolver` object.
+
+        :param locations: A dictionary with location names as keys. The values
+                          are lists of gateway MAC addresses or dictionaries
+                          with signal names (see :data:`SIGNALS`) as keys
+                          and lists of strings as values.
+        :raises: :exc:`~exceptions.ValueError` when an unknown signal is used
+                 or a subnet can't be parsed.
+        """
+        self.gateways = {}
+        self.domains = {}
+        self.subnets = []
+        self.interfaces = {}
+        self.results = {}
+        for name, signals in sorted(locations.items()):
+            if not isinstance(signals, dict):
+                signals = dict(gateway=signals)
+            for signal, values in signals.items():
+                if signal not in SIGNALS:
+                    raise ValueError("Unknown location signal %r! (supported signals are %s)"
+                                     % (signal, ', '.join(SIGNALS)))
+                for value in [values] if isinstance(values, str) else values:
+                    if signal == 'gateway':
+                        self.gateways.setdefault(normalize_mac(value), name)
+                    elif signal == 'domain':
+                        self.domains.setdefault(normalize_domain(value), name)
+                    elif signal == 'subnet':
+                        parse_network(value)
+                        self.subnets.append((value, name))
+                    else:
+                        self.interfaces.setdefault(value, name)
+
+    def resolve(self, route, find_mac):
+        """
+        Find the location of the current network.
+
+        :param route: The default route (a :class:`~dwim.network.Route`
+                      object or :data:`None`).
+        :param find_mac: A callable that takes a :class:`~dwim.network.Route`
+                         object and returns the MAC address of its gateway.
+        :returns: A :class:`Location` object.
+
+        Locations that were recognized by the MAC address of the gateway
+        are cached per default route, so repeated calls only cost a read of
+        ``/proc/net/route`` (done by the caller). Other results (matches on
+        weaker signals, which can change while the default route stays the
+        same, and unknown networks) aren't cached, so they are evaluated
+        again on the next call.
+        """
+        key = (route.gateway, route.interface) if route else None
+        if key in self.results:
+            return self.results[key]
+        location = self.evaluate(route, find_mac)
+        if location.signal == 'gateway':
+            self.results[key] = location
+        return location
+
+    def evaluate(self, route, find_mac):
+        """
+        Evaluate the signals of the current network (bypassing the cache).
+
+        :param route: The default route (a :class:`~dwim.network.Route`
+                      object or :data:`None`).
+        :param find_mac: A callable that takes a :class:`~dwim.network.Route`
+                         object and returns the MAC address of its gateway.
+        :returns: A :class:`Location` object.
+        """
+        gateway_mac = find_cached_mac(route, find_mac) if route else None
+        if gateway_mac:
+            gateway_mac = normalize_mac(gateway_mac)
+            if gateway_mac in self.gateways:
+                return Location(self.gateways[gateway_mac], 'gateway', gateway_mac, gateway_mac)
+        if self.domains:
+            for domain in find_search_domains():
+                for known_domain, name in self.domains.items():
+                    if domain == known_domain or domain.endswith('.' + known_domain):
+                        return Location(name, 'domain', domain, gateway_mac)
+        if self.subnets:
+            try:
+                networks = find_connected_networks()
+            except EnvironmentError as e:
+                logger.debug("Failed to find connected networks! (%s)", e)
+                networks = []
+            for network in networks:
+                if route is None or network.interface == route.interface:
+                    for subnet, name in self.subnets:
+                        if network_contains(subnet, network):
+                            return Location(name, 'subnet', '%s/%i' % (network.address, network.prefix), gateway_mac)
+        if route and route.interface in self.interfaces:
+            return Location(self.interfaces[route.interface], 'interface', route.interface, gateway_mac)
+        return Location(None, None, None, gateway_mac)
+
+
+def get_location_resolver(locations):
+    """
+    Get a :class:`LocationResolver` for a set of locations.
+
+    :param locations: A dictionary with location definitions (see
+                      :class:`LocationResolver`).
+    :returns: A :class:`LocationResolver` object (the same object is
+              returned for the same set of locations).
+    """
+    key = freeze(locations)
+    with lock:
+        if key not in cached_resolvers:
+            cached_resolvers[key] = LocationResolver(locations)
+        return cached_resolvers[key]
+
+
+def invalidate_location_cache():
+    """
+    Forget the locations resolved by the cached :class:`LocationResolver` objects.
+
+    This is called by ``dwim --daemon`` before it evaluates the profile,
+    because gateways with the same IP address on the same interface can
+    belong to different networks.
+    """
+    with lock:
+        for resolver in cached_resolvers.values():
+            resolver.results.clear()
+        cached_macs.clear()
+
+
+def find_cached_mac(route, find_mac):
+    """
+    Find the MAC address of a gateway (reusing the MAC addresses found earlier).
+
+    :param route: A route (an object with ``gateway`` and ``interface``
+                  attributes).
+    :param find_mac: A callable that finds the MAC address of the gateway of
+                     a route.
+    :returns: The MAC address of the gateway (a string or :data:`None`).
+
+    This avoids waiting for the same ARP lookup over and over again when the
+    location is resolved for several sets of locations, for example by
+    ``dwim --system`` (see :mod:`dwim.system`), which finds the MAC address
+    of the gateway once before it evaluates the profiles of all users. Only
+    MAC addresses that were found are cached, so a lookup that failed (for
+    example because the ARP entry was still incomplete) is retried on the
+    next call.
+    """
+    key = (route.gateway, route.interface)
+    with lock:
+        if key in cached_macs:
+            return cached_macs[key]
+    mac = find_mac(route)
+    if mac:
+        with lock:
+            cached_macs[key] = mac
+    return mac
+
+
+def freeze(value):
+    """
+    Convert location definitions to a hashable value.
+
+    :param value: A dictionary, list, tuple or string.
+    :returns: A hashable value.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
@@ -0,0 +1,474 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Native network introspection based on the ``proc`` file system.
+
+The functions in this module read the kernel's IPv4 routing table and ARP
+cache from ``/proc/net/route`` and ``/proc/net/arp`` so that the gateway of
+the current network can be found without running ``ip route`` and ``arp -n``,
+and they find the directly connected networks and DNS search domains that
+:mod:`dwim.location` uses as additional signals.
+
+The :class:`NetworkMonitor` class subscribes to rtnetlink events so that
+callers can wait for changes in the network configuration instead of polling,
+and the probe classes check connectivity without forking ``ping``.
+"""
+
+# Standard library modules.
+import collections
+import errno
+import logging
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+# Python 2.x / 3.x compatibility.
+try:
+    from queue import Empty, Queue
+except ImportError:
+    from Queue import Empty, Queue
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOT = '/proc'
+"""The default location of the ``proc`` file system (a string)."""
+
+RTF_UP = 0x0001
+"""The route flag that indicates a usable route (an integer)."""
+
+RTF_GATEWAY = 0x0002
+"""The route flag that indicates a route via a gateway (an integer)."""
+
+ATF_COM = 0x02
+"""The ARP flag that indicates a completed ARP cache entry (an integer)."""
+
+RTMGRP_LINK = 0x0001
+"""The rtnetlink multicast group for link events (an integer)."""
+
+RTMGRP_IPV4_IFADDR = 0x0010
+"""The rtnetlink multicast group for IPv4 address events (an integer)."""
+
+RTMGRP_IPV4_ROUTE = 0x0040
+"""The rtnetlink multicast group for IPv4 route events (an integer)."""
+
+RTMGRP_IPV6_IFADDR = 0x0100
+"""The rtnetlink multicast group for IPv6 address events (an integer)."""
+
+RTMGRP_IPV6_ROUTE = 0x0400
+"""The rtnetlink multicast group for IPv6 route events (an integer)."""
+
+DEFAULT_GROUPS = RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_IFADDR | RTMGRP_IPV6_ROUTE
+"""The rtnetlink multicast groups that :class:`NetworkMonitor` subscribes to by default (an integer)."""
+
+DEFAULT_PROBE_TIMEOUT = 1
+"""The default timeout of connectivity probes in seconds (a number)."""
+
+RESOLV_CONF = '/etc/resolv.conf'
+"""The pathname of the resolver configuration (a string)."""
+
+Route = collections.namedtuple('Route', 'interface, gateway, metric')
+"""A default route (a named tuple with the fields ``interface``, ``gateway`` and ``metric``)."""
+
+Network = collections.namedtuple('Network', 'interface, address, prefix')
+"""A directly connected network (a named tuple with the fields ``interface``, ``address`` and ``prefix``)."""
+
+
+def find_default_routes(root=DEFAULT_ROOT):
+    """
+    Find the default IPv4 routes in ``/proc/net/route``.
+
+    :param root: The location of the ``proc`` file system (a string).
+    :returns: A list of :class:`Route` objects sorted by metric and interface
+              name, so that the route the kernel prefers comes first and the
+              order is deterministic when several default routes exist (for
+              example on a host connected to a VPN and a wireless network).
+    :raises: :exc:`~exceptions.EnvironmentError` when ``/proc/net/route``
+             can't be read.
+    """
+    routes = []
+    for interface, destination, gateway, flags, metric, mask in parse_route_table(root):
+        is_default = destination == 0 and mask == 0
+        if is_default and flags & RTF_UP and flags & RTF_GATEWAY:
+            routes.append(Route(interface=interface,
+                                gateway=decode_address(gateway),
+                                metric=metric))
+    routes.sort(key=lambda r: (r.metric, r.interface))
+    logger.debug("Default routes in %s/net/route: %s", root, routes)
+    return routes
+
+
+def find_connected_networks(root=DEFAULT_ROOT):
+    """
+    Find the IPv4 networks that are directly connected in ``/proc/net/route``.
+
+    :param root: The location of the ``proc`` file system (a string).
+    :returns: A list of :class:`Network` objects.
+    :raises: :exc:`~exceptions.EnvironmentError` when ``/proc/net/route``
+             can't be read.
+    """
+    networks = []
+    for interface, destination, gateway, flags, metric, mask in parse_route_table(root):
+        if mask != 0 and flags & RTF_UP and not flags & RTF_GATEWAY:
+            networks.append(Network(interface=interface,
+                                    address=decode_address(destination),
+                                    prefix=bin(mask).count('1')))
+    return networks
+
+
+def parse_route_table(root=DEFAULT_ROOT):
+    """
+    Parse ``/proc/net/route``.
+
+    :param root: The location of the ``proc`` file system (a string).
+    :returns: A generator of tuples with six values: The interface name (a
+              string) followed by the destination, gateway, flags, metric
+              and mask (integers, addresses are in host byte order).
+    :raises: :exc:`~exceptions.EnvironmentError` when ``/proc/net/route``
+             can't be read.
+    """
+    with open(os.path.join(root, 'net', 'route')) as handle:
+        # Skip the header line.
+        next(handle)
+        for line in handle:
+            fields = line.split()
+            if len(fields) >= 8:
+                yield (fields[0], int(fields[1], 16), int(fields[2], 16),
+                       int(fields[3], 16), int(fields[6]), int(fields[7], 16))
+
+
+def find_search_domains(filename=RESOLV_CONF):
+    """
+    Find the DNS search domains of the current network.
+
+    :param filename: The pathname of the resolver configuration (a string).
+    :returns: A list of lowercase domain names (strings), empty when the
+              resolver configuration can't be read.
+    """
+    domains = []
+    try:
+        with open(filename) as handle:
+            for line in handle:
+                tokens = line.split()
+                if tokens and tokens[0] in ('search', 'domain'):
+                    domains.extend(normalize_domain(t) for t in tokens[1:])
+    except EnvironmentError as e:
+        logger.debug("Failed to read %s! (%s)", filename, e)
+    return domains
+
+
+def find_neighbour_mac(ip_address, interface=None, root=DEFAULT_ROOT):
+    """
+    Find the MAC address of a neighbour in ``/proc/net/arp``.
+
+    :param ip_address: The IPv4 address of the neighbour (a string).
+    :param interface: The name of the network interface (a string or
+                      :data:`None` to match any interface).
+    :param root: The location of the ``proc`` file system (a string).
+    :returns: The MAC address (a string) or :data:`None` when the ARP cache
+              doesn't contain a completed entry for the neighbour.
+    :raises: :exc:`~exceptions.EnvironmentError` when ``/proc/net/arp``
+             can't be read.
+    """
+    with open(os.path.join(root, 'net', 'arp')) as handle:
+        # Skip the header line.
+        next(handle)
+        for line in handle:
+            fields = line.split()
+            if len(fields) >= 6 and fields[0] == ip_address:
+                flags, mac_address, device = int(fields[2], 16), fields[3], fields[5]
+                if flags & ATF_COM and (interface is None or device == interface):
+                    return mac_address
+    return None
+
+
+def decode_address(value):
+    """
+    Decode an IPv4 address from ``/proc/net/route``.
+
+    :param value: The address as a number in host byte order (an integer).
+    :returns: The address in dotted decimal notation (a string).
+    """
+    return socket.inet_ntoa(struct.pack('=I', value))
+
+
+def network_contains(network, other):
+    """
+    Check whether one IPv4 network contains another.
+
+    :param network: A network in CIDR notation (a string like
+                    ``192.168.1.0/24``) or a :class:`Network` object.
+    :param other: A network in CIDR notation or a :class:`Network` object.
+    :returns: :data:`True` if `network` contains `other`, :data:`False`
+              otherwise.
+    :raises: :exc:`~exceptions.ValueError` when a network can't be parsed.
+    """
+    address, prefix = parse_network(network)
+    other_address, other_prefix = parse_network(other)
+    mask = (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
+    return other_prefix >= prefix and (address & mask) == (other_address & mask)
+
+
+def parse_network(value):
+    """
+    Parse an IPv4 network.
+
+    :param value: A network in CIDR notation (a string) or a :class:`Network` object.
+    :returns: A tuple with the address in network byte order and the prefix
+              length (two integers). A string without a prefix length is
+              treated as a single host.
+    :raises: :exc:`~exceptions.ValueError` when the network can't be parsed.
+    """
+    if isinstance(value, Network):
+        address, prefix = value.address, value.prefix
+    else:
+        address, _, prefix = value.partition('/')
+        prefix = int(prefix) if prefix else 32
+    try:
+        number = struct.unpack('!I', socket.inet_aton(address))[0]
+    except (socket.error, struct.error):
+        raise ValueError("Invalid IPv4 address! (%r)" % value)
+    if not 0 <= prefix <= 32:
+        raise ValueError("Invalid prefix length! (%r)" % value)
+    return number, prefix
+
+
+def normalize_mac(value):
+    """
+    Normalize a MAC address.
+
+    :param value: A MAC address (a string like ``84:9C:A6:76:23:8E``, the
+                  octets can also be separated by dashes and leading zeros
+                  can be omitted).
+    :returns: The MAC address in lowercase with colons and leading zeros
+              (a string like ``84:9c:a6:76:23:8e``).
+    """
+    return ':'.join(octet.zfill(2) for octet in value.strip().lower().replace('-', ':').split(':'))
+
+
+def normalize_domain(value):
+    """
+    Normalize a domain name.
+
+    :param value: A domain name (a string).
+    :returns: The domain name in lowercase without a trailing dot (a string).
+    """
+    return value.strip().lower().rstrip('.')
+
+
+class NetworkMonitor(object):
+
+    """
+    Wait for changes in the network configuration using rtnetlink.
+
+    The monitor subscribes to link, address and route events. When rtnetlink
+    isn't available (for example because the platform isn't Linux) the
+    :func:`wait()` method degrades to sleeping.
+    """
+
+    def __init__(self, groups=DEFAULT_GROUPS):
+        """
+        Initialize a :class:`NetworkMonitor` object.
+
+        :param groups: The rtnetlink multicast groups to subscribe to (an
+                       integer, defaults to :data:`DEFAULT_GROUPS`).
+        """
+        self.socket = None
+        try:
+            self.socket = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            self.socket.bind((0, groups))
+            self.socket.setblocking(False)
+        except (AttributeError, EnvironmentError) as e:
+            logger.debug("Failed to subscribe to rtnetlink events, will poll instead! (%s)", e)
+            self.close()
+
+    @property
+    def fileno(self):
+        """The file descriptor of the rtnetlink socket (an integer or :data:`None`)."""
+        return self.socket.fileno() if self.socket else None
+
+    def wait(self, timeout):
+        """
+        Wait for the network configuration to change.
+
+        :param timeout: The maximum number of seconds to wait (a number).
+        :returns: :data:`True` when the network configuration changed,
+                  :data:`False` when the timeout expired.
+        """
+        timeout = max(0, timeout)
+        if not self.socket:
+            time.sleep(timeout)
+            return False
+        readable, _, _ = select.select([self.socket], [], [], timeout)
+        if not readable:
+            return False
+        # Drain the socket so that a burst of events counts as one change.
+        while True:
+            try:
+                self.socket.recv(65536)
+            except EnvironmentError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                if e.errno == errno.ENOBUFS:
+                    # The kernel dropped events because we didn't read them
+                    # fast enough, which certainly counts as a change.
+                    logger.debug("Network events were dropped (socket buffer overflowed).")
+                    break
+                raise
+        logger.debug("Network configuration changed.")
+        return True
+
+    def close(self):
+        """Unsubscribe from rtnetlink events."""
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+
+    def __enter__(self):
+        """Enable the use of :class:`NetworkMonitor` objects as context managers."""
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        """Close the rtnetlink socket when leaving the context."""
+        self.close()
+
+
+class TCPProbe(object):
+
+    """Check connectivity by opening a TCP connection."""
+
+    def __init__(self, host, port, timeout=DEFAULT_PROBE_TIMEOUT):
+        """
+        Initialize a :class:`TCPProbe` object.
+
+        :param host: The host name or IP address to connect to (a string).
+        :param port: The port number to connect to (an integer).
+        :param timeout: The connection timeout in seconds (a number).
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def check(self):
+        """
+        Try to connect to the configured host and port.
+
+        :returns: :data:`True` if the connection succeeded, :data:`False` otherwise.
+        """
+        try:
+            connection = socket.create_connection((self.host, self.port), self.timeout)
+            connection.close()
+            return True
+        except EnvironmentError as e:
+            logger.debug("%s failed! (%s)", self, e)
+            return False
+
+    def __str__(self):
+        """Render a human friendly representation of the probe."""
+        return 'TCP probe of %s:%i' % (self.host, self.port)
+
+
+class ICMPProbe(object):
+
+    """
+    Check connectivity by sending an ICMP echo request.
+
+    This uses an unprivileged ICMP datagram socket (a "ping socket"), which
+    requires that the user's group is included in the
+    ``net.ipv4.ping_group_range`` sysctl. When ping sockets aren't
+    available the probe simply fails.
+    """
+
+    def __init__(self, host, timeout=DEFAULT_PROBE_TIMEOUT):
+        """
+        Initialize an :class:`ICMPProbe` object.
+
+        :param host: The IPv4 address to ping (a string).
+        :param timeout: The time to wait for a reply in seconds (a number).
+        """
+        self.host = host
+        self.timeout = timeout
+
+    def check(self):
+        """
+        Send an ICMP echo request and wait for the reply.
+
+        :returns: :data:`True` if a reply was received, :data:`False` otherwise.
+        """
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        except EnvironmentError as e:
+            logger.debug("Ping sockets are not available! (%s)", e)
+            return False
+        try:
+            sock.settimeout(self.timeout)
+            # Type 8 is an echo request, the kernel fills in the identifier
+            # and checksum for us because this is a ping socket.
+            sock.sendto(struct.pack('!BBHHH', 8, 0, 0, 0, 1) + b'dwim', (self.host, 0))
+            deadline = time.time() + self.timeout
+            while time.time() < deadline:
+                reply = sock.recv(1024)
+                # Type 0 is an echo reply.
+                if reply and ord(reply[0:1]) == 0:
+                    return True
+        except EnvironmentError as e:
+            logger.debug("%s failed! (%s)", self, e)
+        finally:
+            sock.close()
+        return False
+
+    def __str__(self):
+        """Render a human friendly representation of the probe."""
+        return 'ICMP probe of %s' % self.host
+
+
+def run_probes(probes):
+    """
+    Run several connectivity probes concurrently.
+
+    :param probes: A list of probe objects (e.g. :class:`TCPProbe` and
+                   :class:`ICMPProbe`).
+    :returns: :data:`True` as soon as one of the probes succeeds,
+              :data:`False` when all of them failed (or didn't finish
+              within the largest probe timeout).
+    """
+    if len(probes) == 1:
+        return check_probe(probes[0])
+    results = Queue()
+    for probe in probes:
+        thread = threading.Thread(target=lambda p=probe: results.put(check_probe(p)))
+        # Don't let a slow probe keep the process alive.
+        thread.daemon = True
+        thread.start()
+    # Allow a bit of slack for the work that the probe timeouts don't cover
+    # (like resolving host names), but never wait forever.
+    deadline = time.time() + max(getattr(p, 'timeout', DEFAULT_PROBE_TIMEOUT) for p in probes) + 1
+    for i in range(len(probes)):
+        try:
+            if results.get(timeout=max(0, deadline - time.time())):
+                return True
+        except Empty:
+            logger.debug("Connectivity probes didn't finish in time, assuming failure.")
+            break
+    return False
+
+
+def check_probe(probe):
+    """
+    Run a connectivity probe without propagating exceptions.
+
+    :param probe: A probe object (e.g. :class:`TCPProbe` or :class:`ICMPProbe`).
+    :returns: :data:`True` if the probe succeeded, :data:`False` otherwise.
+    """
+    try:
+        return probe.check()
+    except Exception as e:
+        logger.debug("%s raised an exception! (%s)", probe, e)
+        return False
@@ -0,0 +1,228 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Indexed and cached resolution of program names on the ``$PATH``.
+
+Looking up a program on the ``$PATH`` means checking for the program in every
+directory on the ``$PATH``, which :func:`.resolve_program()` used to do for
+every program in the user's profile. The :class:`PathIndex` class scans each
+directory once into a set of program names so that lookups don't touch the
+file system (apart from validating the answer). The scan results are cached
+on disk (keyed by the modification time of each directory) so that repeated
+runs of ``dwim`` don't need to scan at all.
+"""
+
+# Standard library modules.
+import json
+import logging
+import os
+import stat
+import threading
+
+# Modules included in our package.
+from dwim.xdg import cache_directory
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT = 1
+"""The version of the on-disk cache format (an integer)."""
+
+# The index shared by get_path_index().
+cached_index = None
+
+# Serializes access to cached_index.
+lock = threading.Lock()
+
+
+class PathIndex(object):
+
+    """An index of the executables in the directories on the ``$PATH``."""
+
+    def __init__(self, search_path=None, cache_file=None):
+        """
+        Initialize a :class:`PathIndex` object.
+
+        :param search_path: The search path (a string, defaults to the
+                            ``$PATH`` environment variable).
+        :param cache_file: The pathname of the on-disk cache (a string,
+                           defaults to :func:`default_cache_file()`). Pass
+                           an empty string to disable the on-disk cache.
+        """
+        self.search_path = os.environ.get('PATH', os.defpath) if search_path is None else search_path
+        self.cache_file = default_cache_file() if cache_file is None else cache_file
+        self.directories = []
+        for directory in self.search_path.split(os.pathsep):
+            if directory and directory not in self.directories:
+                self.directories.append(directory)
+        self.scans = {}
+        self.names = {}
+        self.load()
+
+    def load(self):
+        """Load the index, rescanning only the directories that changed since the last run."""
+        cached_scans = self.read_cache()
+        num_scanned = 0
+        for directory in self.directories:
+            mtime = get_mtime(directory)
+            cached = cached_scans.get(directory)
+            if cached and cached.get('mtime') == mtime:
+                self.scans[directory] = cached
+            else:
+                self.scans[directory] = dict(mtime=mtime, names=scan_directory(directory) if mtime else [])
+                num_scanned += 1
+            self.names[directory] = frozenset(self.scans[directory]['names'])
+        logger.debug("Indexed %i directories on $PATH (%i scanned, %i cached).",
+                     len(self.directories), num_scanned, len(self.directories) - num_scanned)
+        if num_scanned:
+            self.write_cache(cached_scans)
+
+    def refresh(self):
+        """
+        Rescan the directories that changed since they were scanned.
+
+        This is intended for long running processes like ``dwim --daemon``
+        that reuse the same index for a long time.
+        """
+        num_scanned = 0
+        for directory in self.directories:
+            mtime = get_mtime(directory)
+            if mtime != self.scans[directory]['mtime']:
+                self.scans[directory] = dict(mtime=mtime, names=scan_directory(directory) if mtime else [])
+                self.names[directory] = frozenset(self.scans[directory]['names'])
+                num_scanned += 1
+        if num_scanned:
+            logger.debug("Rescanned %i changed directories on $PATH.", num_scanned)
+            self.write_cache(self.read_cache())
+
+    def find(self, name):
+        """
+        Find a program on the ``$PATH``.
+
+        :param name: The name of a program (a string).
+        :returns: The absolute pathname of the program (a string) or
+                  :data:`None` when the program can't be found.
+        """
+        for directory in self.directories:
+            if name in self.names[directory]:
+                pathname = os.path.join(directory, name)
+                if os.access(pathname, os.X_OK):
+                    return pathname
+                # Changing the permissions of a file doesn't change the
+                # modification time of its directory, so we validate our
+                # answer and rescan the directory if it's wrong.
+                logger.debug("Cached $PATH entry is stale, rescanning %s ..", directory)
+                self.scans[directory] = dict(mtime=get_mtime(directory), names=scan_directory(directory))
+                self.names[directory] = frozenset(self.scans[directory]['names'])
+                self.write_cache(self.read_cache())
+                if name in self.names[directory]:
+                    return pathname
+        return None
+
+    def read_cache(self):
+        """
+        Read the on-disk cache.
+
+        :returns: A dictionary with directory pathnames as keys and
+                  dictionaries with the keys ``mtime`` and ``names`` as
+                  values (an empty dictionary when the cache is unavailable).
+        """
+        if self.cache_file:
+            try:
+                with open(self.cache_file) as handle:
+                    contents = json.load(handle)
+                if contents.get('format') == CACHE_FORMAT:
+                    return contents['directories']
+            except Exception as e:
+                logger.debug("Ignoring $PATH index cache %s! (%s)", self.cache_file, e)
+        return {}
+
+    def write_cache(self, cached_scans):
+        """
+        Update the on-disk cache with the current scans.
+
+        :param cached_scans: The scans that were read from the cache (a
+                             dictionary). These are preserved so that
+                             differently configured ``$PATH`` variables can
+                             share the same cache.
+        """
+        if self.cache_file:
+            scans = dict(cached_scans)
+            scans.update(self.scans)
+            temporary_file = '%s.%i.%i' % (self.cache_file, os.getpid(), threading.current_thread().ident)
+            try:
+                directory = os.path.dirname(self.cache_file)
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                with open(temporary_file, 'w') as handle:
+                    json.dump(dict(format=CACHE_FORMAT, directories=scans), handle)
+                os.rename(temporary_file, self.cache_file)
+            except Exception as e:
+                logger.debug("Failed to update $PATH index cache %s! (%s)", self.cache_file, e)
+
+
+def get_path_index():
+    """
+    Get the index of the programs on the ``$PATH``.
+
+    :returns: A :class:`PathIndex` object.
+
+    The index is created on first use and recreated when the ``$PATH``
+    environment variable changes.
+    """
+    global cached_index
+    search_path = os.environ.get('PATH', os.defpath)
+    with lock:
+        if cached_index is None or cached_index.search_path != search_path:
+            cached_index = PathIndex(search_path)
+        return cached_index
+
+
+def default_cache_file():
+    """
+    Get the default location of the on-disk cache used by :class:`PathIndex`.
+
+    :returns: The pathname ``$XDG_CACHE_HOME/dwim/path-index.json`` (a string).
+    """
+    return cache_directory('path-index.json')
+
+
+def get_mtime(directory):
+    """
+    Get the modification time of a directory.
+
+    :param directory: The pathname of a directory (a string).
+    :returns: The modification time (a number) or :data:`None` when the
+              directory doesn't exist.
+    """
+    try:
+        return os.stat(directory).st_mtime
+    except EnvironmentError:
+        return None
+
+
+def scan_directory(directory):
+    """
+    Find the executables in a directory.
+
+    :param directory: The pathname of a directory (a string).
+    :returns: A sorted list of filenames.
+    """
+    names = []
+    try:
+        entries = os.listdir(directory)
+    except EnvironmentError:
+        return names
+    for name in entries:
+        pathname = os.path.join(directory, name)
+        try:
+            if stat.S_ISREG(os.stat(pathname).st_mode) and os.access(pathname, os.X_OK):
+                names.append(name)
+        except EnvironmentError:
+            # Broken symbolic links.
+            pass
+    return sorted(names)
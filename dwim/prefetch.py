@@ -0,0 +1,545 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Prefetching programs and their shared libraries into the page cache.
+
+The cold start of a large GUI program is dominated by page faults on the
+executable and its shared libraries. When the profile calls
+:func:`enable_prefetch()` a background thread asks the kernel to read these
+files into the page cache (using :func:`os.posix_fadvise()` with
+``POSIX_FADV_WILLNEED``) before the programs are started:
+
+- The programs resolved by :func:`.resolve_program()` during the previous
+  run are prefetched right away, so that prefetching overlaps with waiting
+  for the network and determining the location. Programs that are resolved
+  for the first time are prefetched when they're resolved.
+
+- The shared libraries of a program are found by reading the ``DT_NEEDED``
+  entries from the dynamic section of its ELF headers (recursively) and
+  searching for them the way the dynamic linker does (``DT_RPATH``,
+  ``$LD_LIBRARY_PATH``, ``DT_RUNPATH``, ``/etc/ld.so.conf`` and the default
+  directories). Scripts are followed to their interpreter.
+
+- The resulting list of files is cached on disk per program (keyed by the
+  modification time of the program) in ``$XDG_CACHE_HOME/dwim/prefetch.json``.
+
+- The time spent and the number of bytes prefetched per program are logged
+  when the profile has been evaluated (and recorded as ``prefetch`` spans
+  when tracing is enabled).
+"""
+
+# Standard library modules.
+import collections
+import glob
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+# Modules included in our package.
+from dwim.tracing import span
+from dwim.xdg import cache_directory
+
+# Python 2.x / 3.x compatibility.
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT = 1
+"""The version of the on-disk cache format (an integer)."""
+
+LD_SO_CONF = '/etc/ld.so.conf'
+"""The configuration file of the dynamic linker (a string)."""
+
+ELF_MAGIC = b'\x7fELF'
+"""The first four bytes of an ELF file (a byte string)."""
+
+PT_LOAD = 1
+"""The program header type of a loadable segment (an integer)."""
+
+PT_DYNAMIC = 2
+"""The program header type of the dynamic section (an integer)."""
+
+DT_NEEDED = 1
+"""The dynamic section tag of a needed library (an integer)."""
+
+DT_STRTAB = 5
+"""The dynamic section tag of the string table address (an integer)."""
+
+DT_RPATH = 15
+"""The dynamic section tag of the (deprecated) library search path (an integer)."""
+
+DT_RUNPATH = 29
+"""The dynamic section tag of the library search path (an integer)."""
+
+# The prefetcher started by enable_prefetch() (None when prefetching is disabled).
+active_prefetcher = None
+
+# Serializes access to active_prefetcher.
+lock = threading.Lock()
+
+ElfInfo = collections.namedtuple('ElfInfo', 'elf_class, machine, needed, rpath, runpath')
+"""The dynamic linking information of an ELF file (a :func:`~collections.namedtuple`)."""
+
+PrefetchResult = collections.namedtuple('PrefetchResult', 'program, files, size, elapsed_time')
+"""The outcome of prefetching a program (a :func:`~collections.namedtuple`)."""
+
+
+class Prefetcher(object):
+
+    """Prefetch programs and their shared libraries in a background thread."""
+
+    def __init__(self, cache_file=None):
+        """
+        Initialize a :class:`Prefetcher` object.
+
+        :param cache_file: The pathname of the on-disk cache (a string,
+                           defaults to :func:`default_cache_file()`).
+        """
+        self.cache_file = cache_file or default_cache_file()
+        self.cache = self.read_cache()
+        self.resolver = LibraryResolver()
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.programs = []
+        self.queued = set()
+        self.prefetched = set()
+        self.results = []
+        self.thread = None
+
+    def start(self):
+        """Start the background thread and queue the programs of the previous run."""
+        for pathname in self.cache['programs']:
+            self.add(pathname, remember=False)
+        self.thread = threading.Thread(target=self.run, name='prefetch')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def add(self, pathname, remember=True):
+        """
+        Queue a program to be prefetched.
+
+        :param pathname: The absolute pathname of the program (a string).
+        :param remember: :data:`True` to prefetch the program at the start of
+                         the next run, :data:`False` otherwise.
+        """
+        with self.lock:
+            if remember and pathname not in self.programs:
+                self.programs.append(pathname)
+            if pathname in self.queued:
+                return
+            self.queued.add(pathname)
+        self.queue.put(pathname)
+
+    def run(self):
+        """Prefetch queued programs until :func:`stop()` is called."""
+        while True:
+            pathname = self.queue.get()
+            if pathname is None:
+                break
+            try:
+                self.prefetch(pathname)
+            except Exception as e:
+                logger.debug("Failed to prefetch %s! (%s)", pathname, e)
+
+    def prefetch(self, pathname):
+        """
+        Prefetch a program and its shared libraries.
+
+        :param pathname: The absolute pathname of the program (a string).
+
+        Files that were already prefetched for another program (like the C
+        library) are skipped, so the reported size of a program only
+        includes the files that it added.
+        """
+        with span('prefetch', 'prefetch', program=pathname) as prefetch_span:
+            start_time = time.time()
+            num_files = 0
+            total_size = 0
+            for filename in self.find_files(pathname):
+                filename = os.path.realpath(filename)
+                if filename not in self.prefetched:
+                    self.prefetched.add(filename)
+                    size = advise_willneed(filename)
+                    if size is not None:
+                        num_files += 1
+                        total_size += size
+            result = PrefetchResult(pathname, num_files, total_size, time.time() - start_time)
+            prefetch_span.set(files=num_files, size=total_size)
+        with self.lock:
+            self.results.append(result)
+
+    def find_files(self, pathname):
+        """
+        Find the files to prefetch for a program.
+
+        :param pathname: The absolute pathname of the program (a string).
+        :returns: A list of pathnames (strings) starting with the program.
+        """
+        mtime = os.stat(pathname).st_mtime
+        with self.lock:
+            entry = self.cache['binaries'].get(pathname)
+        if entry and entry['mtime'] == mtime:
+            return entry['files']
+        files = [pathname] + self.resolver.find_dependencies(pathname)
+        logger.debug("Found %i files to prefetch for %s.", len(files), pathname)
+        with self.lock:
+            self.cache['binaries'][pathname] = dict(mtime=mtime, files=files)
+        return files
+
+    def stop(self):
+        """
+        Stop the background thread and update the on-disk cache.
+
+        :returns: A list of :data:`PrefetchResult` tuples.
+
+        Programs that are still queued are skipped, because by now they've
+        been started (or found to be running) anyway.
+        """
+        if self.thread:
+            try:
+                while True:
+                    self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self.write_cache()
+        with self.lock:
+            return list(self.results)
+
+    def read_cache(self):
+        """
+        Read the on-disk cache.
+
+        :returns: A dictionary with the keys ``programs`` (a list of
+                  pathnames) and ``binaries`` (a dictionary with pathnames
+                  as keys and dictionaries with the keys ``mtime`` and
+                  ``files`` as values).
+        """
+        try:
+            with open(self.cache_file) as handle:
+                contents = json.load(handle)
+            if contents.get('format') == CACHE_FORMAT:
+                return dict(programs=contents['programs'], binaries=contents['binaries'])
+        except Exception as e:
+            logger.debug("Ignoring prefetch cache %s! (%s)", self.cache_file, e)
+        return dict(programs=[], binaries={})
+
+    def write_cache(self):
+        """Update the on-disk cache with the programs resolved during this run."""
+        with self.lock:
+            programs = list(self.programs)
+            binaries = dict((p, self.cache['binaries'][p]) for p in programs if p in self.cache['binaries'])
+        temporary_file = '%s.%i' % (self.cache_file, os.getpid())
+        try:
+            directory = os.path.dirname(self.cache_file)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(temporary_file, 'w') as handle:
+                json.dump(dict(format=CACHE_FORMAT, programs=programs, binaries=binaries), handle)
+            os.rename(temporary_file, self.cache_file)
+        except Exception as e:
+            logger.debug("Failed to update prefetch cache %s! (%s)", self.cache_file, e)
+
+
+class LibraryResolver(object):
+
+    """Find the shared libraries needed by a program like the dynamic linker does."""
+
+    def __init__(self):
+        """Initialize a :class:`LibraryResolver` object."""
+        self.system_directories = find_system_directories()
+        self.library_path = [d for d in os.environ.get('LD_LIBRARY_PATH', '').split(':') if d]
+
+    def find_dependencies(self, pathname):
+        """
+        Find the shared libraries needed by a program (recursively).
+
+        :param pathname: The pathname of a program (a string).
+        :returns: A list of pathnames (strings). For scripts this includes
+                  the interpreter and its shared libraries.
+        """
+        dependencies = []
+        interpreter = read_interpreter(pathname)
+        if interpreter:
+            dependencies.append(interpreter)
+            pending = [interpreter]
+        else:
+            pending = [pathname]
+        seen = set()
+        while pending:
+            current = pending.pop(0)
+            info = read_elf_info(current)
+            if info is None:
+                continue
+            for name in info.needed:
+                library = self.find_library(name, info, os.path.dirname(current))
+                if library and library not in seen:
+                    seen.add(library)
+                    dependencies.append(library)
+                    pending.append(library)
+        return dependencies
+
+    def find_library(self, name, info, origin):
+        """
+        Find a shared library.
+
+        :param name: The name of the library (a string).
+        :param info: The :data:`ElfInfo` of the file that needs the library.
+        :param origin: The directory of the file that needs the library (a string).
+        :returns: The pathname of the library (a string) or :data:`None`
+                  when it can't be found.
+        """
+        if '/' in name:
+            return name if os.path.isfile(name) else None
+        directories = []
+        if not info.runpath:
+            directories.extend(info.rpath)
+        directories.extend(self.library_path)
+        directories.extend(info.runpath)
+        directories.extend(self.system_directories)
+        lib = 'lib64' if info.elf_class == 2 else 'lib'
+        for directory in directories:
+            directory = directory.replace('${ORIGIN}', origin).replace('$ORIGIN', origin)
+            directory = directory.replace('${LIB}', lib).replace('$LIB', lib)
+            candidate = os.path.join(directory, name)
+            if os.path.isfile(candidate):
+                # Skip libraries for a different architecture (for example
+                # 32 bit libraries in multilib installations).
+                candidate_info = read_elf_info(candidate)
+                if candidate_info and candidate_info[:2] == info[:2]:
+                    return candidate
+        return None
+
+
+def enable_prefetch():
+    """
+    Start prefetching programs and their shared libraries in the background.
+
+    Call this at the start of the profile, so that prefetching overlaps with
+    the rest of the profile (for example waiting for the network).
+    """
+    global active_prefetcher
+    with lock:
+        if active_prefetcher is None:
+            active_prefetcher = Prefetcher()
+            active_prefetcher.start()
+
+
+def get_prefetcher():
+    """
+    Get the prefetcher started by :func:`enable_prefetch()`.
+
+    :returns: A :class:`Prefetcher` object or :data:`None` when prefetching is disabled.
+    """
+    return active_prefetcher
+
+
+def stop_prefetch():
+    """
+    Stop prefetching and report the time spent and bytes prefetched per program.
+
+    :returns: A list of :data:`PrefetchResult` tuples (empty when prefetching
+              wasn't enabled).
+    """
+    global active_prefetcher
+    with lock:
+        prefetcher = active_prefetcher
+        active_prefetcher = None
+    if prefetcher is None:
+        return []
+    from humanfriendly import format_size, pluralize
+    results = prefetcher.stop()
+    for result in results:
+        logger.info("Prefetched %s (%s, %s) in %.2f ms.", result.program,
+                    pluralize(result.files, 'file'), format_size(result.size),
+                    result.elapsed_time * 1000)
+    return results
+
+
+def advise_willneed(filename):
+    """
+    Ask the kernel to read a file into the page cache.
+
+    :param filename: The pathname of the file (a string).
+    :returns: The size of the file in bytes (an integer) or :data:`None`
+              when the file can't be opened or the advice isn't supported.
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return None
+    try:
+        fd = os.open(filename, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            return os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+    except EnvironmentError as e:
+        logger.debug("Failed to prefetch %s! (%s)", filename, e)
+        return None
+
+
+def read_elf_info(pathname):
+    """
+    Read the dynamic linking information of an ELF file.
+
+    :param pathname: The pathname of the file (a string).
+    :returns: An :data:`ElfInfo` tuple or :data:`None` when the file isn't
+              an ELF file (or can't be read).
+
+    The dynamic section is located using the program headers (not the
+    section headers, which can be stripped), which is also how the dynamic
+    linker finds it.
+    """
+    try:
+        with open(pathname, 'rb') as handle:
+            if handle.read(4) != ELF_MAGIC:
+                return None
+            data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (EnvironmentError, ValueError):
+        return None
+    try:
+        return parse_elf_info(data)
+    except (struct.error, IndexError, ValueError) as e:
+        logger.debug("Failed to parse ELF headers of %s! (%s)", pathname, e)
+        return None
+    finally:
+        data.close()
+
+
+def parse_elf_info(data):
+    """
+    Parse the dynamic linking information of an ELF file.
+
+    :param data: The contents of the ELF file (a byte string or :class:`mmap.mmap` object).
+    :returns: An :data:`ElfInfo` tuple.
+    :raises: :exc:`~exceptions.ValueError` when the ELF file is malformed.
+    """
+    elf_class = ord(data[4:5])
+    endian = '<' if ord(data[5:6]) == 1 else '>'
+    if elf_class == 2:
+        header_format, phdr_format, dyn_format = 'HHIQQQIHHHHHH', 'IIQQQQQQ', 'qQ'
+    elif elf_class == 1:
+        header_format, phdr_format, dyn_format = 'HHIIIIIHHHHHH', 'IIIIIIII', 'iI'
+    else:
+        raise ValueError("Unknown ELF class %i!" % elf_class)
+    header = struct.unpack_from(endian + header_format, data, 16)
+    machine, phoff, phentsize, phnum = header[1], header[4], header[8], header[9]
+    loads = []
+    dynamic = None
+    for index in range(phnum):
+        fields = struct.unpack_from(endian + phdr_format, data, phoff + index * phentsize)
+        if elf_class == 2:
+            p_type, p_offset, p_vaddr, p_filesz = fields[0], fields[2], fields[3], fields[5]
+        else:
+            p_type, p_offset, p_vaddr, p_filesz = fields[0], fields[1], fields[2], fields[4]
+        if p_type == PT_LOAD:
+            loads.append((p_vaddr, p_offset, p_filesz))
+        elif p_type == PT_DYNAMIC:
+            dynamic = (p_offset, p_filesz)
+    if dynamic is None:
+        # Statically linked.
+        return ElfInfo(elf_class, machine, [], [], [])
+    entries = []
+    entry_size = struct.calcsize(endian + dyn_format)
+    for offset in range(dynamic[0], dynamic[0] + dynamic[1], entry_size):
+        tag, value = struct.unpack_from(endian + dyn_format, data, offset)
+        if tag == 0:
+            break
+        entries.append((tag, value))
+    strtab = None
+    for tag, value in entries:
+        if tag == DT_STRTAB:
+            for vaddr, offset, size in loads:
+                if vaddr <= value < vaddr + size:
+                    strtab = value - vaddr + offset
+    if strtab is None:
+        raise ValueError("Failed to locate dynamic string table!")
+
+    def get_string(offset):
+        start = strtab + offset
+        end = data.find(b'\0', start)
+        return data[start:end].decode('UTF-8', 'replace')
+
+    return ElfInfo(
+        elf_class=elf_class,
+        machine=machine,
+        needed=[get_string(value) for tag, value in entries if tag == DT_NEEDED],
+        rpath=[d for tag, value in entries if tag == DT_RPATH for d in get_string(value).split(':') if d],
+        runpath=[d for tag, value in entries if tag == DT_RUNPATH for d in get_string(value).split(':') if d],
+    )
+
+
+def read_interpreter(pathname):
+    """
+    Get the interpreter of a script.
+
+    :param pathname: The pathname of a program (a string).
+    :returns: The pathname of the interpreter (a string) or :data:`None`
+              when the program isn't a script.
+
+    Interpreters started through ``/usr/bin/env`` are looked up on the ``$PATH``.
+    """
+    try:
+        with open(pathname, 'rb') as handle:
+            line = handle.readline(256)
+    except EnvironmentError:
+        return None
+    if not line.startswith(b'#!'):
+        return None
+    tokens = line[2:].decode('UTF-8', 'replace').split()
+    if not tokens:
+        return None
+    if os.path.basename(tokens[0]) == 'env' and len(tokens) > 1:
+        from dwim.paths import get_path_index
+        return get_path_index().find(tokens[1])
+    return tokens[0]
+
+
+def find_system_directories(filename=LD_SO_CONF):
+    """
+    Find the directories that the dynamic linker searches by default.
+
+    :param filename: The pathname of the dynamic linker configuration (a string).
+    :returns: A list of directory pathnames (strings).
+    """
+    directories = []
+    pending = [filename]
+    while pending:
+        try:
+            with open(pending.pop(0)) as handle:
+                for line in handle:
+                    line = line.split('#', 1)[0].strip()
+                    if line.startswith('include '):
+                        pattern = os.path.join(os.path.dirname(filename), line.split(None, 1)[1])
+                        pending.extend(sorted(glob.glob(pattern)))
+                    elif line.startswith('/'):
+                        directories.append(line)
+        except EnvironmentError:
+            pass
+    for directory in ('/lib64', '/usr/lib64', '/lib', '/usr/lib'):
+        if directory not in directories:
+            directories.append(directory)
+    return [d for d in directories if os.path.isdir(d)]
+
+
+def default_cache_file():
+    """
+    Get the default location of the on-disk cache used by :class:`Prefetcher`.
+
+    :returns: The pathname ``$XDG_CACHE_HOME/dwim/prefetch.json`` (a string).
+    """
+    return cache_directory('prefetch.json')
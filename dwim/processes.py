@@ -0,0 +1,606 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+In-process snapshots of the process table.
+
+The default "is running" check of :func:`.launch_program()` used to fork a
+``pidof`` process for every program in the user's profile, which means that a
+profile listing a few dozen programs would walk ``/proc`` a few dozen times.
+The :class:`ProcessTable` class reads ``/proc`` once, indexes the processes by
+executable pathname and name and answers "is this program running?" questions
+using dictionary lookups.
+
+Custom "is running" checks can be expressed as :class:`ProcessMatcher`
+objects instead of shell commands. Matchers are compiled once and evaluated
+in Python against the same snapshot, so they don't fork any processes either.
+"""
+
+# Standard library modules.
+import errno
+import fnmatch
+import logging
+import os
+import pwd
+import re
+import threading
+import weakref
+
+# Modules included in our package.
+from dwim.tracing import traced
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOT = '/proc'
+"""The default location of the ``proc`` file system (a string)."""
+
+# The process table snapshot shared by get_process_table() and friends.
+cached_table = None
+
+# The user that snapshots are limited to (see restrict_process_table()).
+restricted_uid = None
+
+# The matchers that have been created so far (see ProcessTable.evaluate()).
+known_matchers = weakref.WeakKeyDictionary()
+
+# Combined matchers created for tuples of matchers (see coerce_matcher()).
+coerced_matchers = {}
+
+# Serializes access to the shared state above (see launch_programs()).
+lock = threading.RLock()
+
+
+class Process(object):
+
+    """Information about a single process in a :class:`ProcessTable`."""
+
+    def __init__(self, pid, exe=None, cmdline=None, comm=None, directory=None):
+        """
+        Initialize a :class:`Process` object.
+
+        :param pid: The process id (an integer).
+        :param exe: The absolute pathname of the executable (a string or
+                    :data:`None` when the ``exe`` link can't be read).
+        :param cmdline: The command line arguments (a list of strings).
+        :param comm: The process name from ``/proc/[pid]/comm`` (a string or
+                     :data:`None`).
+        :param directory: The pathname of the process's directory in ``/proc``
+                          (a string, used to read :attr:`uid` and
+                          :attr:`cgroups` on demand).
+        """
+        self.pid = pid
+        self.exe = exe
+        self.cmdline = cmdline or []
+        self.comm = comm
+        self.directory = directory
+        self.cached_uid = None
+        self.cached_cgroups = None
+
+    @property
+    def uid(self):
+        """The real user id of the process (an integer or :data:`None`)."""
+        if self.cached_uid is None and self.directory:
+            try:
+                with open(os.path.join(self.directory, 'status')) as handle:
+                    for line in handle:
+                        if line.startswith('Uid:'):
+                            self.cached_uid = int(line.split()[1])
+                            break
+            except EnvironmentError:
+                pass
+        return self.cached_uid
+
+    @property
+    def cgroups(self):
+        """The control group pathnames of the process (a list of strings)."""
+        if self.cached_cgroups is None:
+            self.cached_cgroups = []
+            if self.directory:
+                try:
+                    with open(os.path.join(self.directory, 'cgroup')) as handle:
+                        for line in handle:
+                            # Lines look like "hierarchy-ID:controllers:path".
+                            fields = line.rstrip('\n').split(':', 2)
+                            if len(fields) == 3:
+                                self.cached_cgroups.append(fields[2])
+                except EnvironmentError:
+                    pass
+        return self.cached_cgroups
+
+    @property
+    def names(self):
+        """The names by which ``pidof`` would find this process (a set of strings)."""
+        names = set()
+        if self.comm:
+            names.add(self.comm)
+        if self.cmdline:
+            names.add(os.path.basename(self.cmdline[0]))
+        if self.exe:
+            names.add(os.path.basename(self.exe))
+        return names
+
+    @property
+    def pathnames(self):
+        """The pathnames by which ``pidof`` would find this process (a set of strings)."""
+        pathnames = set()
+        if self.exe:
+            pathnames.add(self.exe)
+        if self.cmdline and os.path.isabs(self.cmdline[0]):
+            pathnames.add(self.cmdline[0])
+        return pathnames
+
+    def __repr__(self):
+        """Render a human friendly representation of a :class:`Process` object."""
+        return 'Process(pid=%i, exe=%r, comm=%r)' % (self.pid, self.exe, self.comm)
+
+
+class ProcessTable(object):
+
+    """
+    A snapshot of the process table read from ``/proc``.
+
+    The snapshot is taken when the object is created and whenever
+    :func:`refresh()` is called. Processes are indexed by the absolute
+    pathname of their executable and by their name so that
+    :func:`is_running()` is a dictionary lookup.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT):
+        """
+        Initialize a :class:`ProcessTable` object.
+
+        :param root: The location of the ``proc`` file system (a string,
+                     defaults to :data:`DEFAULT_ROOT`). This can be changed
+                     to point to a synthetic process table, which is useful
+                     for benchmarking.
+        """
+        self.root = root
+        self.processes = []
+        self.by_name = {}
+        self.by_pathname = {}
+        self.matcher_results = weakref.WeakKeyDictionary()
+        self.refresh()
+
+    @traced('processes')
+    def refresh(self):
+        """Read the process table from ``/proc`` and rebuild the indexes."""
+        processes = []
+        own_pid = os.getpid()
+        for entry in os.listdir(self.root):
+            if entry.isdigit():
+                pid = int(entry)
+                if pid != own_pid:
+                    process = self.read_process(pid)
+                    if process:
+                        processes.append(process)
+        if restricted_uid is not None:
+            processes = [p for p in processes if p.uid == restricted_uid]
+        self.index(processes)
+        logger.debug("Read %i processes from %s.", len(processes), self.root)
+
+    def index(self, processes):
+        """
+        Rebuild the indexes.
+
+        :param processes: A list of :class:`Process` objects.
+        """
+        by_name = {}
+        by_pathname = {}
+        for process in processes:
+            for name in process.names:
+                by_name.setdefault(name, []).append(process)
+            for pathname in process.pathnames:
+                by_pathname.setdefault(pathname, []).append(process)
+        self.processes = processes
+        self.by_name = by_name
+        self.by_pathname = by_pathname
+        self.matcher_results.clear()
+
+    def for_user(self, uid):
+        """
+        Get a copy of the snapshot that only contains the processes of one user.
+
+        :param uid: A user id (an integer).
+        :returns: A :class:`ProcessTable` object (the process table isn't read again).
+        """
+        table = ProcessTable.__new__(ProcessTable)
+        table.root = self.root
+        table.matcher_results = weakref.WeakKeyDictionary()
+        table.index([p for p in self.processes if p.uid == uid])
+        return table
+
+    def read_process(self, pid):
+        """
+        Read the information about a single process from ``/proc``.
+
+        :param pid: The process id (an integer).
+        :returns: A :class:`Process` object or :data:`None` when the process
+                  disappeared while it was being read.
+        """
+        directory = os.path.join(self.root, str(pid))
+        try:
+            with open(os.path.join(directory, 'cmdline'), 'rb') as handle:
+                cmdline = [decode(arg) for arg in handle.read().split(b'\0') if arg]
+            with open(os.path.join(directory, 'comm'), 'rb') as handle:
+                comm = decode(handle.read().rstrip(b'\n')) or None
+        except EnvironmentError as e:
+            if e.errno in (errno.ENOENT, errno.ESRCH):
+                return None
+            cmdline, comm = [], None
+        try:
+            exe = os.readlink(os.path.join(directory, 'exe'))
+            # Programs that were upgraded while running are reported
+            # by the kernel with a " (deleted)" suffix, but for our
+            # purposes they're still the same program.
+            if exe.endswith(' (deleted)'):
+                exe = exe[:-len(' (deleted)')]
+        except EnvironmentError:
+            # Kernel threads don't have an executable and we're not allowed
+            # to read the `exe' link of processes owned by other users.
+            exe = None
+        return Process(pid=pid, exe=exe, cmdline=cmdline, comm=comm, directory=directory)
+
+    def find(self, program):
+        """
+        Find the processes matching a program name or pathname.
+
+        :param program: The name or absolute pathname of a program (a string).
+        :returns: A list of :class:`Process` objects.
+
+        The matching is modeled after ``pidof``: Absolute pathnames are matched
+        against the executable and the first command line argument of each
+        process, other names are matched against the process name and the
+        base names of the executable and first command line argument.
+        """
+        if os.path.isabs(program):
+            matches = self.by_pathname.get(program, [])
+            if not matches:
+                # Programs like /usr/bin/chromium-browser are often symbolic
+                # links while the kernel reports the resolved pathname.
+                resolved = os.path.realpath(program)
+                if resolved != program:
+                    matches = self.by_pathname.get(resolved, [])
+            return list(matches)
+        return list(self.by_name.get(program, []))
+
+    def is_running(self, program):
+        """
+        Check whether a program is running.
+
+        :param program: The name or absolute pathname of a program (a string),
+                        a :class:`ProcessMatcher` object or a list of
+                        :class:`ProcessMatcher` objects that all have to match
+                        the same process.
+        :returns: :data:`True` if the program is running, :data:`False` otherwise.
+        """
+        if isinstance(program, (ProcessMatcher, list, tuple)):
+            with lock:
+                matcher = coerce_matcher(program)
+                if matcher not in self.matcher_results:
+                    # Evaluate all matchers that have not been evaluated against
+                    # this snapshot yet, so that the matchers in a profile share
+                    # a single pass over the process table.
+                    pending = [m for m in list(known_matchers.keys()) if m not in self.matcher_results]
+                    self.evaluate(pending + [matcher])
+                return self.matcher_results[matcher]
+        return bool(self.find(program))
+
+    def evaluate(self, matchers):
+        """
+        Evaluate several matchers in a single pass over the process table.
+
+        :param matchers: An iterable of :class:`ProcessMatcher` objects.
+        :returns: A dictionary with :class:`ProcessMatcher` objects as keys
+                  and booleans as values.
+
+        The results are remembered until the snapshot is refreshed.
+        """
+        pending = set(coerce_matcher(m) for m in matchers)
+        results = dict((m, False) for m in pending)
+        for process in self.processes:
+            if not pending:
+                break
+            for matcher in list(pending):
+                if matcher.matches(process):
+                    results[matcher] = True
+                    pending.discard(matcher)
+        self.matcher_results.update(results)
+        logger.debug("Evaluated %i process matchers in a single pass.", len(results))
+        return results
+
+
+class ProcessMatcher(object):
+
+    """
+    Base class for declarative "is running" checks.
+
+    Subclasses compile their pattern once (when they're created) and
+    implement :func:`matches()`. Matcher objects can be passed to the
+    `is_running` argument of :func:`.launch_program()`.
+    """
+
+    def __init__(self):
+        """Register the matcher so that it can be evaluated in batches."""
+        with lock:
+            known_matchers[self] = True
+
+    def matches(self, process):
+        """
+        Check whether the matcher matches a process.
+
+        :param process: A :class:`Process` object.
+        :returns: :data:`True` if the process matches, :data:`False` otherwise.
+        """
+        raise NotImplementedError()
+
+
+class ExecutableMatcher(ProcessMatcher):
+
+    """
+    Match the absolute pathname of a process's executable against a pattern.
+
+    The pattern is a shell style glob pattern in which ``~`` and environment
+    variables are expanded, for example:
+
+    .. code-block:: python
+
+       launch_program('dropbox start', is_running=ExecutableMatcher('$HOME/.dropbox-dist/*/dropbox'))
+    """
+
+    def __init__(self, pattern):
+        """
+        Initialize an :class:`ExecutableMatcher` object.
+
+        :param pattern: A glob pattern (a string).
+        """
+        super(ExecutableMatcher, self).__init__()
+        self.pattern = os.path.expanduser(os.path.expandvars(pattern))
+        self.regex = re.compile(fnmatch.translate(self.pattern))
+
+    def matches(self, process):
+        """Check whether the executable of the process matches the pattern."""
+        return any(self.regex.match(pathname) for pathname in process.pathnames)
+
+    def __repr__(self):
+        """Render a human friendly representation of the matcher."""
+        return 'ExecutableMatcher(%r)' % self.pattern
+
+
+class CommandLineMatcher(ProcessMatcher):
+
+    """
+    Search the command line of a process for a regular expression.
+
+    This is the equivalent of ``pgrep -f``: The command line arguments are
+    joined with spaces and the regular expression may match anywhere.
+    """
+
+    def __init__(self, pattern, flags=0):
+        """
+        Initialize a :class:`CommandLineMatcher` object.
+
+        :param pattern: A regular expression (a string).
+        :param flags: Flags for :func:`re.compile()` (an integer).
+        """
+        super(CommandLineMatcher, self).__init__()
+        self.pattern = pattern
+        self.regex = re.compile(pattern, flags)
+
+    def matches(self, process):
+        """Check whether the command line of the process matches the pattern."""
+        return bool(process.cmdline) and self.regex.search(' '.join(process.cmdline)) is not None
+
+    def __repr__(self):
+        """Render a human friendly representation of the matcher."""
+        return 'CommandLineMatcher(%r)' % self.pattern
+
+
+class NameMatcher(ProcessMatcher):
+
+    """Match the process name (``/proc/[pid]/comm``) exactly, like ``pgrep -x``."""
+
+    def __init__(self, name):
+        """
+        Initialize a :class:`NameMatcher` object.
+
+        :param name: The process name (a string). The kernel truncates process
+                     names to 15 characters, this is taken into account.
+        """
+        super(NameMatcher, self).__init__()
+        self.name = name[:15]
+
+    def matches(self, process):
+        """Check whether the name of the process matches."""
+        return process.comm == self.name
+
+    def __repr__(self):
+        """Render a human friendly representation of the matcher."""
+        return 'NameMatcher(%r)' % self.name
+
+
+class CgroupMatcher(ProcessMatcher):
+
+    """Match the control group(s) of a process against a glob pattern."""
+
+    def __init__(self, pattern):
+        """
+        Initialize a :class:`CgroupMatcher` object.
+
+        :param pattern: A glob pattern (a string), for example
+                        ``/user.slice/*/app-dropbox*``.
+        """
+        super(CgroupMatcher, self).__init__()
+        self.pattern = pattern
+        self.regex = re.compile(fnmatch.translate(pattern))
+
+    def matches(self, process):
+        """Check whether one of the control groups of the process matches."""
+        return any(self.regex.match(cgroup) for cgroup in process.cgroups)
+
+    def __repr__(self):
+        """Render a human friendly representation of the matcher."""
+        return 'CgroupMatcher(%r)' % self.pattern
+
+
+class UserMatcher(ProcessMatcher):
+
+    """
+    Match the user that owns a process.
+
+    This is mostly useful in combination with other matchers, for example
+    ``[UserMatcher(os.getuid()), NameMatcher('dropbox')]``.
+    """
+
+    def __init__(self, user):
+        """
+        Initialize a :class:`UserMatcher` object.
+
+        :param user: A user name (a string) or user id (an integer).
+        :raises: :exc:`~exceptions.KeyError` when the user name is unknown.
+        """
+        super(UserMatcher, self).__init__()
+        self.uid = user if isinstance(user, int) else pwd.getpwnam(user).pw_uid
+
+    def matches(self, process):
+        """Check whether the process is owned by the user."""
+        return process.uid == self.uid
+
+    def __repr__(self):
+        """Render a human friendly representation of the matcher."""
+        return 'UserMatcher(%r)' % self.uid
+
+
+class AllOfMatcher(ProcessMatcher):
+
+    """Match processes that are matched by all of the given matchers."""
+
+    def __init__(self, *matchers):
+        """
+        Initialize an :class:`AllOfMatcher` object.
+
+        :param matchers: One or more :class:`ProcessMatcher` objects.
+        """
+        super(AllOfMatcher, self).__init__()
+        self.matchers = matchers
+
+    def matches(self, process):
+        """Check whether all of the matchers match the process."""
+        return all(matcher.matches(process) for matcher in self.matchers)
+
+    def __repr__(self):
+        """Render a human friendly representation of the matcher."""
+        return 'AllOfMatcher(%s)' % ', '.join(map(repr, self.matchers))
+
+
+def coerce_matcher(value):
+    """
+    Coerce a matcher or a list of matchers to a single :class:`ProcessMatcher`.
+
+    :param value: A :class:`ProcessMatcher` object or a list of them.
+    :returns: A :class:`ProcessMatcher` object.
+    """
+    if isinstance(value, ProcessMatcher):
+        return value
+    key = tuple(value)
+    with lock:
+        if key not in coerced_matchers:
+            coerced_matchers[key] = AllOfMatcher(*key)
+        return coerced_matchers[key]
+
+
+def get_process_table():
+    """
+    Get a snapshot of the process table.
+
+    :returns: A :class:`ProcessTable` object.
+
+    The snapshot is created on first use and reused until
+    :func:`invalidate_process_table()` is called.
+    """
+    global cached_table
+    with lock:
+        if cached_table is None:
+            cached_table = ProcessTable()
+        return cached_table
+
+
+def invalidate_process_table():
+    """
+    Discard the process table snapshot created by :func:`get_process_table()`.
+
+    This is called by :func:`.launch_program()` after it starts a program,
+    because that's the only point at which the process table is expected to
+    change in a way that matters to :mod:`dwim`.
+    """
+    global cached_table
+    with lock:
+        cached_table = None
+
+
+def restrict_process_table(uid, table=None):
+    """
+    Limit the process table snapshots to the processes of one user.
+
+    :param uid: A user id (an integer).
+    :param table: A :class:`ProcessTable` object with a snapshot of all
+                  processes (optional). When given the snapshot used by
+                  :func:`get_process_table()` is derived from it instead of
+                  reading the process table again.
+
+    This is used by ``dwim --system`` (see :mod:`dwim.system`), where each
+    profile should only consider the programs of the user that owns it.
+    """
+    global cached_table, restricted_uid
+    with lock:
+        restricted_uid = uid
+        cached_table = table.for_user(uid) if table else None
+
+
+def get_start_time(pid, root=DEFAULT_ROOT):
+    """
+    Get the start time of a process.
+
+    :param pid: A process ID (an integer).
+    :param root: The location of the ``proc`` file system (a string).
+    :returns: The start time in clock ticks since boot (an integer, field 22
+              of ``/proc/PID/stat``) or :data:`None` when the process doesn't
+              exist. Zombies are reported as not existing.
+    """
+    try:
+        with open(os.path.join(root, str(pid), 'stat'), 'rb') as handle:
+            contents = handle.read()
+    except EnvironmentError:
+        return None
+    # The process name is enclosed in parentheses and can contain spaces
+    # and parentheses, so we split the fields after the last parenthesis.
+    fields = contents[contents.rindex(b')') + 2:].split()
+    # fields[0] is field 3 (the state) and fields[19] is field 22.
+    if fields[0] == b'Z':
+        return None
+    return int(fields[19])
+
+
+def get_process_age(pid, root=DEFAULT_ROOT):
+    """
+    Get the number of seconds that a process has been running.
+
+    :param pid: A process ID (an integer).
+    :param root: The location of the ``proc`` file system (a string).
+    :returns: The age of the process in seconds (a number) or :data:`None`
+              when the process doesn't exist (or is a zombie).
+    """
+    start_time = get_start_time(pid, root)
+    if start_time is None:
+        return None
+    with open(os.path.join(root, 'uptime')) as handle:
+        uptime = float(handle.read().split()[0])
+    return uptime - start_time / float(os.sysconf('SC_CLK_TCK'))
+
+
+def decode(value):
+    """Decode a byte string read from ``/proc`` into a native string."""
+    return value if isinstance(value, str) else value.decode('UTF-8', 'replace')
@@ -0,0 +1,86 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Loading of profile scripts with a cache of compiled code objects.
+
+The user's profile script is evaluated every time ``dwim`` runs, which used
+to mean that it was compiled from source every time. :func:`load_profile()`
+caches the compiled code object in ``$XDG_CACHE_HOME/dwim/profiles`` (much
+like Python caches compiled modules in ``__pycache__`` directories) keyed
+by the pathname, modification time and size of the profile and the version
+of the Python interpreter.
+"""
+
+# Standard library modules.
+import hashlib
+import logging
+import marshal
+import os
+import sys
+
+# Modules included in our package.
+from dwim.xdg import cache_directory
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+
+def load_profile(filename, use_cache=True):
+    """
+    Compile a profile script (or load the compiled code from the cache).
+
+    :param filename: The pathname of the profile script (a string).
+    :param use_cache: :data:`False` to disable the cache (a boolean).
+    :returns: A code object.
+    :raises: :exc:`~exceptions.EnvironmentError` when the profile can't be
+             read and :exc:`~exceptions.SyntaxError` when it can't be
+             compiled.
+    """
+    filename = os.path.abspath(filename)
+    info = os.stat(filename)
+    # The version string identifies the interpreter more precisely than the
+    # cache tag (which doesn't change between pre-releases) without having to
+    # import importlib.util to get the bytecode magic number.
+    key = (filename, getattr(info, 'st_mtime_ns', info.st_mtime), info.st_size, sys.version)
+    cache_file = get_cache_file(filename)
+    if use_cache:
+        try:
+            with open(cache_file, 'rb') as handle:
+                cached_key, code = marshal.load(handle)
+            if cached_key == key:
+                logger.debug("Loaded compiled profile from %s.", cache_file)
+                return code
+        except Exception as e:
+            logger.debug("Ignoring compiled profile %s! (%s)", cache_file, e)
+    with open(filename, 'rb') as handle:
+        source = handle.read()
+    code = compile(source, filename, 'exec', 0, True)
+    if use_cache:
+        temporary_file = '%s.%i' % (cache_file, os.getpid())
+        try:
+            directory = os.path.dirname(cache_file)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(temporary_file, 'wb') as handle:
+                marshal.dump((key, code), handle)
+            os.rename(temporary_file, cache_file)
+        except Exception as e:
+            logger.debug("Failed to save compiled profile %s! (%s)", cache_file, e)
+    return code
+
+
+def get_cache_file(filename):
+    """
+    Get the pathname of the cached code object of a profile script.
+
+    :param filename: The absolute pathname of the profile script (a string).
+    :returns: A pathname in ``$XDG_CACHE_HOME/dwim/profiles`` (a string).
+    """
+    digest = hashlib.sha1(filename.encode('UTF-8')).hexdigest()
+    implementation = getattr(sys, 'implementation', None)
+    tag = getattr(implementation, 'cache_tag', None) or 'python%i%i' % sys.version_info[:2]
+    return cache_directory('profiles', '%s.%s.pyc' % (digest[:16], tag))
@@ -0,0 +1,405 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Waiting for programs to become ready.
+
+Some programs need to be ready before the next program is started (for
+example a VPN client that other programs connect through). Instead of adding
+``time.sleep()`` calls to the profile you can pass a readiness condition to
+:func:`.launch_program()`, which waits until the condition is met (or the
+timeout expires) before it returns:
+
+.. code-block:: python
+
+   launch_program('vpn-client --tray', ready=SocketReady('/run/user/1000/vpn.sock'))
+   launch_program('nm-applet', ready=DBusNameReady('org.freedesktop.network-manager-applet'))
+   launch_program('syncthing -no-browser', ready=PortReady(8384))
+   launch_program('dropbox start', ready=FileReady('~/.dropbox/command_socket'))
+   launch_program('pidgin', ready=UptimeReady(2))
+
+The conditions wait for events where the kernel or the program provides them
+(inotify for files and sockets, ``gdbus wait`` for D-Bus names and process
+file descriptors for uptime) and only fall back to polling (with exponential
+backoff starting at :data:`MIN_DELAY`) where no such event exists, like for
+a TCP port that starts accepting connections.
+"""
+
+# Standard library modules.
+import errno
+import logging
+import os
+import select
+import socket
+import time
+
+# Modules included in our package.
+from dwim.processes import get_process_age
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+DEFAULT_READY_TIMEOUT = 30
+"""The default number of seconds to wait for a readiness condition (a number)."""
+
+MIN_DELAY = 0.01
+"""The initial number of seconds between polls (a number)."""
+
+MAX_DELAY = 0.5
+"""The maximum number of seconds between polls (a number)."""
+
+IN_NONBLOCK = os.O_NONBLOCK
+"""The :func:`inotify_init1()` flag that makes the file descriptor non-blocking (an integer)."""
+
+IN_CLOEXEC = 0o2000000
+"""The :func:`inotify_init1()` flag that makes the file descriptor close on exec (an integer)."""
+
+IN_ATTRIB = 0x00000004
+"""The inotify event mask bit for metadata changes (an integer)."""
+
+IN_MOVED_TO = 0x00000080
+"""The inotify event mask bit for files moved into a directory (an integer)."""
+
+IN_CREATE = 0x00000100
+"""The inotify event mask bit for files created in a directory (an integer)."""
+
+WATCH_MASK = IN_ATTRIB | IN_MOVED_TO | IN_CREATE
+"""The inotify events that :class:`FileReady` waits for (an integer)."""
+
+
+class ReadinessCondition(object):
+
+    """Base class for readiness conditions."""
+
+    def wait(self, timeout, pid=None, launched_at=None):
+        """
+        Wait for the condition to be met.
+
+        :param timeout: The maximum number of seconds to wait (a number).
+        :param pid: The process ID of the program (an integer or :data:`None`
+                    when it's unknown).
+        :param launched_at: The time when the program was started (a number
+                            or :data:`None` when the program was already
+                            running).
+        :returns: :data:`True` when the condition was met, :data:`False`
+                  when the timeout expired.
+        """
+        raise NotImplementedError()
+
+
+class FileReady(ReadinessCondition):
+
+    """Wait for a file to appear."""
+
+    def __init__(self, pathname):
+        """
+        Initialize a :class:`FileReady` object.
+
+        :param pathname: The pathname of the file (a string, ``~`` and
+                         environment variables are expanded).
+        """
+        self.pathname = os.path.abspath(os.path.expanduser(os.path.expandvars(pathname)))
+
+    def is_met(self):
+        """
+        Check whether the condition is met.
+
+        :returns: :data:`True` if the file exists, :data:`False` otherwise.
+        """
+        return os.path.exists(self.pathname)
+
+    def wait(self, timeout, pid=None, launched_at=None):
+        """Wait for the file to appear (refer to :func:`ReadinessCondition.wait()`)."""
+        deadline = time.time() + timeout
+        try:
+            inotify = Inotify()
+        except EnvironmentError as e:
+            logger.debug("Failed to initialize inotify, will poll instead! (%s)", e)
+            return poll(self.is_met, deadline)
+        with inotify:
+            while True:
+                # Watch the nearest existing directory, because the file and
+                # its parent directories may not exist yet.
+                directory = os.path.dirname(self.pathname)
+                while not os.path.isdir(directory):
+                    directory = os.path.dirname(directory)
+                inotify.add_watch(directory, WATCH_MASK)
+                # Check after adding the watch to avoid a race condition.
+                if self.is_met():
+                    return True
+                remaining = deadline - time.time()
+                if remaining <= 0 or not inotify.wait(remaining):
+                    return self.is_met()
+
+    def __str__(self):
+        """Render a human friendly representation of the condition."""
+        return 'file %s exists' % self.pathname
+
+
+class SocketReady(FileReady):
+
+    """Wait for a UNIX socket to accept connections."""
+
+    def is_met(self):
+        """
+        Check whether the condition is met.
+
+        :returns: :data:`True` if the socket accepts connections,
+                  :data:`False` otherwise.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.pathname)
+            return True
+        except EnvironmentError:
+            return False
+        finally:
+            sock.close()
+
+    def wait(self, timeout, pid=None, launched_at=None):
+        """Wait for the socket to accept connections (refer to :func:`ReadinessCondition.wait()`)."""
+        deadline = time.time() + timeout
+        # The socket file is created when the program binds the socket, but
+        # there's no event for when it starts listening, so we poll after
+        # the socket file appears.
+        return FileReady(self.pathname).wait(timeout) and poll(self.is_met, deadline)
+
+    def __str__(self):
+        """Render a human friendly representation of the condition."""
+        return 'socket %s accepts connections' % self.pathname
+
+
+class PortReady(ReadinessCondition):
+
+    """Wait for a TCP port to accept connections."""
+
+    def __init__(self, port, host='127.0.0.1'):
+        """
+        Initialize a :class:`PortReady` object.
+
+        :param port: The port number (an integer).
+        :param host: The host name or IP address (a string, defaults to
+                     ``127.0.0.1``).
+        """
+        self.port = port
+        self.host = host
+
+    def is_met(self):
+        """
+        Check whether the condition is met.
+
+        :returns: :data:`True` if the port accepts connections, :data:`False` otherwise.
+        """
+        try:
+            socket.create_connection((self.host, self.port), MAX_DELAY).close()
+            return True
+        except EnvironmentError:
+            return False
+
+    def wait(self, timeout, pid=None, launched_at=None):
+        """Wait for the port to accept connections (refer to :func:`ReadinessCondition.wait()`)."""
+        return poll(self.is_met, time.time() + timeout)
+
+    def __str__(self):
+        """Render a human friendly representation of the condition."""
+        return 'port %s:%i accepts connections' % (self.host, self.port)
+
+
+class DBusNameReady(ReadinessCondition):
+
+    """Wait for a name to be owned on the D-Bus message bus."""
+
+    def __init__(self, name, bus='session'):
+        """
+        Initialize a :class:`DBusNameReady` object.
+
+        :param name: The well-known bus name (a string).
+        :param bus: The message bus (the string ``session`` or ``system``).
+        """
+        self.name = name
+        self.bus = bus
+
+    def is_met(self):
+        """
+        Check whether the condition is met (using ``dbus-send``).
+
+        :returns: :data:`True` if the name is owned, :data:`False` otherwise.
+        """
+        from dwim import execute
+        output = execute('dbus-send', '--%s' % self.bus, '--print-reply', '--dest=org.freedesktop.DBus',
+                         '/org/freedesktop/DBus', 'org.freedesktop.DBus.NameHasOwner', 'string:%s' % self.name,
+                         capture=True, check=False, silent=True)
+        return 'boolean true' in (output or '')
+
+    def wait(self, timeout, pid=None, launched_at=None):
+        """
+        Wait for the name to be owned (refer to :func:`ReadinessCondition.wait()`).
+
+        This uses ``gdbus wait`` (which waits for the ``NameOwnerChanged``
+        signal) when it's installed and polls using ``dbus-send`` otherwise.
+        When ``gdbus wait`` fails before the timeout expired (because GLib
+        is older than 2.72, which doesn't have the ``wait`` command, or the
+        message bus isn't available) it falls back to polling as well.
+        """
+        from dwim import execute
+        from dwim.paths import get_path_index
+        deadline = time.time() + timeout
+        if get_path_index().find('gdbus'):
+            if execute('gdbus', 'wait', '--%s' % self.bus, '--timeout', str(max(1, int(round(timeout)))),
+                       self.name, check=False, silent=True):
+                return True
+            if time.time() >= deadline:
+                return False
+            logger.debug("'gdbus wait' failed early, falling back to polling ..")
+        return poll(self.is_met, deadline)
+
+    def __str__(self):
+        """Render a human friendly representation of the condition."""
+        return 'D-Bus name %s is owned' % self.name
+
+
+class UptimeReady(ReadinessCondition):
+
+    """Wait for the program to have been running for a number of seconds."""
+
+    def __init__(self, seconds):
+        """
+        Initialize an :class:`UptimeReady` object.
+
+        :param seconds: The required uptime of the program in seconds (a number).
+        """
+        self.seconds = seconds
+
+    def wait(self, timeout, pid=None, launched_at=None):
+        """
+        Wait for the uptime of the program (refer to :func:`ReadinessCondition.wait()`).
+
+        When the process ID of the program is known its uptime is taken from
+        ``/proc`` and the condition fails as soon as the program exits (this
+        uses a process file descriptor when available). A program that was
+        already running with an unknown process ID is considered ready.
+        """
+        if pid is not None:
+            age = get_process_age(pid)
+            if age is None:
+                return False
+        elif launched_at is not None:
+            age = time.time() - launched_at
+        else:
+            return True
+        remaining = self.seconds - age
+        if remaining > timeout:
+            time.sleep(timeout)
+            return False
+        if remaining <= 0:
+            return True
+        if pid is not None and hasattr(os, 'pidfd_open'):
+            try:
+                pidfd = os.pidfd_open(pid)
+            except EnvironmentError:
+                return False
+            try:
+                readable, _, _ = select.select([pidfd], [], [], remaining)
+                return not readable
+            finally:
+                os.close(pidfd)
+        time.sleep(remaining)
+        return pid is None or get_process_age(pid) is not None
+
+    def __str__(self):
+        """Render a human friendly representation of the condition."""
+        return 'program has been running for %s seconds' % self.seconds
+
+
+class Inotify(object):
+
+    """A minimal :mod:`ctypes` wrapper for the Linux inotify API."""
+
+    def __init__(self):
+        """
+        Initialize an :class:`Inotify` object.
+
+        :raises: :exc:`~exceptions.EnvironmentError` when inotify isn't available.
+        """
+        # ctypes is imported lazily because it's expensive to import.
+        import ctypes
+        import ctypes.util
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (AttributeError, OSError) as e:
+            raise EnvironmentError(errno.ENOSYS, "inotify is not available (%s)" % e)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise EnvironmentError(error, os.strerror(error))
+
+    def add_watch(self, pathname, mask):
+        """
+        Watch a file or directory.
+
+        :param pathname: The pathname to watch (a string).
+        :param mask: The events to watch for (an integer).
+        :raises: :exc:`~exceptions.EnvironmentError` when the watch can't be added.
+        """
+        if self.libc.inotify_add_watch(self.fd, pathname.encode('UTF-8'), mask) < 0:
+            import ctypes
+            error = ctypes.get_errno()
+            raise EnvironmentError(error, os.strerror(error), pathname)
+
+    def wait(self, timeout):
+        """
+        Wait for events.
+
+        :param timeout: The maximum number of seconds to wait (a number).
+        :returns: :data:`True` when events were received, :data:`False`
+                  when the timeout expired.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        # The events themselves don't matter because the caller checks its
+        # condition after every change, so we just drain the queue.
+        while True:
+            try:
+                os.read(self.fd, 65536)
+            except EnvironmentError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return True
+                raise
+
+    def close(self):
+        """Close the inotify file descriptor."""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        """Enable the use of :class:`Inotify` objects as context managers."""
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        """Close the inotify file descriptor when leaving the context."""
+        self.close()
+
+
+def poll(check, deadline):
+    """
+    Poll a condition with exponential backoff.
+
+    :param check: A callable that returns :data:`True` when the condition is met.
+    :param deadline: The time after which to give up (a number).
+    :returns: :data:`True` when the condition was met, :data:`False` when
+              the deadline passed.
+    """
+    delay = MIN_DELAY
+    while True:
+        if check():
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, MAX_DELAY)
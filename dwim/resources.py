@@ -0,0 +1,281 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Per-program resource classes.
+
+Programs started by :func:`.launch_program()` inherit the scheduling of
+``dwim`` itself, which means a background sync client competes on equal
+terms with the editor you're waiting for. A :class:`ResourceClass` bundles
+a nice level, an I/O scheduling class, a CPU affinity mask and (optionally)
+a cgroup v2 placement, which are applied in the new session right before
+the program is executed (see :func:`.spawn_double_fork()`), so the program
+and everything it starts inherit them without any wrapper processes like
+``nice``, ``ionice`` or ``taskset``.
+
+Three resource classes are defined by default:
+
+- ``interactive`` doesn't change anything.
+- ``background`` uses nice level 10 and the lowest best-effort I/O priority.
+- ``batch`` uses nice level 19 and the idle I/O scheduling class.
+
+Resource classes can be (re)defined in the profile:
+
+.. code-block:: python
+
+   define_resource_class('batch', nice=19, ioprio='idle', cpus=[2, 3],
+                         cgroup='user.slice/user-{uid}.slice/user@{uid}.service/dwim-batch',
+                         cpu_weight=20, memory_high='2G')
+   launch_program('syncthing -no-browser', resource_class='batch')
+
+A cgroup is created (with the given weight and memory limit) the first time
+it's used. This only works in a part of the cgroup hierarchy that's
+delegated to you (like the ``user@UID.service`` subtree managed by the
+systemd user instance) and failures are logged as warnings, after which the
+program is started without the cgroup placement.
+"""
+
+# Standard library modules.
+import errno
+import logging
+import os
+import platform
+import threading
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+"""The mount point of the cgroup v2 hierarchy (a string)."""
+
+IOPRIO_CLASSES = dict(realtime=1, best_effort=2, idle=3)
+"""A dictionary with the names and values of the I/O scheduling classes."""
+
+IOPRIO_CLASS_SHIFT = 13
+"""The number of bits that the I/O scheduling class is shifted by (an integer)."""
+
+IOPRIO_WHO_PROCESS = 1
+"""The ``ioprio_set()`` target type for a single process (an integer)."""
+
+IOPRIO_SYSCALLS = dict(aarch64=30, armv7l=314, i686=289, ppc64le=273, x86_64=251)
+"""A dictionary with machine types and the number of the ``ioprio_set()`` system call."""
+
+# The resource classes shared by get_resource_class() and define_resource_class().
+resource_classes = {}
+
+# Serializes access to resource_classes.
+lock = threading.Lock()
+
+
+class ResourceClass(object):
+
+    """The scheduling and resource settings for a group of programs."""
+
+    def __init__(self, name, nice=None, ioprio=None, ioprio_level=None, cpus=None,
+                 cgroup=None, cpu_weight=None, memory_high=None):
+        """
+        Initialize a :class:`ResourceClass` object.
+
+        :param name: The name of the resource class (a string).
+        :param nice: The nice level of the program (an integer or :data:`None`).
+        :param ioprio: The I/O scheduling class (one of the strings
+                       ``realtime``, ``best-effort`` or ``idle``, or
+                       :data:`None`).
+        :param ioprio_level: The priority within the I/O scheduling class (an
+                             integer between 0 and 7, defaults to 4 for the
+                             ``realtime`` and ``best-effort`` classes).
+        :param cpus: The CPUs that the program may run on (an iterable of
+                     integers or :data:`None`).
+        :param cgroup: The pathname of a cgroup relative to
+                       :data:`CGROUP_ROOT` (a string or :data:`None`, the
+                       placeholder ``{uid}`` is replaced by the user ID).
+        :param cpu_weight: The ``cpu.weight`` of the cgroup (an integer
+                           between 1 and 10000 or :data:`None`).
+        :param memory_high: The ``memory.high`` limit of the cgroup (a number
+                            of bytes or a string like ``2G``, or :data:`None`).
+        :raises: :exc:`~exceptions.ValueError` when `ioprio` isn't a known
+                 I/O scheduling class or `cpu_weight` or `memory_high` are
+                 given without a `cgroup`.
+        """
+        if ioprio is not None and ioprio.replace('-', '_') not in IOPRIO_CLASSES:
+            raise ValueError("Unknown I/O scheduling class %r!" % ioprio)
+        if (cpu_weight is not None or memory_high is not None) and not cgroup:
+            raise ValueError("The cpu_weight and memory_high options require a cgroup!")
+        self.name = name
+        self.nice = nice
+        self.ioprio = ioprio
+        self.ioprio_level = ioprio_level
+        self.cpus = set(cpus) if cpus is not None else None
+        self.cgroup = cgroup.format(uid=os.getuid()).strip('/') if cgroup else None
+        self.cpu_weight = cpu_weight
+        self.memory_high = memory_high
+        self.cgroup_ready = False
+
+    @property
+    def ioprio_value(self):
+        """The value passed to ``ioprio_set()`` (an integer or :data:`None`)."""
+        if self.ioprio is None:
+            return None
+        ioprio_class = IOPRIO_CLASSES[self.ioprio.replace('-', '_')]
+        level = self.ioprio_level
+        if level is None:
+            level = 0 if ioprio_class == IOPRIO_CLASSES['idle'] else 4
+        return (ioprio_class << IOPRIO_CLASS_SHIFT) | level
+
+    def prepare(self):
+        """
+        Prepare to apply the resource class to a new program.
+
+        :returns: A callable for the ``prepare`` argument of
+                  :func:`.spawn_double_fork()` or :data:`None` when the
+                  resource class doesn't change anything.
+
+        The cgroup is created and the C library is loaded here in the parent
+        process, because the callable runs in a process that was forked from
+        a (possibly multi-threaded) parent where only async-signal-safe work
+        is reliable. The callable returns a list of warnings (strings) that
+        are reported back to the parent process.
+        """
+        if self.nice is None and self.ioprio is None and self.cpus is None and not self.cgroup:
+            return None
+        procs_file = self.create_cgroup()
+        ioprio_set = None
+        if self.ioprio is not None:
+            # ctypes is only needed to set the I/O priority (see get_ioprio_setter()).
+            import ctypes
+            ioprio_set = get_ioprio_setter()
+
+        def apply():
+            warnings = []
+            if self.nice is not None:
+                try:
+                    if hasattr(os, 'setpriority'):
+                        os.setpriority(os.PRIO_PROCESS, 0, self.nice)
+                    else:
+                        os.nice(self.nice - os.nice(0))
+                except EnvironmentError as e:
+                    warnings.append("Failed to set nice level %i! (%s)" % (self.nice, e))
+            if self.ioprio is not None:
+                if ioprio_set is None:
+                    warnings.append("Can't set I/O priority on this platform!")
+                elif ioprio_set(IOPRIO_WHO_PROCESS, 0, self.ioprio_value) < 0:
+                    warnings.append("Failed to set I/O priority! (%s)" % os.strerror(ctypes.get_errno()))
+            if self.cpus is not None:
+                try:
+                    os.sched_setaffinity(0, self.cpus)
+                except (AttributeError, EnvironmentError) as e:
+                    warnings.append("Failed to set CPU affinity! (%s)" % e)
+            if procs_file:
+                try:
+                    with open(procs_file, 'w') as handle:
+                        handle.write('0\n')
+                except EnvironmentError as e:
+                    warnings.append("Failed to move program to cgroup %s! (%s)" % (self.cgroup, e))
+            return warnings
+
+        return apply
+
+    def create_cgroup(self):
+        """
+        Create the cgroup of the resource class (on first use).
+
+        :returns: The pathname of the ``cgroup.procs`` file of the cgroup (a
+                  string) or :data:`None` when the resource class doesn't use
+                  a cgroup or it couldn't be created.
+        """
+        if not self.cgroup:
+            return None
+        directory = os.path.join(find_cgroup_root(), self.cgroup)
+        if not self.cgroup_ready:
+            try:
+                try:
+                    os.mkdir(directory)
+                    logger.debug("Created cgroup %s.", directory)
+                except EnvironmentError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+                for filename, value in (('cpu.weight', self.cpu_weight), ('memory.high', self.memory_high)):
+                    if value is not None:
+                        with open(os.path.join(directory, filename), 'w') as handle:
+                            handle.write('%s\n' % value)
+                self.cgroup_ready = True
+            except EnvironmentError as e:
+                logger.warning("Failed to prepare cgroup %s! (%s)", directory, e)
+                return None
+        return os.path.join(directory, 'cgroup.procs')
+
+    def __str__(self):
+        """Render a human friendly representation of the resource class."""
+        return 'resource class %s' % self.name
+
+
+def define_resource_class(name, **options):
+    """
+    Define (or redefine) a resource class.
+
+    :param name: The name of the resource class (a string).
+    :param options: Any keyword arguments are passed on to :class:`ResourceClass`.
+    :returns: The :class:`ResourceClass` object.
+    """
+    resource_class = ResourceClass(name, **options)
+    with lock:
+        resource_classes[name] = resource_class
+    return resource_class
+
+
+def get_resource_class(value):
+    """
+    Get a resource class.
+
+    :param value: A :class:`ResourceClass` object or the name of one (a string).
+    :returns: A :class:`ResourceClass` object.
+    :raises: :exc:`~exceptions.ValueError` when the resource class isn't defined.
+    """
+    if isinstance(value, ResourceClass):
+        return value
+    with lock:
+        if value in resource_classes:
+            return resource_classes[value]
+    raise ValueError("Unknown resource class %r!" % value)
+
+
+def get_ioprio_setter():
+    """
+    Get a function that calls the ``ioprio_set()`` system call.
+
+    :returns: A callable that takes the arguments `which`, `who` and
+              `ioprio` (integers) or :data:`None` when the system call
+              isn't available (Python doesn't wrap this system call).
+    """
+    number = IOPRIO_SYSCALLS.get(platform.machine())
+    if number is not None:
+        # ctypes is imported lazily because it's expensive to import.
+        import ctypes
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            return lambda which, who, ioprio: libc.syscall(number, which, who, ioprio)
+        except (AttributeError, OSError) as e:
+            logger.debug("Failed to load C library! (%s)", e)
+    return None
+
+
+def find_cgroup_root():
+    """
+    Find the mount point of the cgroup v2 hierarchy.
+
+    :returns: :data:`CGROUP_ROOT` or its ``unified`` subdirectory on systems
+              that use the hybrid cgroup layout (a string).
+    """
+    unified = os.path.join(CGROUP_ROOT, 'unified')
+    if not os.path.exists(os.path.join(CGROUP_ROOT, 'cgroup.controllers')) and os.path.isdir(unified):
+        return unified
+    return CGROUP_ROOT
+
+
+define_resource_class('interactive')
+define_resource_class('background', nice=10, ioprio='best-effort', ioprio_level=7)
+define_resource_class('batch', nice=19, ioprio='idle')
@@ -0,0 +1,199 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Starting programs without a shell.
+
+:func:`.launch_program()` used to start every program using ``sh -c '(...)
+&'``, which means running :mod:`executor`, a shell and a subshell just to
+put the program in the background, after which the process ID of the
+program is unknown. Most commands in a profile don't use any shell features
+though, so when :func:`needs_shell()` says that a command is simple enough
+:func:`spawn()` starts the program directly:
+
+- The program runs in a new session (so it's not affected by the terminal
+  or session that ``dwim`` was started from) with its standard input, output
+  and error streams connected to ``/dev/null``.
+
+- :func:`os.posix_spawn()` is used when it's available (Python 3.8+), which
+  is cheap even for large parent processes. Otherwise the program is started
+  using a double fork, so that it's reparented to init immediately.
+
+- The process ID of the program is returned.
+
+- A ``prepare`` callable can change the scheduling of the program right
+  before it's executed (see :mod:`dwim.resources`), in which case the double
+  fork is used because :func:`os.posix_spawn()` can't run Python code.
+"""
+
+# Standard library modules.
+import errno
+import fcntl
+import logging
+import os
+import threading
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+SHELL_METACHARACTERS = frozenset('|&;<>()$`\\*?[]#~{}\n')
+"""The characters that make :func:`needs_shell()` return :data:`True` (a frozenset of strings)."""
+
+# Programs started by spawn_posix() are our children and need to be reaped.
+children = set()
+
+# Serializes access to children.
+lock = threading.Lock()
+
+
+def needs_shell(command, tokens):
+    """
+    Check whether a command requires a shell.
+
+    :param command: A shell command (a string).
+    :param tokens: The command split into tokens using :func:`shlex.split()`
+                   (a list of strings).
+    :returns: :data:`True` if the command uses shell features (like pipes,
+              redirection, variables, globbing or environment variable
+              assignments), :data:`False` if it can be started directly.
+    """
+    return bool(SHELL_METACHARACTERS.intersection(command)) or '=' in tokens[0]
+
+
+def spawn(pathname, arguments, prepare=None):
+    """
+    Start a program in the background, detached from ``dwim``.
+
+    :param pathname: The absolute pathname of the program (a string).
+    :param arguments: The command line arguments, starting with the name of
+                      the program (a list of strings).
+    :param prepare: Refer to :func:`spawn_double_fork()` (optional).
+    :returns: The process ID of the program (an integer).
+    :raises: :exc:`~exceptions.EnvironmentError` when the program can't be
+             executed.
+    """
+    if hasattr(os, 'posix_spawn') and not prepare:
+        return spawn_posix(pathname, arguments)
+    return spawn_double_fork(pathname, arguments, prepare)
+
+
+def spawn_posix(pathname, arguments):
+    """
+    Start a program using :func:`os.posix_spawn()`.
+
+    :param pathname: The absolute pathname of the program (a string).
+    :param arguments: The command line arguments (a list of strings).
+    :returns: The process ID of the program (an integer).
+    :raises: :exc:`~exceptions.EnvironmentError` when the program can't be
+             executed.
+    """
+    reap_children()
+    pid = os.posix_spawn(pathname, arguments, os.environ, setsid=True, file_actions=[
+        (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+        (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0),
+        (os.POSIX_SPAWN_OPEN, 2, os.devnull, os.O_WRONLY, 0),
+    ])
+    with lock:
+        children.add(pid)
+    return pid
+
+
+def spawn_double_fork(pathname, arguments, prepare=None, environment=None):
+    """
+    Start a program using a double fork.
+
+    :param pathname: The absolute pathname of the program (a string).
+    :param arguments: The command line arguments (a list of strings).
+    :param prepare: A callable that's called in the new session before the
+                    program is executed (optional). It can return a list of
+                    warnings (strings) which are logged by the parent process.
+    :param environment: The environment of the program (a dictionary,
+                        defaults to the environment of ``dwim``).
+    :returns: The process ID of the program (an integer).
+    :raises: :exc:`~exceptions.EnvironmentError` when the program can't be
+             executed.
+
+    The intermediate process reports the process ID of the program through a
+    pipe that's closed on exec, so when the pipe is closed without an error
+    message the program was executed successfully.
+    """
+    read_fd, write_fd = os.pipe()
+    for fd in read_fd, write_fd:
+        fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+    intermediate_pid = os.fork()
+    if intermediate_pid == 0:
+        # We're the intermediate process.
+        status = 0
+        try:
+            os.close(read_fd)
+            os.setsid()
+            if prepare:
+                for message in prepare() or []:
+                    os.write(write_fd, ('warning %s\n' % message.replace('\n', ' ')).encode('UTF-8'))
+            program_pid = os.fork()
+            if program_pid == 0:
+                # We're the program.
+                try:
+                    null = os.open(os.devnull, os.O_RDWR)
+                    for fd in 0, 1, 2:
+                        os.dup2(null, fd)
+                    if environment is None:
+                        os.execv(pathname, arguments)
+                    else:
+                        os.execve(pathname, arguments, environment)
+                except EnvironmentError as e:
+                    os.write(write_fd, ('error %i\n' % e.errno).encode('ascii'))
+                os._exit(127)
+            os.write(write_fd, ('pid %i\n' % program_pid).encode('ascii'))
+        except EnvironmentError as e:
+            os.write(write_fd, ('error %i\n' % e.errno).encode('ascii'))
+            status = 1
+        finally:
+            os._exit(status)
+    # We're the parent process.
+    os.close(write_fd)
+    output = b''
+    try:
+        while True:
+            data = os.read(read_fd, 1024)
+            if not data:
+                break
+            output += data
+    finally:
+        os.close(read_fd)
+        os.waitpid(intermediate_pid, 0)
+    program_pid = None
+    for line in output.decode('UTF-8').splitlines():
+        key, _, value = line.partition(' ')
+        if key == 'warning':
+            logger.warning("%s (%s)", value, pathname)
+        elif key == 'error':
+            error = int(value)
+            raise EnvironmentError(error, os.strerror(error), pathname)
+        elif key == 'pid':
+            program_pid = int(value)
+    if program_pid is None:
+        raise EnvironmentError(errno.ECHILD, "Intermediate process didn't report a process ID", pathname)
+    return program_pid
+
+
+def reap_children():
+    """
+    Reap the programs started by :func:`spawn_posix()` that have exited.
+
+    Programs started with :func:`os.posix_spawn()` are children of ``dwim``,
+    so when they exit while ``dwim`` is running (which matters for ``dwim
+    --daemon``) they remain zombies until they're reaped.
+    """
+    with lock:
+        for pid in list(children):
+            try:
+                reaped_pid, _ = os.waitpid(pid, os.WNOHANG)
+            except EnvironmentError:
+                # Reaped by someone else.
+                reaped_pid = pid
+            if reaped_pid == pid:
+                children.discard(pid)
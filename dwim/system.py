@@ -0,0 +1,456 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Evaluating the profiles of all logged in users.
+
+On a shared machine every user running their own ``dwim`` means every user
+pays for working out the network location, reading the process table and
+indexing the ``$PATH``, even though the answers are the same for everyone.
+``dwim --system`` runs as root (for example from a system service unit
+triggered by a timer or network hooks) and uses a :class:`SystemService`
+to do that work once:
+
+- The logged in users are found using :func:`find_sessions()`.
+
+- The process table snapshot, the ``$PATH`` index and the MAC address of the
+  gateway are prepared in the service and inherited by the workers (see
+  :func:`~dwim.processes.restrict_process_table()` and
+  :func:`~dwim.location.find_cached_mac()`).
+
+- The profile of each user is evaluated in a forked worker process that
+  drops privileges to the user (supplementary groups, group and user), gets
+  an environment based on the user's account and session and only sees the
+  processes of the user.
+
+- At most :data:`DEFAULT_WORKERS` workers run concurrently. Users with an
+  active session go first, each user gets one worker and a worker that
+  doesn't finish within :data:`DEFAULT_USER_TIMEOUT` seconds is killed, so a
+  single slow or broken profile can't hold up everyone else.
+
+- Each worker reports the status of the programs it launched to the service
+  through a pipe. The service logs a summary per user and saves the reports
+  in ``/run/dwim/system-report.json``. The run history of each user is
+  recorded in their own state directory (see :mod:`dwim.history`).
+"""
+
+# Standard library modules.
+import collections
+import fcntl
+import json
+import logging
+import os
+import pwd
+import select
+import signal
+import time
+
+# Modules included in our package.
+from dwim.xdg import write_private_file
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+SESSIONS_DIRECTORY = '/run/systemd/sessions'
+"""The directory where ``systemd-logind`` publishes the state of sessions (a string)."""
+
+USER_RUNTIME_DIRECTORY = '/run/user'
+"""The directory that contains the runtime directories of users (a string)."""
+
+DEFAULT_WORKERS = max(2, os.sysconf('SC_NPROCESSORS_ONLN'))
+"""The default number of profiles that are evaluated concurrently (an integer)."""
+
+DEFAULT_USER_TIMEOUT = 60
+"""The default number of seconds that the evaluation of a single profile may take (a number)."""
+
+DEFAULT_REPORT_FILE = '/run/dwim/system-report.json'
+"""
+The default location of the reports of the last run (a string).
+
+This doesn't use :func:`~dwim.xdg.runtime_directory()` because system
+services don't have ``$XDG_RUNTIME_DIR`` set and the fallback in the
+temporary directory is no place for files written by root.
+"""
+
+REPORT_FORMAT = 1
+"""The version of the on-disk report format (an integer)."""
+
+Session = collections.namedtuple('Session', 'uid, user, display, active')
+"""A user that's logged in, as reported by :func:`find_sessions()` (a named tuple)."""
+
+
+class SystemService(object):
+
+    """Evaluate the profiles of all logged in users."""
+
+    def __init__(self, profile='~/.dwimrc', workers=DEFAULT_WORKERS, timeout=DEFAULT_USER_TIMEOUT,
+                 report_file=DEFAULT_REPORT_FILE):
+        """
+        Initialize a :class:`SystemService` object.
+
+        :param profile: The pathname of the profile script (a string, ``~``
+                        is expanded in the worker so it refers to the home
+                        directory of each user).
+        :param workers: The maximum number of concurrent workers (an integer).
+        :param timeout: The maximum number of seconds that the evaluation of
+                        a single profile may take (a number).
+        :param report_file: The pathname where the reports of the last run
+                            are saved (a string).
+        """
+        self.profile = profile
+        self.report_file = report_file
+        self.workers = workers
+        self.timeout = timeout
+        self.table = None
+
+    def run(self):
+        """
+        Evaluate the profiles of all logged in users.
+
+        :returns: A list of reports (dictionaries, refer to :func:`evaluate_profile()`).
+        :raises: :exc:`~exceptions.EnvironmentError` when the service isn't
+                 running as root.
+        """
+        if os.getuid() != 0:
+            raise EnvironmentError("dwim --system needs to run as root!")
+        sessions = find_sessions()
+        logger.info("Found %i logged in user(s).", len(sessions))
+        if not sessions:
+            return []
+        self.prepare()
+        reports = self.evaluate_all(sessions)
+        self.save(reports)
+        return reports
+
+    def prepare(self):
+        """Prepare the state that's shared by the workers."""
+        from dwim import find_gateway_route, find_route_mac
+        from dwim.location import find_cached_mac
+        from dwim.paths import get_path_index
+        from dwim.processes import get_process_table
+        from dwim.spawn import reap_children
+        reap_children()
+        self.table = get_process_table()
+        # Process.uid reads /proc/PID/status, so do it once here instead of
+        # once per process in every worker.
+        for process in self.table.processes:
+            process.uid
+        get_path_index().refresh()
+        route = find_gateway_route()
+        if route:
+            mac = find_cached_mac(route, find_route_mac)
+            logger.info("Sharing gateway %s (%s) on %s with workers.",
+                        route.gateway, mac or "unknown MAC address", route.interface)
+
+    def evaluate_all(self, sessions):
+        """
+        Evaluate the profiles of a list of users using a bounded pool of workers.
+
+        :param sessions: A list of :class:`Session` objects.
+        :returns: A list of reports (dictionaries), in the order of `sessions`.
+        """
+        pending = collections.deque(sessions)
+        running = {}
+        reports = {}
+        while pending or running:
+            while pending and len(running) < self.workers:
+                session = pending.popleft()
+                read_fd, pid = self.start_worker(session)
+                logger.info("Evaluating profile of %s (worker pid %i) ..", session.user, pid)
+                running[read_fd] = dict(session=session, pid=pid, deadline=time.time() + self.timeout, output=b'')
+            timeout = max(0, min(w['deadline'] for w in running.values()) - time.time())
+            readable, _, _ = select.select(list(running), [], [], timeout)
+            for fd in readable:
+                data = os.read(fd, 4096)
+                if data:
+                    running[fd]['output'] += data
+                else:
+                    worker = running.pop(fd)
+                    os.close(fd)
+                    reports[worker['session'].uid] = self.finish_worker(worker)
+            now = time.time()
+            for fd, worker in list(running.items()):
+                if now >= worker['deadline']:
+                    del running[fd]
+                    os.close(fd)
+                    try:
+                        os.killpg(worker['pid'], signal.SIGKILL)
+                    except EnvironmentError:
+                        pass
+                    os.waitpid(worker['pid'], 0)
+                    session = worker['session']
+                    logger.warning("Killed worker of %s because it didn't finish within %s seconds!",
+                                   session.user, self.timeout)
+                    reports[session.uid] = dict(user=session.user, uid=session.uid, status='timeout',
+                                                elapsed_time=self.timeout, programs={},
+                                                message="Killed after %s seconds" % self.timeout)
+        return [reports[session.uid] for session in sessions]
+
+    def start_worker(self, session):
+        """
+        Start a worker that evaluates the profile of a user.
+
+        :param session: A :class:`Session` object.
+        :returns: A tuple with the read end of the report pipe and the
+                  process ID of the worker (two integers).
+        """
+        read_fd, write_fd = os.pipe()
+        # The pipe is closed on exec so that the programs launched by the
+        # worker don't keep it open after the worker exits.
+        for fd in read_fd, write_fd:
+            fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+        # Only hand the processes of the user to the worker.
+        table = self.table.for_user(session.uid) if self.table else None
+        pid = os.fork()
+        if pid == 0:
+            # We're the worker, which shouldn't keep the snapshot of all
+            # processes around after it switches to the user.
+            self.table = None
+            status = 0
+            try:
+                os.close(read_fd)
+                # Run in a process group of our own so that a worker that
+                # times out can be killed with everything it started.
+                os.setpgid(0, 0)
+                try:
+                    report = evaluate_profile(session, self.profile, table)
+                except Exception as e:
+                    logger.exception("Worker of %s failed!", session.user)
+                    report = dict(user=session.user, uid=session.uid, status='error',
+                                  elapsed_time=0, programs={}, message=str(e))
+                os.write(write_fd, json.dumps(report).encode('UTF-8'))
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+        # We're the service (the process group is set on both sides of the
+        # fork, so it's in place before we might need to kill it).
+        os.close(write_fd)
+        try:
+            os.setpgid(pid, pid)
+        except EnvironmentError:
+            pass
+        return read_fd, pid
+
+    def finish_worker(self, worker):
+        """
+        Collect the report of a worker that exited.
+
+        :param worker: A dictionary with the keys ``session``, ``pid`` and ``output``.
+        :returns: The report (a dictionary).
+        """
+        from humanfriendly import format_timespan
+        os.waitpid(worker['pid'], 0)
+        session = worker['session']
+        try:
+            report = json.loads(worker['output'].decode('UTF-8'))
+        except ValueError:
+            report = dict(user=session.user, uid=session.uid, status='error', elapsed_time=0,
+                          programs={}, message="Worker exited without a report")
+        if report['status'] == 'ok':
+            logger.info("Evaluated profile of %s in %s (%s).", session.user,
+                        format_timespan(report['elapsed_time'], detailed=True), summarize_programs(report['programs']))
+        elif report['status'] == 'skipped':
+            logger.info("Skipped %s (%s).", session.user, report.get('message'))
+        else:
+            logger.error("Failed to evaluate profile of %s! (%s)", session.user, report.get('message'))
+        for command, status in sorted(report['programs'].items()):
+            logger.debug("%s: %s: %s", session.user, command, status)
+        return report
+
+    def save(self, reports):
+        """
+        Save the reports of the last run (failures are logged and otherwise ignored).
+
+        :param reports: A list of reports (dictionaries).
+        """
+        filename = self.report_file
+        try:
+            write_private_file(filename, json.dumps(dict(format=REPORT_FORMAT, time=int(time.time()), users=reports)))
+        except Exception as e:
+            logger.debug("Failed to save reports %s! (%s)", filename, e)
+
+
+def evaluate_profile(session, profile, table=None):
+    """
+    Evaluate the profile of a user (in a worker process).
+
+    :param session: A :class:`Session` object.
+    :param profile: The pathname of the profile script (a string).
+    :param table: A :class:`~dwim.processes.ProcessTable` object with a
+                  snapshot of the processes (optional, only the processes
+                  of the user are used).
+    :returns: A dictionary with the keys ``user``, ``uid``, ``status``
+              (``ok``, ``skipped`` or ``error``), ``elapsed_time`` and
+              ``programs`` (a dictionary with commands as keys and launch
+              statuses as values) and ``message`` when the profile wasn't
+              evaluated successfully.
+
+    This permanently drops the privileges of the calling process to those of
+    the user, so it should only be called in a process created for the purpose.
+    """
+    from dwim import dwim
+    from dwim.history import append_record, create_record
+    from dwim.paths import default_cache_file, get_path_index
+    from dwim.processes import restrict_process_table
+    from dwim.tracing import start_tracing, stop_tracing
+    account = pwd.getpwuid(session.uid)
+    report = dict(user=session.user, uid=session.uid, status='ok', elapsed_time=0, programs={})
+    restrict_process_table(session.uid, table)
+    # Don't keep a reference to the (unrestricted) snapshot we were given.
+    del table
+    os.initgroups(account.pw_name, account.pw_gid)
+    os.setgid(account.pw_gid)
+    os.setuid(account.pw_uid)
+    os.environ.clear()
+    os.environ.update(session_environment(session, account))
+    # Reuse the $PATH index prepared by the service, but save changes to it
+    # in the cache of the user instead of the cache of root.
+    get_path_index().cache_file = default_cache_file()
+    filename = os.path.expanduser(profile)
+    for pathname, exists in ((account.pw_dir, os.path.isdir), (filename, os.path.isfile)):
+        if not exists(pathname):
+            report.update(status='skipped', message="%s doesn't exist" % pathname)
+            return report
+    os.chdir(account.pw_dir)
+    tracer = start_tracing(timeline=False)
+    start_time = time.time()
+    try:
+        dwim(filename)
+    except Exception as e:
+        logger.exception("Failed to evaluate profile of %s!", session.user)
+        report.update(status='error', message=str(e))
+    finally:
+        stop_tracing()
+        report['elapsed_time'] = time.time() - start_time
+    record = create_record(tracer, report['elapsed_time'])
+    append_record(record)
+    report['programs'] = dict((command, details.get('status')) for command, details in record['programs'].items())
+    return report
+
+
+def session_environment(session, account, search_path=None):
+    """
+    Get the environment in which the profile of a user is evaluated.
+
+    :param session: A :class:`Session` object.
+    :param account: The password database entry of the user (see :func:`pwd.getpwuid()`).
+    :param search_path: The value of ``$PATH`` (a string, defaults to the
+                        ``$PATH`` of the service, so that the ``$PATH`` index
+                        prepared by the service is reused).
+    :returns: A dictionary with environment variables.
+    """
+    runtime_dir = os.path.join(USER_RUNTIME_DIRECTORY, str(session.uid))
+    environment = dict(
+        HOME=account.pw_dir,
+        LOGNAME=account.pw_name,
+        PATH=search_path or os.environ.get('PATH', os.defpath),
+        SHELL=account.pw_shell or '/bin/sh',
+        USER=account.pw_name,
+    )
+    if os.path.isdir(runtime_dir):
+        environment['XDG_RUNTIME_DIR'] = runtime_dir
+        bus = os.path.join(runtime_dir, 'bus')
+        if os.path.exists(bus):
+            environment['DBUS_SESSION_BUS_ADDRESS'] = 'unix:path=%s' % bus
+    if session.display:
+        environment['DISPLAY'] = session.display
+    for name in 'LANG', 'LC_ALL':
+        if name in os.environ:
+            environment[name] = os.environ[name]
+    return environment
+
+
+def find_sessions(directory=SESSIONS_DIRECTORY):
+    """
+    Find the users that are logged in.
+
+    :param directory: The directory where ``systemd-logind`` publishes the
+                      state of sessions (a string).
+    :returns: A list of :class:`Session` objects (one per user, users with
+              an active session first).
+
+    When ``systemd-logind`` isn't available the users with a runtime
+    directory in :data:`USER_RUNTIME_DIRECTORY` are considered logged in.
+    """
+    users = {}
+    try:
+        entries = sorted(os.listdir(directory))
+    except EnvironmentError as e:
+        logger.debug("Failed to list sessions in %s! (%s)", directory, e)
+        return find_runtime_users()
+    for entry in entries:
+        properties = read_properties(os.path.join(directory, entry))
+        if properties.get('CLASS', 'user') != 'user' or properties.get('STATE') == 'closing':
+            continue
+        try:
+            uid = int(properties['UID'])
+        except (KeyError, ValueError):
+            continue
+        session = Session(uid=uid, user=properties.get('USER') or str(uid),
+                          display=properties.get('DISPLAY'), active=properties.get('ACTIVE') == '1')
+        previous = users.get(uid)
+        if previous:
+            # Merge the sessions of the same user.
+            session = session._replace(display=previous.display or session.display,
+                                       active=previous.active or session.active)
+        users[uid] = session
+    return sorted(users.values(), key=lambda s: (not s.active, s.uid))
+
+
+def find_runtime_users(directory=USER_RUNTIME_DIRECTORY):
+    """
+    Find the users that have a runtime directory.
+
+    :param directory: The directory that contains the runtime directories of
+                      users (a string).
+    :returns: A list of :class:`Session` objects.
+    """
+    sessions = []
+    try:
+        entries = os.listdir(directory)
+    except EnvironmentError:
+        return sessions
+    for entry in sorted(entries, key=lambda e: (len(e), e)):
+        if entry.isdigit() and int(entry) != 0:
+            try:
+                account = pwd.getpwuid(int(entry))
+            except KeyError:
+                continue
+            sessions.append(Session(uid=account.pw_uid, user=account.pw_name, display=None, active=False))
+    return sessions
+
+
+def read_properties(filename):
+    """
+    Read a file with ``KEY=value`` lines (like the session files of ``systemd-logind``).
+
+    :param filename: The pathname of the file (a string).
+    :returns: A dictionary with strings (empty when the file can't be read).
+    """
+    properties = {}
+    try:
+        with open(filename) as handle:
+            for line in handle:
+                key, sep, value = line.rstrip('\n').partition('=')
+                if sep and not key.startswith('#'):
+                    properties[key] = value
+    except EnvironmentError as e:
+        logger.debug("Failed to read %s! (%s)", filename, e)
+    return properties
+
+
+def summarize_programs(programs):
+    """
+    Summarize the launch statuses of a report.
+
+    :param programs: A dictionary with commands as keys and launch statuses as values.
+    :returns: A string like ``2 started, 5 running``.
+    """
+    counts = collections.Counter(status or 'unknown' for status in programs.values())
+    if not counts:
+        return "no programs"
+    return ", ".join("%i %s" % (count, status) for status, count in sorted(counts.items()))
@@ -0,0 +1,337 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Startup timeline instrumentation.
+
+When a login is slow it's hard to tell where the time went: Waiting for the
+network, a slow "is running" check, looking up programs or the profile
+itself. :mod:`dwim` records spans for these activities using :func:`span()`,
+which is nearly free when tracing is disabled (the default). When a
+:class:`Tracer` is installed using :func:`start_tracing()` the spans are
+recorded (including their duration and the number of subprocesses they
+started) and can be saved in the Chrome trace event format, which can be
+loaded into trace viewers like ``chrome://tracing`` and Perfetto_. When only
+the time spent per activity matters (for the run history) a
+:class:`PhaseTimer` is installed instead, which doesn't keep the individual
+spans.
+
+.. _Perfetto: https://ui.perfetto.dev/
+"""
+
+# Standard library modules.
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    # Python 3.7+ tracks open spans per context (each asyncio task has its own).
+    import contextvars
+except ImportError:
+    # Older Pythons track open spans per thread.
+    contextvars = None
+
+# The tracer installed by start_tracing() (None when tracing is disabled).
+active_tracer = None
+
+# The spans that are open in the current context (a tuple, shared by all tracers).
+context_spans = contextvars.ContextVar('dwim_open_spans', default=()) if contextvars else None
+
+
+class Tracer(object):
+
+    """Record spans and save them in the Chrome trace event format."""
+
+    def __init__(self):
+        """Initialize a :class:`Tracer` object."""
+        self.events = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.pid = os.getpid()
+
+    @property
+    def open_spans(self):
+        """
+        The spans that are currently open (a list of :class:`Span` objects).
+
+        On Python 3.7+ these are the spans opened in the calling context, so
+        coroutines that run interleaved on the same thread each see their own
+        spans. On older Pythons these are the spans opened in the calling
+        thread.
+        """
+        if context_spans is not None:
+            return [s for s in context_spans.get() if s.tracer is self]
+        if not hasattr(self.local, 'spans'):
+            self.local.spans = []
+        return self.local.spans
+
+    def push(self, span):
+        """
+        Mark a span as open in the calling context.
+
+        :param span: A :class:`Span` object.
+        """
+        if context_spans is not None:
+            context_spans.set(context_spans.get() + (span,))
+        else:
+            self.open_spans.append(span)
+
+    def pop(self, span):
+        """
+        Mark a span as closed in the calling context.
+
+        :param span: A :class:`Span` object.
+        """
+        if context_spans is not None:
+            context_spans.set(tuple(s for s in context_spans.get() if s is not span))
+        else:
+            self.open_spans.remove(span)
+
+    def record(self, span):
+        """
+        Record a finished span.
+
+        :param span: A :class:`Span` object.
+        """
+        event = dict(
+            name=span.name,
+            cat=span.category,
+            ph='X',
+            ts=int(span.start_time * 1000000),
+            dur=int((span.end_time - span.start_time) * 1000000),
+            pid=self.pid,
+            tid=span.track,
+            args=dict(span.args, subprocesses=span.subprocesses),
+        )
+        with self.lock:
+            self.events.append(event)
+
+    def totals(self):
+        """
+        Get the total time spent per activity.
+
+        :returns: A list of tuples with four values each: The category and
+                  name of the spans, the details of the last span (a
+                  dictionary) and the total duration of the spans in
+                  seconds. Spans are grouped by category, name and
+                  ``command`` detail.
+        """
+        totals = {}
+        with self.lock:
+            for event in self.events:
+                key = (event['cat'], event['name'], event['args'].get('command'))
+                duration = event['dur'] / 1000000.0
+                if key in totals:
+                    duration += totals[key][3]
+                totals[key] = (event['cat'], event['name'], event['args'], duration)
+        return list(totals.values())
+
+    def save(self, filename):
+        """
+        Save the recorded spans in the Chrome trace event format.
+
+        :param filename: The pathname of the trace file (a string).
+        """
+        with self.lock:
+            events = sorted(self.events, key=lambda e: e['ts'])
+        with open(filename, 'w') as handle:
+            json.dump(dict(traceEvents=events, displayTimeUnit='ms'), handle)
+
+
+class PhaseTimer(Tracer):
+
+    """A :class:`Tracer` that only keeps the total time spent per activity."""
+
+    def __init__(self):
+        """Initialize a :class:`PhaseTimer` object."""
+        super(PhaseTimer, self).__init__()
+        self.aggregates = {}
+
+    def record(self, span):
+        """
+        Add the duration of a finished span to the total of its activity.
+
+        :param span: A :class:`Span` object.
+        """
+        key = (span.category, span.name, span.args.get('command'))
+        duration = span.end_time - span.start_time
+        with self.lock:
+            if key in self.aggregates:
+                duration += self.aggregates[key][3]
+            self.aggregates[key] = (span.category, span.name, span.args, duration)
+
+    def totals(self):
+        """Get the total time spent per activity (refer to :func:`Tracer.totals()`)."""
+        with self.lock:
+            return list(self.aggregates.values())
+
+
+class Span(object):
+
+    """A context manager that measures an activity for a :class:`Tracer`."""
+
+    def __init__(self, tracer, name, category, args):
+        """
+        Initialize a :class:`Span` object.
+
+        :param tracer: The :class:`Tracer` that records the span.
+        :param name: The name of the span (a string).
+        :param category: The category of the span (a string).
+        :param args: A dictionary with additional details about the span.
+        """
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.subprocesses = 0
+        self.track = None
+        self.start_time = None
+        self.end_time = None
+
+    def set(self, **args):
+        """Add details to the span (given as keyword arguments)."""
+        self.args.update(args)
+
+    def __enter__(self):
+        """Start measuring."""
+        self.tracer.push(self)
+        self.track = current_track()
+        self.start_time = time.time()
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        """Stop measuring and record the span."""
+        self.end_time = time.time()
+        self.tracer.pop(self)
+        if exc_type is not None:
+            self.args['error'] = '%s: %s' % (exc_type.__name__, exc_value)
+        self.tracer.record(self)
+
+
+class NullSpan(object):
+
+    """A span that doesn't measure anything (used when tracing is disabled)."""
+
+    def set(self, **args):
+        """Ignore details about the span."""
+
+    def __enter__(self):
+        """Don't start measuring."""
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        """Don't record anything."""
+
+
+NULL_SPAN = NullSpan()
+"""The :class:`NullSpan` returned by :func:`span()` when tracing is disabled."""
+
+
+def span(name, category='dwim', **args):
+    """
+    Measure an activity.
+
+    :param name: The name of the activity (a string).
+    :param category: The category of the activity (a string).
+    :param args: Additional details about the activity (keyword arguments).
+    :returns: A context manager (a :class:`Span` object when tracing is
+              enabled, :data:`NULL_SPAN` otherwise).
+    """
+    tracer = active_tracer
+    if tracer is None:
+        return NULL_SPAN
+    return Span(tracer, name, category, args)
+
+
+def traced(category):
+    """
+    Decorate a function so that each call is measured using :func:`span()`.
+
+    :param category: The category of the spans (a string).
+    :returns: A function decorator.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kw):
+            if active_tracer is None:
+                return function(*args, **kw)
+            with span(function.__name__, category):
+                return function(*args, **kw)
+        return wrapper
+    return decorator
+
+
+def current_track():
+    """
+    Get the track on which spans opened by the caller are shown.
+
+    :returns: The :func:`id()` of the current asyncio task (so that
+              coroutines that run interleaved on the same thread don't
+              overlap on one track) or the identifier of the calling
+              thread (an integer).
+    """
+    # Don't import asyncio just to find out that it isn't used.
+    asyncio = sys.modules.get('asyncio') if contextvars else None
+    if asyncio is not None:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            return id(task)
+    return threading.current_thread().ident
+
+
+def in_current_context(function):
+    """
+    Bind a function to the spans that are open in the calling context.
+
+    :param function: The function to bind (a callable).
+    :returns: A callable that runs the function in a copy of the calling
+              context (so that subprocesses it starts in another thread,
+              e.g. in an executor, are attributed to the caller's spans) or
+              the function itself when :mod:`contextvars` isn't available.
+    """
+    if contextvars is None:
+        return function
+    return functools.partial(contextvars.copy_context().run, function)
+
+
+def count_subprocess():
+    """Attribute a subprocess to the spans that are open in the calling context."""
+    tracer = active_tracer
+    if tracer is not None:
+        for open_span in tracer.open_spans:
+            open_span.subprocesses += 1
+
+
+def start_tracing(timeline=True):
+    """
+    Enable tracing.
+
+    :param timeline: :data:`True` to record every span (so that the timeline
+                     can be saved), :data:`False` to only keep the time spent
+                     per activity (a :class:`PhaseTimer`).
+    :returns: The installed :class:`Tracer` object.
+    """
+    global active_tracer
+    active_tracer = Tracer() if timeline else PhaseTimer()
+    return active_tracer
+
+
+def stop_tracing():
+    """
+    Disable tracing.
+
+    :returns: The :class:`Tracer` object that was installed (or :data:`None`).
+    """
+    global active_tracer
+    tracer = active_tracer
+    active_tracer = None
+    return tracer
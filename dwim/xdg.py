@@ -0,0 +1,115 @@
+# dwim: Location aware application launcher.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""Locations of the files that :mod:`dwim` maintains, according to the XDG base directory specification."""
+
+# Standard library modules.
+import errno
+import os
+import stat
+import tempfile
+import threading
+
+
+def cache_directory(*args):
+    """
+    Get a pathname in the cache directory of :mod:`dwim`.
+
+    :param args: Zero or more pathname components (strings) to append.
+    :returns: A pathname below ``$XDG_CACHE_HOME/dwim`` (a string).
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'dwim', *args)
+
+
+def state_directory(*args):
+    """
+    Get a pathname in the state directory of :mod:`dwim`.
+
+    :param args: Zero or more pathname components (strings) to append.
+    :returns: A pathname below ``$XDG_STATE_HOME/dwim`` (a string).
+    """
+    base = os.environ.get('XDG_STATE_HOME') or os.path.expanduser('~/.local/state')
+    return os.path.join(base, 'dwim', *args)
+
+
+def runtime_directory(*args):
+    """
+    Get a pathname in the runtime directory of :mod:`dwim`.
+
+    :param args: Zero or more pathname components (strings) to append.
+    :returns: A pathname below ``$XDG_RUNTIME_DIR/dwim`` (a string). When
+              ``$XDG_RUNTIME_DIR`` isn't set a per-user directory in the
+              temporary directory is used instead.
+    """
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if base:
+        return os.path.join(base, 'dwim', *args)
+    return os.path.join(tempfile.gettempdir(), 'dwim-%i' % os.getuid(), *args)
+
+
+def check_private_directory(directory):
+    """
+    Make sure that a directory can be trusted with private files.
+
+    :param directory: The pathname of a directory (a string).
+    :raises: :exc:`~exceptions.EnvironmentError` when the directory doesn't
+             exist, isn't a directory (symbolic links aren't followed), is
+             owned by another user or its mode isn't 0700.
+
+    This matters because :func:`runtime_directory()` falls back to a
+    predictable pathname in the (world writable) temporary directory, which
+    another user could have created in advance.
+    """
+    metadata = os.lstat(directory)
+    if not stat.S_ISDIR(metadata.st_mode):
+        raise EnvironmentError(errno.ENOTDIR, "Refusing to use non-directory", directory)
+    if metadata.st_uid != os.getuid():
+        raise EnvironmentError(errno.EPERM, "Refusing to use directory owned by another user", directory)
+    if stat.S_IMODE(metadata.st_mode) != 0o700:
+        raise EnvironmentError(errno.EPERM, "Refusing to use directory with mode %o" % stat.S_IMODE(metadata.st_mode),
+                               directory)
+
+
+def ensure_private_directory(directory):
+    """
+    Create a private directory (when it doesn't exist yet).
+
+    :param directory: The pathname of a directory (a string).
+    :raises: Refer to :func:`check_private_directory()`.
+    """
+    try:
+        os.makedirs(directory, 0o700)
+    except EnvironmentError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    check_private_directory(directory)
+
+
+def write_private_file(filename, text):
+    """
+    Atomically replace a file in a private directory.
+
+    :param filename: The pathname of the file (a string).
+    :param text: The new contents of the file (a string).
+    :raises: :exc:`~exceptions.EnvironmentError` when the file can't be
+             written or the directory isn't private (see
+             :func:`ensure_private_directory()`).
+
+    The contents are written to a temporary file that's created exclusively
+    (without following symbolic links) and then renamed into place.
+    """
+    ensure_private_directory(os.path.dirname(filename))
+    temporary_file = '%s.%i.%i' % (filename, os.getpid(), threading.current_thread().ident)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_NOFOLLOW', 0)
+    fd = os.open(temporary_file, flags, 0o600)
+    try:
+        with os.fdopen(fd, 'w') as handle:
+            handle.write(text)
+        os.rename(temporary_file, filename)
+    except Exception:
+        os.unlink(temporary_file)
+        raise
@@ -0,0 +1,644 @@
+#!/usr/bin/env python
+
+# Benchmarks for the `dwim' package.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 16, 2026
+# URL: https://dwim.readthedocs.io
+
+"""
+Usage: benchmark.py [OPTIONS] [BENCHMARK..]
+
+Benchmark the hot paths of the dwim package against local stand-ins: fake
+`ip', `arp', `ping' and `pidof' executables, a synthetic $PATH, a synthetic
+/proc, a synthetic wallpaper tree and a generated (large) profile script.
+
+The available benchmarks are `processes', `path', `imports', `extract',
+`resolve', `launch', `aio', `network', `backgrounds' and `profile'. By
+default all benchmarks are run.
+
+The `imports' benchmark measures the time it takes to import dwim (using
+`python -X importtime') and fails when the import time exceeds the budget
+or when one of the modules that dwim is supposed to import lazily was
+imported anyway. The `aio' benchmark fails when launching a program using
+dwim.aio blocks the event loop while the process table is scanned.
+
+Results can be saved as JSON and compared with the results of a previous
+run (for example of a different commit) to catch performance regressions.
+
+Supported options:
+
+  -p, --processes=COUNT
+
+    The number of processes in the synthetic process table (defaults to 5000).
+
+  -r, --programs=COUNT
+
+    The number of programs to check (defaults to 40).
+
+  -d, --directories=COUNT
+
+    The number of directories on the synthetic $PATH (defaults to 20).
+
+  -e, --executables=COUNT
+
+    The number of executables on the synthetic $PATH (defaults to 10000).
+
+  -w, --wallpapers=COUNT
+
+    The number of images in the synthetic wallpaper tree (defaults to 10000).
+
+  -n, --repeat=COUNT
+
+    The number of times each benchmark is repeated, the fastest run is
+    reported (defaults to 3).
+
+  -b, --import-budget=MILLISECONDS
+
+    The maximum time that importing dwim may take (defaults to 50).
+
+  -s, --stall-budget=MILLISECONDS
+
+    The longest time that the event loop may be blocked while programs are
+    launched using dwim.aio (defaults to 50).
+
+  -o, --output=FILE
+
+    Save the results to FILE (in JSON format).
+
+  -c, --compare=FILE
+
+    Compare the results to those saved in FILE and exit with a nonzero
+    exit code when a benchmark got slower by more than the threshold.
+
+  -t, --threshold=PERCENTAGE
+
+    The slowdown that is considered a regression (defaults to 25).
+
+  -h, --help
+
+    Show this message and exit.
+"""
+
+# Standard library modules.
+import getopt
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Make it possible to run this script from a source checkout.
+SOURCE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SOURCE_DIRECTORY)
+
+# Modules included in our package.
+import dwim  # NOQA
+from dwim.paths import PathIndex  # NOQA
+from dwim.processes import ProcessTable, invalidate_process_table  # NOQA
+
+# External dependencies.
+from executor import which  # NOQA
+
+BENCHMARKS = ('processes', 'path', 'imports', 'extract', 'resolve', 'launch', 'aio', 'network', 'backgrounds',
+              'profile')
+"""The names of the available benchmarks (a tuple of strings)."""
+
+LAZY_MODULES = ('asyncio', 'coloredlogs', 'ctypes', 'executor', 'humanfriendly', 'multiprocessing', 'subprocess')
+"""The modules that ``import dwim`` should not import (they're imported on first use)."""
+
+GATEWAY_IP = '192.0.2.1'
+"""The IP address of the gateway reported by the fake ``ip`` program."""
+
+GATEWAY_MAC = '02:00:5e:10:00:01'
+"""The MAC address of the gateway reported by the fake ``arp`` program."""
+
+FAKE_PROGRAMS = {
+    'ip': '#!/bin/sh\necho "default via %s dev eth0 proto dhcp metric 600"\n' % GATEWAY_IP,
+    'arp': ('#!/bin/sh\n'
+            'echo "Address HWtype HWaddress Flags Mask Iface"\n'
+            'echo "%s ether %s C eth0"\n' % (GATEWAY_IP, GATEWAY_MAC)),
+    'ping': '#!/bin/sh\nexit 0\n',
+    'pidof': '#!/bin/sh\nexit 0\n',
+}
+"""Stand-ins for the external programs that :mod:`dwim` can run (a dictionary)."""
+
+FAKE_PIDOF_WALK = '''#!/bin/sh
+find "$DWIM_PROC_ROOT" -mindepth 2 -maxdepth 2 -name exe -lname "$1" | grep -q .
+'''
+"""A ``pidof`` replacement that walks a synthetic ``/proc`` instead of the real one."""
+
+
+def main():
+    """Command line interface for the benchmarks."""
+    suite = BenchmarkSuite()
+    compare_file = None
+    output_file = None
+    threshold = 25
+    try:
+        options, arguments = getopt.gnu_getopt(sys.argv[1:], 'p:r:d:e:w:n:b:s:o:c:t:h', [
+            'processes=', 'programs=', 'directories=', 'executables=',
+            'wallpapers=', 'repeat=', 'import-budget=', 'stall-budget=',
+            'output=', 'compare=', 'threshold=', 'help',
+        ])
+        for option, value in options:
+            if option in ('-p', '--processes'):
+                suite.num_processes = int(value)
+            elif option in ('-r', '--programs'):
+                suite.num_programs = int(value)
+            elif option in ('-d', '--directories'):
+                suite.num_directories = int(value)
+            elif option in ('-e', '--executables'):
+                suite.num_executables = int(value)
+            elif option in ('-w', '--wallpapers'):
+                suite.num_wallpapers = int(value)
+            elif option in ('-n', '--repeat'):
+                suite.repeat = int(value)
+            elif option in ('-b', '--import-budget'):
+                suite.import_budget = float(value)
+            elif option in ('-s', '--stall-budget'):
+                suite.stall_budget = float(value)
+            elif option in ('-o', '--output'):
+                output_file = value
+            elif option in ('-c', '--compare'):
+                compare_file = value
+            elif option in ('-t', '--threshold'):
+                threshold = float(value)
+            elif option in ('-h', '--help'):
+                print(__doc__.strip())
+                sys.exit(0)
+        for name in arguments:
+            if name not in BENCHMARKS:
+                raise Exception("Unknown benchmark %r!" % name)
+    except Exception as e:
+        sys.stderr.write("Error: Failed to parse command line arguments! (%s)\n" % e)
+        sys.exit(1)
+    success = suite.run(arguments or BENCHMARKS)
+    report = suite.get_report()
+    if output_file:
+        with open(output_file, 'w') as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+    if compare_file:
+        with open(compare_file) as handle:
+            baseline = json.load(handle)
+        if not compare_reports(baseline, report, threshold):
+            success = False
+    if not success:
+        sys.exit(1)
+
+
+class BenchmarkSuite(object):
+
+    """The benchmarks and the synthetic environment they run in."""
+
+    def __init__(self):
+        """Initialize a :class:`BenchmarkSuite` object with the default parameters."""
+        self.num_processes = 5000
+        self.num_programs = 40
+        self.num_directories = 20
+        self.num_executables = 10000
+        self.num_wallpapers = 10000
+        self.repeat = 3
+        self.import_budget = 50
+        self.stall_budget = 50
+        self.results = {}
+        self.workspace = None
+
+    def run(self, names):
+        """
+        Run benchmarks.
+
+        :param names: The names of the benchmarks to run (an iterable of strings).
+        :returns: :data:`False` if a benchmark failed, :data:`True` otherwise.
+        """
+        success = True
+        self.workspace = tempfile.mkdtemp(prefix='dwim-benchmark-')
+        saved_environment = dict(os.environ)
+        try:
+            # Keep the caches, the ledger, the fingerprint and the run history
+            # maintained by dwim inside the workspace.
+            os.environ['XDG_CACHE_HOME'] = os.path.join(self.workspace, 'cache')
+            os.environ['XDG_STATE_HOME'] = os.path.join(self.workspace, 'state')
+            os.environ['XDG_RUNTIME_DIR'] = os.path.join(self.workspace, 'runtime')
+            os.mkdir(os.environ['XDG_RUNTIME_DIR'], 0o700)
+            self.bin_directory = self.create_fake_programs()
+            for name in names:
+                if getattr(self, 'benchmark_%s' % name)() is False:
+                    success = False
+        finally:
+            os.environ.clear()
+            os.environ.update(saved_environment)
+            shutil.rmtree(self.workspace)
+        return success
+
+    def measure(self, label, function, count=None):
+        """
+        Measure a function and report the fastest of :attr:`repeat` runs.
+
+        :param label: The name of the measurement (a string).
+        :param function: The function to measure (a callable).
+        :param count: The number of items processed by the function (an
+                      integer or :data:`None`, only used for reporting).
+        """
+        timings = []
+        for i in range(self.repeat):
+            start = time.time()
+            function()
+            timings.append(time.time() - start)
+        self.record(label, min(timings), count)
+
+    def record(self, label, seconds, count=None):
+        """Record and report the result of a measurement."""
+        self.results[label] = dict(seconds=seconds, count=count)
+        suffix = " (%i items)" % count if count else ""
+        print("%-50s %10.2f ms%s" % (label, seconds * 1000, suffix))
+
+    def get_report(self):
+        """Get the results in a format that can be saved as JSON (a dictionary)."""
+        return dict(
+            commit=get_commit(),
+            python=platform.python_version(),
+            results=self.results,
+            timestamp=time.time(),
+            version=dwim.__version__,
+        )
+
+    def create_fake_programs(self):
+        """Create the stand-ins for external programs and put them on the ``$PATH``."""
+        directory = os.path.join(self.workspace, 'bin')
+        os.makedirs(directory)
+        for name, contents in FAKE_PROGRAMS.items():
+            create_script(os.path.join(directory, name), contents)
+        os.environ['PATH'] = os.pathsep.join([directory, os.environ.get('PATH', os.defpath)])
+        return directory
+
+    def benchmark_processes(self):
+        """Compare the process table snapshot with a ``pidof`` process per program."""
+        root = create_synthetic_proc(self.workspace, self.num_processes)
+        programs = ['/usr/bin/program-%i' % i for i in range(self.num_programs)]
+        pidof = os.path.join(self.workspace, 'pidof-walk')
+        create_script(pidof, FAKE_PIDOF_WALK)
+        environment = dict(os.environ, DWIM_PROC_ROOT=root)
+
+        def pidof_per_program():
+            for pathname in programs:
+                subprocess.call([pidof, pathname], env=environment)
+
+        def process_table():
+            table = ProcessTable(root=root)
+            for pathname in programs:
+                table.is_running(pathname)
+
+        self.measure("processes: pidof per program", pidof_per_program, len(programs))
+        self.measure("processes: snapshot", process_table, len(programs))
+
+    def benchmark_path(self):
+        """Compare :func:`executor.which()` with a cold and a warm :class:`.PathIndex`."""
+        search_path = create_synthetic_path(self.workspace, self.num_directories, self.num_executables)
+        cache_file = os.path.join(self.workspace, 'path-index.json')
+        programs = pick_programs(self.num_executables, self.num_programs)
+        saved_path = os.environ['PATH']
+
+        def which_per_program():
+            os.environ['PATH'] = search_path
+            try:
+                for name in programs:
+                    which(name)
+            finally:
+                os.environ['PATH'] = saved_path
+
+        def path_index(cold):
+            if cold and os.path.exists(cache_file):
+                os.unlink(cache_file)
+            index = PathIndex(search_path=search_path, cache_file=cache_file)
+            for name in programs:
+                index.find(name)
+
+        self.measure("path: which() per program", which_per_program, len(programs))
+        self.measure("path: index (cold)", lambda: path_index(True), len(programs))
+        self.measure("path: index (warm)", lambda: path_index(False), len(programs))
+
+    def benchmark_imports(self):
+        """
+        Measure the time it takes to import :mod:`dwim`.
+
+        :returns: :data:`True` if the import stayed within budget and didn't
+                  import any of the :data:`LAZY_MODULES`, :data:`False` otherwise.
+        """
+        environment = dict(os.environ, PYTHONPATH=SOURCE_DIRECTORY)
+        # Make sure we measure importing modules, not compiling them.
+        subprocess.call([sys.executable, '-m', 'compileall', '-q', os.path.join(SOURCE_DIRECTORY, 'dwim')])
+        timings = []
+        imported = set()
+        for i in range(max(5, self.repeat)):
+            process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', 'import dwim'],
+                                       env=environment, stderr=subprocess.PIPE, universal_newlines=True)
+            _, output = process.communicate()
+            for line in output.splitlines():
+                match = re.match(r'^import time:\s*\d+\s*\|\s*(\d+)\s*\|(\s*)(\S+)$', line)
+                if match:
+                    cumulative, indent, module = match.groups()
+                    imported.add(module.split('.')[0])
+                    if module == 'dwim' and len(indent) == 1:
+                        timings.append(int(cumulative) / 1000000.0)
+        elapsed = min(timings)
+        self.record("imports: import dwim", elapsed)
+        success = elapsed * 1000 <= self.import_budget
+        if not success:
+            print("Import time exceeds budget of %.2f ms!" % self.import_budget)
+        for name in LAZY_MODULES:
+            if name in imported:
+                print("Module %r was imported eagerly!" % name)
+                success = False
+        return success
+
+    def benchmark_extract(self):
+        """Measure :func:`dwim.extract_program()` on typical command lines."""
+        commands = [
+            'dropbox start',
+            ' "/usr/bin/dropbox" start ',
+            'keepassx $HOME/Documents/Passwords/Personal.kdb -min -lock',
+            "feh --bg-scale '/home/user/Pictures/Backgrounds/some image.jpg'",
+        ] * 250
+
+        def extract():
+            for command in commands:
+                dwim.extract_program(command)
+
+        self.measure("extract: extract_program()", extract, len(commands))
+
+    def benchmark_resolve(self):
+        """Measure :func:`dwim.resolve_program()` against a synthetic ``$PATH``."""
+        search_path = create_synthetic_path(self.workspace, self.num_directories, self.num_executables, 'resolve')
+        programs = pick_programs(self.num_executables, self.num_programs)
+        saved_path = os.environ['PATH']
+
+        def resolve():
+            os.environ['PATH'] = search_path
+            try:
+                for name in programs:
+                    dwim.resolve_program(name)
+            finally:
+                os.environ['PATH'] = saved_path
+
+        self.measure("resolve: resolve_program()", resolve, len(programs))
+
+    def benchmark_launch(self):
+        """Measure :func:`dwim.launch_program()` for programs that are running and that need starting."""
+        directory = os.path.join(self.workspace, 'launch')
+        os.makedirs(directory)
+        programs = []
+        for i in range(self.num_programs):
+            pathname = os.path.join(directory, 'program-%i' % i)
+            create_script(pathname, '#!/bin/sh\nexit 0\n')
+            programs.append(pathname)
+
+        def already_running_matcher():
+            invalidate_process_table()
+            for pathname in programs:
+                # The init process is always running.
+                dwim.launch_program(pathname, is_running=dwim.NameMatcher(get_init_name()))
+
+        def already_running_shell():
+            for pathname in programs:
+                dwim.launch_program(pathname, is_running='pidof %s' % pathname)
+
+        def not_running():
+            for pathname in programs:
+                dwim.launch_program(pathname)
+
+        self.measure("launch: running (matcher)", already_running_matcher, len(programs))
+        self.measure("launch: running (shell check)", already_running_shell, len(programs))
+        self.measure("launch: not running (start)", not_running, len(programs))
+        dwim.launch_programs(programs)
+        self.measure("launch: not running (launch_programs)", lambda: dwim.launch_programs(programs), len(programs))
+
+    def benchmark_aio(self):
+        """
+        Check that :func:`dwim.aio.launch_program_async()` doesn't block the event loop.
+
+        :returns: :data:`True` if a concurrent callback kept running while the
+                  process table was being scanned, :data:`False` otherwise.
+
+        The scan of the process table is slowed down artificially, so that a
+        scan on the event loop thread would stall the callback for at least
+        that long.
+        """
+        if sys.version_info[:2] < (3, 5):
+            print("Skipping aio benchmark (requires Python 3.5+).")
+            return True
+        import asyncio
+        from dwim.aio import launch_program_async
+        directory = os.path.join(self.workspace, 'aio')
+        os.makedirs(directory)
+        programs = []
+        for i in range(self.num_programs // 4):
+            pathname = os.path.join(directory, 'program-%i' % i)
+            create_script(pathname, '#!/bin/sh\nexit 0\n')
+            programs.append(pathname)
+        scan_time = 0.1
+        saved_function = dwim.get_process_table
+
+        def slow_process_table():
+            time.sleep(scan_time)
+            return saved_function()
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        ticks = []
+
+        def tick():
+            ticks.append(time.time())
+            loop.call_later(0.005, tick)
+
+        dwim.get_process_table = slow_process_table
+        try:
+            loop.call_soon(tick)
+            start = time.time()
+            loop.run_until_complete(asyncio.gather(*[launch_program_async(p) for p in programs]))
+            elapsed = time.time() - start
+        finally:
+            dwim.get_process_table = saved_function
+            asyncio.set_event_loop(None)
+            loop.close()
+        stall = max(b - a for a, b in zip(ticks, ticks[1:]))
+        self.record("aio: launch_program_async()", elapsed, len(programs))
+        self.record("aio: longest event loop stall", stall)
+        success = stall * 1000 <= self.stall_budget
+        if not success:
+            print("Event loop stalled for longer than %.2f ms!" % self.stall_budget)
+        return success
+
+    def benchmark_network(self):
+        """Measure the gateway lookups, natively and using the fake ``ip`` and ``arp`` programs."""
+        gateways = dict(('network-%i' % i, ['02:00:5e:00:%02x:%02x' % (i // 256, i % 256)]) for i in range(100))
+        gateways['office'] = [GATEWAY_MAC.upper()]
+
+        # Repeat the lookups so that the measurements aren't dominated by noise.
+        iterations = 100
+
+        def native_mac():
+            for i in range(iterations):
+                dwim.find_gateway_mac()
+
+        def native_location():
+            for i in range(iterations):
+                dwim.determine_network_location(**gateways)
+
+        self.measure("network: find_gateway_mac() (proc)", native_mac, iterations)
+        self.measure("network: determine_network_location() (proc)", native_location, iterations)
+        # Force the fallback to the (fake) `ip' and `arp' programs.
+        saved_function = dwim.find_default_routes
+        saved_mac_function = dwim.find_neighbour_mac
+
+        def unavailable(*args, **kw):
+            raise IOError("Simulated missing /proc/net file")
+
+        dwim.find_default_routes = unavailable
+        dwim.find_neighbour_mac = unavailable
+        try:
+            self.measure("network: find_gateway_mac() (commands)", native_mac, iterations)
+            self.measure("network: determine_network_location() (commands)", native_location, iterations)
+        finally:
+            dwim.find_default_routes = saved_function
+            dwim.find_neighbour_mac = saved_mac_function
+
+    def benchmark_backgrounds(self):
+        """Measure :func:`dwim.set_random_background()` against a synthetic wallpaper tree."""
+        directory = create_synthetic_wallpapers(self.workspace, self.num_wallpapers)
+        cache_directory = os.path.join(os.environ['XDG_CACHE_HOME'], 'dwim')
+
+        def indexed(cold):
+            if cold and os.path.isdir(cache_directory):
+                shutil.rmtree(cache_directory)
+            dwim.set_random_background('true {image}', directory)
+
+        self.measure("backgrounds: index (cold)", lambda: indexed(True), self.num_wallpapers)
+        self.measure("backgrounds: index (warm)", lambda: indexed(False), self.num_wallpapers)
+        self.measure("backgrounds: streaming",
+                     lambda: dwim.set_random_background('true {image}', directory, index=False),
+                     self.num_wallpapers)
+
+    def benchmark_profile(self):
+        """Measure :func:`dwim.dwim()` evaluating a generated (large) profile script."""
+        profile = create_synthetic_profile(self.workspace, self.bin_directory, self.num_programs * 5)
+        self.measure("profile: dwim()", lambda: dwim.dwim(profile), self.num_programs * 5)
+
+
+def compare_reports(baseline, report, threshold):
+    """
+    Compare benchmark results and report regressions.
+
+    :param baseline: The results of an earlier run (a dictionary).
+    :param report: The results of the current run (a dictionary).
+    :param threshold: The slowdown (a percentage) that is considered a regression.
+    :returns: :data:`True` if there are no regressions, :data:`False` otherwise.
+    """
+    success = True
+    print("\nComparison with %s (%s):" % (baseline.get('commit') or 'unknown commit', baseline.get('version')))
+    for label, result in sorted(report['results'].items()):
+        previous = baseline['results'].get(label)
+        if previous and previous['seconds'] > 0:
+            change = (result['seconds'] - previous['seconds']) / previous['seconds'] * 100
+            regression = change > threshold
+            if regression:
+                success = False
+            print("%-50s %+9.1f %%%s" % (label, change, " REGRESSION" if regression else ""))
+    return success
+
+
+def create_script(pathname, contents):
+    """Create an executable script."""
+    with open(pathname, 'w') as handle:
+        handle.write(contents)
+    os.chmod(pathname, 0o755)
+
+
+def create_synthetic_path(workspace, num_directories, num_executables, name='path'):
+    """Create directories with executables and return a matching search path."""
+    directories = []
+    for i in range(num_directories):
+        directory = os.path.join(workspace, name, 'bin-%i' % i)
+        os.makedirs(directory)
+        directories.append(directory)
+    for i in range(num_executables):
+        create_script(os.path.join(directories[i % num_directories], 'program-%i' % i), '#!/bin/sh\n')
+    return os.pathsep.join(directories)
+
+
+def create_synthetic_proc(workspace, num_processes):
+    """Create a directory that mimics the layout of ``/proc``."""
+    root = os.path.join(workspace, 'proc')
+    for pid in range(1, num_processes + 1):
+        directory = os.path.join(root, str(pid))
+        os.makedirs(directory)
+        name = 'program-%i' % (pid % 80)
+        exe = '/usr/bin/%s' % name
+        os.symlink(exe, os.path.join(directory, 'exe'))
+        with open(os.path.join(directory, 'cmdline'), 'wb') as handle:
+            handle.write(b'\0'.join([exe.encode('ascii'), b'--option', b'value']) + b'\0')
+        with open(os.path.join(directory, 'comm'), 'w') as handle:
+            handle.write(name[:15] + '\n')
+    return root
+
+
+def create_synthetic_wallpapers(workspace, num_wallpapers, per_directory=50):
+    """Create a directory tree with (empty) images and return its pathname."""
+    root = os.path.join(workspace, 'wallpapers')
+    for i in range(num_wallpapers):
+        directory = os.path.join(root, 'group-%i' % (i // (per_directory * 10)), 'set-%i' % (i // per_directory))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(os.path.join(directory, 'image-%i.jpg' % i), 'w'):
+            pass
+    return root
+
+
+def create_synthetic_profile(workspace, bin_directory, num_programs):
+    """Generate a large profile script that exercises the common profile helpers."""
+    init_name = get_init_name()
+    lines = [
+        "location = determine_network_location(home=['84:9C:A6:76:23:8E'], office=[%r])" % GATEWAY_MAC,
+    ]
+    for i in range(num_programs):
+        pathname = os.path.join(bin_directory, 'program-%i' % i)
+        create_script(pathname, '#!/bin/sh\nexit 0\n')
+        # The init process is always running, so nothing will be started.
+        if i % 3 == 0:
+            lines.append("launch_program(%r, is_running=CommandLineMatcher(%r))" % (pathname, re.escape(init_name)))
+        elif i % 3 == 1:
+            lines.append("launch_program(%r, is_running=NameMatcher(%r))" % (pathname, init_name))
+        else:
+            lines.append("launch_program(%r, is_running='pidof %s')" % (pathname, pathname))
+    profile = os.path.join(workspace, 'dwimrc')
+    with open(profile, 'w') as handle:
+        handle.write('\n'.join(lines) + '\n')
+    return profile
+
+
+def pick_programs(num_executables, num_programs):
+    """Pick program names spread over all directories of a synthetic ``$PATH``."""
+    return ['program-%i' % i for i in range(0, num_executables, max(1, num_executables // num_programs))]
+
+
+def get_init_name():
+    """Get the name of the init process (a string)."""
+    with open('/proc/1/comm') as handle:
+        return handle.read().strip()
+
+
+def get_commit():
+    """Get the commit hash of the source checkout (a string or :data:`None`)."""
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=SOURCE_DIRECTORY, stderr=subprocess.PIPE)
+        return output.decode('ascii').strip()
+    except Exception:
+        return None
+
+
+if __name__ == '__main__':
+    main()